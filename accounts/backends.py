@@ -0,0 +1,107 @@
+"""
+ユーザーと権限を再利用する認証バックエンド
+
+permission_required のビューは、リクエストのたびにセッションのユーザーと
+その権限をデータベースから読み込む。ユーザーと権限はめったに変わらないため、
+読み込んだユーザー（権限を解決済みのもの）をプロセス内にキャッシュする。
+
+ユーザー・グループ・権限が変更されたら accounts.signals が世代番号を進め、
+全ワーカーのキャッシュを無効化する。データベースを直接書き換えた場合に備えて、
+キャッシュには有効期限も設ける。
+"""
+
+import copy
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+
+from main.generation import SharedGeneration
+
+Entry = namedtuple("Entry", ["expires", "user"])
+
+
+class UserCache:
+    """ユーザーIDごとの、権限を解決済みのユーザーの LRU キャッシュ"""
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.generation = SharedGeneration("auth")
+        self._seen_generation = self.generation.current()
+        self._stats = {"hits": 0, "misses": 0}
+
+    def get(self, user_id):
+        """期限内のユーザーを返す。なければ None"""
+        with self._lock:
+            generation = self.generation.current()
+            if generation != self._seen_generation:
+                self._entries.clear()
+                self._seen_generation = generation
+            entry = self._entries.get(user_id)
+            if entry is None or entry.expires <= time.monotonic():
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self._stats["hits"] += 1
+            return entry.user
+
+    def set(self, user_id, user, generation):
+        """
+        ユーザーを保存する
+
+        :param generation: 読み込みを始める前の世代番号。読み込み中に
+            無効化されていた場合は保存しない
+        """
+        with self._lock:
+            if generation != self.generation.current():
+                return
+            self._entries[user_id] = Entry(time.monotonic() + self.ttl, user)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self):
+        """全ワーカーのキャッシュを無効化する"""
+        with self._lock:
+            self._entries.clear()
+            self.generation.bump()
+            self._seen_generation = self.generation.current()
+
+    def stats(self):
+        with self._lock:
+            total = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "hit_ratio": self._stats["hits"] / total if total else None,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+            }
+
+
+users = UserCache(settings.AUTH_CACHE_MAX_ENTRIES, settings.AUTH_CACHE_TTL)
+
+
+class CachedModelBackend(ModelBackend):
+    """
+    ModelBackend と同じ認証・権限判定を行い、セッションのユーザーを
+    権限を解決した状態でキャッシュする
+    """
+
+    def get_user(self, user_id):
+        cached = users.get(user_id)
+        if cached is None:
+            generation = users.generation.current()
+            user = super().get_user(user_id)
+            if user is None:
+                return None
+            # 権限の集合を読み込んでおき（ユーザーの属性に保持される）、まとめて保存する
+            self.get_all_permissions(user)
+            users.set(user_id, user, generation)
+            cached = user
+        # リクエストごとに属性が書き換えられても共有のユーザーに影響しないよう複製を返す
+        return copy.copy(cached)
@@ -0,0 +1,58 @@
+"""
+ユーザー・グループ・権限の変更を検知し、認証のキャッシュを無効化する
+"""
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group, Permission
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+
+from .backends import users
+
+
+def _invalidate(using=None):
+    """
+    変更の直後とトランザクションのコミット後の2回、キャッシュを無効化する
+
+    コミット前に他のワーカーが読み込んだユーザーは変更前の権限を持つため、
+    コミット後にもう一度無効化し、それを新しい世代でキャッシュさせない。
+    トランザクションの外ではコミット後の無効化もすぐに行われる。
+    """
+    users.invalidate()
+    transaction.on_commit(users.invalidate, using=using)
+
+
+def invalidate(sender, using=None, **kwargs):
+    _invalidate(using)
+
+
+def user_saved(sender, update_fields=None, using=None, **kwargs):
+    # ログインのたびに更新される最終ログイン日時は認証の結果に影響しない
+    if update_fields is not None and set(update_fields) == {"last_login"}:
+        return
+    _invalidate(using)
+
+
+def connect():
+    User = get_user_model()
+    post_save.connect(user_saved, sender=User, dispatch_uid="auth_cache_user_saved")
+    post_delete.connect(invalidate, sender=User, dispatch_uid="auth_cache_user_deleted")
+    for model in (Group, Permission):
+        post_save.connect(
+            invalidate, sender=model, dispatch_uid=f"auth_cache_{model.__name__}_saved"
+        )
+        post_delete.connect(
+            invalidate,
+            sender=model,
+            dispatch_uid=f"auth_cache_{model.__name__}_deleted",
+        )
+    for through in (
+        User.groups.through,
+        User.user_permissions.through,
+        Group.permissions.through,
+    ):
+        m2m_changed.connect(
+            invalidate,
+            sender=through,
+            dispatch_uid=f"auth_cache_{through.__name__}_changed",
+        )
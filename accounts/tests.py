@@ -0,0 +1,92 @@
+from django.contrib.auth.models import Group, Permission, User
+from django.test import TestCase, override_settings
+
+from .backends import CachedModelBackend, UserCache, users
+
+PERMISSION = "read_images.view_readimages"
+
+# パスワードのハッシュ化に時間をかけない
+fast_hashing = override_settings(
+    PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"]
+)
+
+
+@fast_hashing
+class CachedModelBackendTests(TestCase):
+    def setUp(self):
+        users.invalidate()
+        self.permission = Permission.objects.get(codename="view_readimages")
+        self.user = User.objects.create_user("reader", password="old-password")
+        self.user.user_permissions.add(self.permission)
+        self.backend = CachedModelBackend()
+
+    def test_second_lookup_uses_cache(self):
+        self.assertTrue(self.backend.get_user(self.user.pk).has_perm(PERMISSION))
+        with self.assertNumQueries(0):
+            user = self.backend.get_user(self.user.pk)
+            self.assertTrue(user.has_perm(PERMISSION))
+
+    def test_returns_copies_of_cached_user(self):
+        self.backend.get_user(self.user.pk).first_name = "書き換え"
+        self.assertEqual(self.backend.get_user(self.user.pk).first_name, "")
+
+    def test_password_change_invalidates(self):
+        self.backend.get_user(self.user.pk)
+        self.user.set_password("new-password")
+        self.user.save()
+        self.assertTrue(
+            self.backend.get_user(self.user.pk).check_password("new-password")
+        )
+
+    def test_permission_change_invalidates(self):
+        self.assertTrue(self.backend.get_user(self.user.pk).has_perm(PERMISSION))
+        self.user.user_permissions.remove(self.permission)
+        self.assertFalse(self.backend.get_user(self.user.pk).has_perm(PERMISSION))
+
+    def test_group_permission_change_invalidates(self):
+        group = Group.objects.create(name="readers")
+        other = User.objects.create_user("member")
+        other.groups.add(group)
+        self.assertFalse(self.backend.get_user(other.pk).has_perm(PERMISSION))
+        group.permissions.add(self.permission)
+        self.assertTrue(self.backend.get_user(other.pk).has_perm(PERMISSION))
+
+    def test_last_login_update_keeps_cache(self):
+        self.backend.get_user(self.user.pk)
+        self.user.save(update_fields=["last_login"])
+        with self.assertNumQueries(0):
+            self.backend.get_user(self.user.pk)
+
+    def test_invalidation_reaches_other_workers(self):
+        other_worker = UserCache(10, 300)
+        other_worker.set(self.user.pk, self.user, other_worker.generation.current())
+        self.assertIsNotNone(other_worker.get(self.user.pk))
+        users.invalidate()
+        self.assertIsNone(other_worker.get(self.user.pk))
+
+
+@fast_hashing
+class CachedSessionTests(TestCase):
+    def setUp(self):
+        users.invalidate()
+        self.user = User.objects.create_user("reader", password="old-password")
+        self.user.user_permissions.add(
+            Permission.objects.get(codename="view_readimages")
+        )
+        self.client.force_login(self.user)
+
+    def suggest(self):
+        return self.client.get("/read_images/suggest/", {"prefix": "猫"})
+
+    def test_password_change_ends_other_sessions(self):
+        self.assertEqual(self.suggest().status_code, 200)
+        self.user.set_password("new-password")
+        self.user.save()
+        response = self.suggest()
+        self.assertEqual(response.status_code, 302)
+        self.assertIn("/accounts/login/", response["Location"])
+
+    def test_revoked_permission_applies_to_next_request(self):
+        self.assertEqual(self.suggest().status_code, 200)
+        self.user.user_permissions.clear()
+        self.assertEqual(self.suggest().status_code, 302)
@@ -0,0 +1,205 @@
+"""
+ASGI ワーカー1つあたりの同時処理数を測るベンチマーク
+
+スタブの API_HOST を立ち上げ、uvicorn (1ワーカー) で起動した main.asgi に
+/emoji_finder/query/ を並列に送って、スループットと実効同時実行数を表示する。
+--baseline にリビジョンを渡すと、そのリビジョンを git worktree に展開して
+同じ条件で計測し、変更前後を並べて比較できる。
+
+    python -m benchmarks.concurrency --concurrency 50 --requests 500
+    python -m benchmarks.concurrency --baseline HEAD~1
+"""
+
+import argparse
+import asyncio
+import contextlib
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+from benchmarks import stub_api
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def server_env(api_host):
+    env = os.environ.copy()
+    env.update(
+        {
+            "DJANGO_ENV": "development",
+            "DJANGO_DEBUG": "False",
+            "API_HOST": api_host,
+            "API_KEY": "benchmark",
+            "EMOJI_FINDER_ENDPOINT": "/emoji_finder",
+            "QIITA_ENDPOINT": "/qiita",
+            "KEIZOKURYOKU_ENDPOINT": "/keizokuryoku",
+            "QUERY_ENDPOINT": "/query",
+            "ANSWER_ENDPOINT": "/answer",
+            "EMBEDDING_ENDPOINT": "/embeddings",
+            "OPENAI_REALTIME_SESSIONS_URL": f"{api_host}/v1/realtime/sessions",
+            "OPENAI_API_KEY": "benchmark",
+        }
+    )
+    return env
+
+
+@contextlib.contextmanager
+def worktree(revision):
+    """指定したリビジョンを一時ディレクトリの git worktree に展開する"""
+    with tempfile.TemporaryDirectory() as tmp:
+        tree = Path(tmp) / "baseline"
+        subprocess.run(
+            ["git", "worktree", "add", "--detach", str(tree), revision],
+            cwd=BASE_DIR,
+            check=True,
+            capture_output=True,
+        )
+        try:
+            yield tree
+        finally:
+            subprocess.run(
+                ["git", "worktree", "remove", "--force", str(tree)],
+                cwd=BASE_DIR,
+                check=True,
+            )
+
+
+def start_server(tree, port, api_host, command=None, env=None):
+    """
+    指定したソースツリーでサーバーを起動し、応答するまで待つ
+
+    :param command: 起動コマンド（省略時は main.asgi を uvicorn の1ワーカーで起動する）
+    :param env: 環境変数（省略時は server_env(api_host)）
+    """
+    process = subprocess.Popen(
+        command
+        or [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "main.asgi:application",
+            "--port",
+            str(port),
+            "--workers",
+            "1",
+            "--log-level",
+            "warning",
+        ],
+        cwd=tree,
+        env=env or server_env(api_host),
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.2):
+                return process
+        except OSError:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError(f"サーバーが起動しませんでした: {tree}")
+
+
+async def run_load(base_url, concurrency, total):
+    """total 件のリクエストを concurrency 並列で送り、結果を集計する"""
+    latencies = []
+    errors = 0
+    counter = iter(range(total))
+
+    async def worker(client):
+        nonlocal errors
+        for i in counter:
+            started = time.perf_counter()
+            try:
+                response = await client.get(
+                    "/emoji_finder/query/", params={"query": f"benchmark {i}"}
+                )
+                if response.status_code != 200:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(
+        base_url=base_url, limits=limits, timeout=120
+    ) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "elapsed": elapsed,
+        "throughput": total / elapsed,
+        # 実効同時実行数 = 全リクエストのレイテンシ合計 / 経過時間
+        "effective_concurrency": sum(latencies) / elapsed,
+        "p50": latencies[len(latencies) // 2],
+        "p99": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))],
+        "errors": errors,
+    }
+
+
+def measure(label, tree, args, api_host):
+    port = free_port()
+    process = start_server(tree, port, api_host)
+    try:
+        result = asyncio.run(
+            run_load(f"http://127.0.0.1:{port}", args.concurrency, args.requests)
+        )
+    finally:
+        process.terminate()
+        process.wait()
+    result["label"] = label
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument(
+        "--latency", type=float, default=0.2, help="スタブAPIの応答遅延（秒）"
+    )
+    parser.add_argument("--baseline", help="比較対象のgitリビジョン")
+    args = parser.parse_args()
+
+    server, api_host = stub_api.start(latency=args.latency)
+    results = []
+    try:
+        if args.baseline:
+            with worktree(args.baseline) as tree:
+                results.append(measure(args.baseline, tree, args, api_host))
+        results.append(measure("current", BASE_DIR, args, api_host))
+    finally:
+        server.stop()
+
+    print(
+        f"concurrency={args.concurrency} requests={args.requests} "
+        f"upstream_latency={args.latency}s"
+    )
+    print(
+        f"{'revision':<16}{'req/s':>10}{'concurrent':>12}"
+        f"{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}"
+    )
+    for r in results:
+        print(
+            f"{r['label']:<16}{r['throughput']:>10.1f}"
+            f"{r['effective_concurrency']:>12.1f}"
+            f"{r['p50'] * 1000:>10.1f}{r['p99'] * 1000:>10.1f}{r['errors']:>8}"
+        )
+
+
+if __name__ == "__main__":
+    main()
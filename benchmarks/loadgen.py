@@ -0,0 +1,276 @@
+"""
+検索・回答・セッション発行を混ぜた負荷試験
+
+スタブの API_HOST（OpenAI のセッション作成APIを含む）を立ち上げ、
+main.asgi（gunicorn + UvicornWorker）と main.wsgi（gunicorn のスレッドワーカー）を
+順に起動して、同じリクエストの混合を送る。結果はリクエストの種類ごとの
+スループット・p50/p95/p99 レイテンシ・エラー率として表示する。
+
+検索キーワードは偏りのある分布（Zipf）で選ぶため、実際の利用と同じように
+キャッシュに当たるリクエストと当たらないリクエストが混ざる。
+
+    python -m benchmarks.loadgen --servers asgi,wsgi --requests 2000
+    python -m benchmarks.loadgen --mix search=70,answer=10,session=20 \\
+        --latency lognormal:0.2,0.6 --route-latency /answer=bimodal:1,5,0.1 \\
+        --error-rate 0.01 --baseline HEAD~1 --json result.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import secrets
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+from benchmarks import report, stub_api
+from benchmarks.concurrency import (
+    BASE_DIR,
+    free_port,
+    server_env,
+    start_server,
+    worktree,
+)
+
+SEARCH_PATHS = [
+    "/emoji_finder/query/",
+    "/qiita/query/",
+    "/keizokuryoku/query/",
+    "/read_images/query/",
+]
+
+VOICES = ["verse", "alloy", "coral"]
+
+# 負荷試験用のユーザーを作り、ログイン済みのセッションキーを出力する
+SETUP_USER = """
+from importlib import import_module
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.models import Permission, User
+
+user, _ = User.objects.get_or_create(username="loadgen")
+user.user_permissions.set(
+    Permission.objects.filter(codename__in=["view_readimages", "view_app"])
+)
+session = import_module(settings.SESSION_ENGINE).SessionStore()
+session[SESSION_KEY] = str(user.pk)
+session[BACKEND_SESSION_KEY] = "django.contrib.auth.backends.ModelBackend"
+session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+session.create()
+print(session.session_key)
+"""
+
+
+def parse_mix(value):
+    """ "search=80,answer=10,session=10" を {"search": 80, ...} に変換する"""
+    mix = {}
+    for item in value.split(","):
+        kind, _, weight = item.partition("=")
+        if kind not in ("search", "answer", "session"):
+            raise argparse.ArgumentTypeError(f"不明なリクエストの種類です: {kind}")
+        mix[kind] = float(weight)
+    return mix
+
+
+def server_command(kind, port, args):
+    """サーバーの種類（asgi / wsgi）ごとの gunicorn の起動コマンドを返す"""
+    command = [
+        sys.executable,
+        "-m",
+        "gunicorn",
+        "--bind",
+        f"127.0.0.1:{port}",
+        "--workers",
+        str(args.workers),
+        "--log-level",
+        "warning",
+    ]
+    if kind == "asgi":
+        return command + [
+            "-k",
+            "uvicorn.workers.UvicornWorker",
+            "main.asgi:application",
+        ]
+    return command + [
+        "-k",
+        "gthread",
+        "--threads",
+        str(args.threads),
+        "main.wsgi:application",
+    ]
+
+
+def prepare_database(tree, env):
+    """マイグレーションを実行し、ログイン済みのセッションキーを返す"""
+    manage = [sys.executable, "manage.py"]
+    subprocess.run(
+        manage + ["migrate", "--no-input"],
+        cwd=tree,
+        env=env,
+        check=True,
+        capture_output=True,
+    )
+    result = subprocess.run(
+        manage + ["shell", "-c", SETUP_USER],
+        cwd=tree,
+        env=env,
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    return result.stdout.strip().splitlines()[-1]
+
+
+class Workload:
+    """リクエストの混合と検索キーワードの分布から、次に送るリクエストを選ぶ"""
+
+    def __init__(self, mix, distinct_queries, seed=None):
+        self.kinds = list(mix)
+        self.weights = list(mix.values())
+        self.queries = [f"benchmark {i}" for i in range(distinct_queries)]
+        # 順位 r のキーワードを 1/r の重みで選ぶ（Zipf 分布）
+        self.query_weights = [1 / (r + 1) for r in range(distinct_queries)]
+        self.rng = random.Random(seed)
+
+    def query(self):
+        return self.rng.choices(self.queries, self.query_weights)[0]
+
+    def next(self):
+        """(種類, HTTP メソッド, パス, パラメータ) を返す"""
+        kind = self.rng.choices(self.kinds, self.weights)[0]
+        query = self.query()
+        if kind == "search":
+            return kind, "GET", self.rng.choice(SEARCH_PATHS), {"query": query}
+        if kind == "answer":
+            urls = [f"https://example.com/{i}.png" for i in range(3)]
+            return kind, "POST", "/read_images/answer/", {"query": query, "urls": urls}
+        params = {"voice": self.rng.choice(VOICES)}
+        return kind, "GET", "/openai_rtc/api/session/", params
+
+
+async def run_load(base_url, session_key, workload, concurrency, total):
+    """total 件のリクエストを concurrency 並列で送り、計測値と経過時間を返す"""
+    samples = []
+    counter = iter(range(total))
+    csrf_token = secrets.token_hex(16)
+
+    async def worker(client):
+        for _ in counter:
+            kind, method, path, params = workload.next()
+            started = time.perf_counter()
+            try:
+                if method == "GET":
+                    response = await client.get(path, params=params)
+                else:
+                    response = await client.post(
+                        path, data=params, headers={"X-CSRFToken": csrf_token}
+                    )
+                ok = 200 <= response.status_code < 300
+            except httpx.HTTPError:
+                ok = False
+            samples.append(report.Sample(kind, time.perf_counter() - started, ok))
+
+    limits = httpx.Limits(max_connections=concurrency)
+    cookies = {"sessionid": session_key, "csrftoken": csrf_token}
+    async with httpx.AsyncClient(
+        base_url=base_url, limits=limits, timeout=120, cookies=cookies
+    ) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return samples, elapsed
+
+
+def measure(label, kind, tree, args, api_host):
+    """1つのサーバーを起動して負荷をかけ、集計結果を返す"""
+    with tempfile.TemporaryDirectory() as tmp:
+        env = server_env(api_host)
+        env["DATABASE_URL"] = f"sqlite:///{Path(tmp) / 'db.sqlite3'}"
+        env["PROMETHEUS_MULTIPROC_DIR"] = str(Path(tmp) / "metrics")
+        env["SHARED_STATE_DIR"] = str(Path(tmp) / "state")
+        os.makedirs(env["PROMETHEUS_MULTIPROC_DIR"])
+        session_key = prepare_database(tree, env)
+
+        port = free_port()
+        process = start_server(
+            tree, port, api_host, command=server_command(kind, port, args), env=env
+        )
+        try:
+            workload = Workload(args.mix, args.distinct_queries, args.seed)
+            samples, elapsed = asyncio.run(
+                run_load(
+                    f"http://127.0.0.1:{port}",
+                    session_key,
+                    workload,
+                    args.concurrency,
+                    args.requests,
+                )
+            )
+        finally:
+            process.terminate()
+            process.wait()
+    return f"{label}:{kind}", report.summarize(samples, elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--servers", default="asgi,wsgi", help="asgi, wsgi")
+    parser.add_argument(
+        "--mix", type=parse_mix, default="search=80,answer=10,session=10"
+    )
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--distinct-queries", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=1, help="サーバーのワーカー数")
+    parser.add_argument(
+        "--threads", type=int, default=16, help="WSGI ワーカーあたりのスレッド数"
+    )
+    parser.add_argument("--latency", default="0.2", help="スタブAPIの遅延の指定")
+    parser.add_argument(
+        "--route-latency",
+        action="append",
+        metavar="PREFIX=SPEC",
+        help="スタブAPIのパスごとの遅延の指定（複数指定可）",
+    )
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--baseline", help="比較対象のgitリビジョン")
+    parser.add_argument("--json", help="集計結果を書き出すファイル")
+    args = parser.parse_args()
+
+    server, api_host = stub_api.start(
+        args.latency,
+        error_rate=args.error_rate,
+        routes=stub_api.parse_routes(args.route_latency),
+        seed=args.seed,
+    )
+    kinds = [kind.strip() for kind in args.servers.split(",") if kind.strip()]
+    results = []
+    try:
+        if args.baseline:
+            with worktree(args.baseline) as tree:
+                for kind in kinds:
+                    results.append(measure(args.baseline, kind, tree, args, api_host))
+        for kind in kinds:
+            results.append(measure("current", kind, BASE_DIR, args, api_host))
+    finally:
+        server.stop()
+
+    print(
+        f"concurrency={args.concurrency} requests={args.requests} "
+        f"mix={args.mix} latency={args.latency} error_rate={args.error_rate}"
+    )
+    print(report.format_table(results))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(dict(results), f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+負荷試験の結果の集計と表示
+
+リクエストごとの計測値（種類・レイテンシ・成否）から、種類ごとの
+スループット・p50/p95/p99 レイテンシ・エラー率を計算する。
+"""
+
+import math
+from collections import namedtuple
+
+# latency は秒、ok はステータス 2xx で応答したかどうか
+Sample = namedtuple("Sample", ["kind", "latency", "ok"])
+
+
+def percentile(sorted_values, q):
+    """昇順に並んだ値の q 分位点（最近傍順位法）。値がなければ None"""
+    if not sorted_values:
+        return None
+    index = max(0, math.ceil(q * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+def summarize(samples, elapsed):
+    """
+    計測値を種類ごとに集計する
+
+    :param samples: Sample の配列
+    :param elapsed: 計測にかかった時間（秒）
+    :return: {種類: 集計結果}。"all" に全体の集計を入れる
+    """
+    groups = {"all": samples}
+    for sample in samples:
+        groups.setdefault(sample.kind, []).append(sample)
+
+    summary = {}
+    for kind, group in groups.items():
+        latencies = sorted(s.latency for s in group)
+        errors = sum(1 for s in group if not s.ok)
+        summary[kind] = {
+            "requests": len(group),
+            "throughput": len(group) / elapsed if elapsed else None,
+            "p50": percentile(latencies, 0.50),
+            "p95": percentile(latencies, 0.95),
+            "p99": percentile(latencies, 0.99),
+            "error_rate": errors / len(group) if group else None,
+        }
+    return summary
+
+
+def format_table(results):
+    """
+    集計結果を表にする
+
+    :param results: [(ラベル, summarize() の結果), ...]
+    """
+
+    def ms(value):
+        return "-" if value is None else f"{value * 1000:.1f}"
+
+    lines = [
+        f"{'server':<20}{'kind':<10}{'requests':>9}{'req/s':>9}"
+        f"{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>9}"
+    ]
+    for label, summary in results:
+        for kind, row in summary.items():
+            lines.append(
+                f"{label:<20}{kind:<10}{row['requests']:>9}"
+                f"{row['throughput']:>9.1f}{ms(row['p50']):>10}"
+                f"{ms(row['p95']):>10}{ms(row['p99']):>10}"
+                f"{row['error_rate'] * 100:>8.1f}%"
+            )
+    return "\n".join(lines)
@@ -0,0 +1,188 @@
+"""
+起動時間（コールドスタート）の計測
+
+1. import の所要時間のプロファイル（python -X importtime）
+   main.asgi の読み込みと URL 設定の解決までに読み込まれるモジュールを、
+   累積時間・自身の時間の長い順に表示する。
+2. 最初の正常な応答までの時間
+   gunicorn（gunicorn.conf.py を使い、UvicornWorker 1つ）を起動してから
+   ワーカーがリクエストを受け付け始めるまでの時間と、指定したパスへの
+   最初のリクエストと2回目のリクエストの応答時間、起動から最初の 200 までの
+   時間を表示する。2回のリクエストは検索キーワードを変え、結果のキャッシュに
+   当たらないようにする。
+
+--baseline にリビジョンを渡すと、そのリビジョンも同じ条件で計測して並べる。
+
+    python -m benchmarks.startup
+    python -m benchmarks.startup --runs 5 --baseline HEAD~1
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+from benchmarks import stub_api
+from benchmarks.concurrency import BASE_DIR, free_port, server_env, worktree
+
+IMPORT_TARGET = (
+    "import main.asgi; "
+    "from django.urls import get_resolver; "
+    "get_resolver().url_patterns"
+)
+
+# ワーカーがリクエストを受け付け始めたかを確かめるための、存在しないパス
+PROBE_PATH = "/__startup_probe__"
+
+
+def parse_importtime(output):
+    """
+    -X importtime の出力を (モジュール名, 自身の秒数, 累積秒数, 深さ) の配列にする
+    """
+    entries = []
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|", 2)
+        depth = (len(name) - len(name.lstrip())) // 2
+        entries.append(
+            (name.strip(), int(self_us) / 1e6, int(cumulative_us) / 1e6, depth)
+        )
+    return entries
+
+
+def import_profile(tree, env):
+    """ソースツリーで main.asgi を読み込み、import の所要時間を返す"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", IMPORT_TARGET],
+        cwd=tree,
+        env=env,
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    return parse_importtime(result.stderr)
+
+
+def format_profile(label, entries, top):
+    total = sum(cumulative for _, _, cumulative, depth in entries if depth == 1)
+    lines = [f"[{label}] import の合計: {total * 1000:.0f} ms"]
+    for title, key in (("累積時間", 2), ("自身の時間", 1)):
+        lines.append(f"  {title}の長いモジュール:")
+        for entry in sorted(entries, key=lambda e: e[key], reverse=True)[:top]:
+            lines.append(f"    {entry[key] * 1000:8.1f} ms  {entry[0]}")
+    return "\n".join(lines)
+
+
+def first_response(tree, env, path, timeout):
+    """
+    gunicorn を起動し、最初の正常な応答までの時間を測る
+
+    gunicorn はワーカーの準備ができる前からポートを開いているため、
+    まず存在しないパスに何らかの応答が返るまで待ち（ワーカーが
+    リクエストを受け付け始めた時刻）、そのあと path に2回リクエストを送る。
+
+    :return: (起動から受け付け開始までの秒数, 最初のリクエストの秒数,
+        2回目のリクエストの秒数, 起動から最初の 200 までの秒数)
+    """
+    port = free_port()
+    command = [
+        sys.executable,
+        "-m",
+        "gunicorn",
+        "main.asgi:application",
+        "--config",
+        "gunicorn.conf.py",
+        "-k",
+        "uvicorn.workers.UvicornWorker",
+        "--workers",
+        "1",
+        "--bind",
+        f"127.0.0.1:{port}",
+        "--log-level",
+        "warning",
+    ]
+    started = time.perf_counter()
+    process = subprocess.Popen(command, cwd=tree, env=env)
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=60) as client:
+            while True:
+                if time.perf_counter() - started > timeout:
+                    raise RuntimeError(f"{timeout} 秒以内に起動しませんでした")
+                try:
+                    client.get(PROBE_PATH)
+                    break
+                except httpx.TransportError:
+                    time.sleep(0.05)
+            accepting = time.perf_counter() - started
+
+            latencies = []
+            for n in range(2):
+                request_started = time.perf_counter()
+                response = client.get(path.format(n=n))
+                latencies.append(time.perf_counter() - request_started)
+                if response.status_code != 200:
+                    raise RuntimeError(f"{path} が {response.status_code} を返しました")
+            return accepting, *latencies, time.perf_counter() - started - latencies[1]
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def measure(label, tree, args, api_host):
+    """ソースツリーの import の所要時間と、最初の正常な応答までの時間を測る"""
+    with tempfile.TemporaryDirectory() as tmp:
+        env = server_env(api_host)
+        env["DATABASE_URL"] = f"sqlite:///{Path(tmp) / 'db.sqlite3'}"
+        env["PROMETHEUS_MULTIPROC_DIR"] = str(Path(tmp) / "metrics")
+        env["SHARED_STATE_DIR"] = str(Path(tmp) / "state")
+        os.makedirs(env["PROMETHEUS_MULTIPROC_DIR"])
+
+        print(format_profile(label, import_profile(tree, env), args.top))
+        runs = [
+            first_response(tree, env, args.path, args.timeout) for _ in range(args.runs)
+        ]
+    return label, [statistics.median(values) for values in zip(*runs)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--path",
+        default="/emoji_finder/query/?query=startup{n}",
+        help="応答時間を測るパス（{n} はリクエストの番号に置き換える）",
+    )
+    parser.add_argument("--runs", type=int, default=3, help="起動を繰り返す回数")
+    parser.add_argument("--top", type=int, default=15, help="表示するモジュールの数")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--latency", default="0.05", help="スタブAPIの遅延の指定")
+    parser.add_argument("--baseline", help="比較対象のgitリビジョン")
+    args = parser.parse_args()
+
+    server, api_host = stub_api.start(args.latency)
+    results = []
+    try:
+        if args.baseline:
+            with worktree(args.baseline) as tree:
+                results.append(measure(args.baseline, tree, args, api_host))
+        results.append(measure("current", BASE_DIR, args, api_host))
+    finally:
+        server.stop()
+
+    print(f"\n最初の正常な応答まで（{args.path}、{args.runs} 回の中央値）")
+    print(f"{'':<12} {'受付開始':>10} {'初回':>10} {'2回目':>10} {'起動→200':>10}")
+    for label, (accepting, first, second, ready) in results:
+        print(
+            f"{label:<12} {accepting:>9.2f}s {first:>9.3f}s "
+            f"{second:>9.3f}s {ready:>9.2f}s"
+        )
+
+
+if __name__ == "__main__":
+    main()
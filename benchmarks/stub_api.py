@@ -0,0 +1,257 @@
+"""
+ベンチマーク用の API_HOST スタブサーバー
+
+どのパスへの POST にも、指定した遅延のあとで検索結果風の JSON 配列を返す。
+"stream": true を含むリクエストには、回答風のテキストを SSE で少しずつ返す。
+/v1/realtime/sessions には OpenAI Realtime API 風のセッショントークンを返す。
+/embeddings には OpenAI 互換の埋め込みAPI風に、入力ごとのベクトルを返す。
+多数の同時接続を捌けるよう、ASGI アプリとして uvicorn 上で動かす。
+
+遅延は固定値のほか、分布（一様・対数正規・まれに遅い二峰性）でも指定でき、
+パスごとに変えられる。error_rate の割合のリクエストには 500 を返す。
+単体でも起動できる:
+
+    python -m benchmarks.stub_api --port 8001 --latency lognormal:0.2,0.5 \
+        --route-latency /answer=2 --error-rate 0.01
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import socket
+import threading
+import time
+import uuid
+
+import uvicorn
+
+
+def make_results(query, count=10):
+    """検索APIのレスポンスに似せたダミーデータを生成する"""
+    return [
+        {
+            "similarity": round(1.0 - i / (count * 2), 4),
+            "metadata": {
+                "filename": f"Page_{i + 1}_U+1F60{i % 10}.png",
+                "url": f"https://example.com/{i}.png",
+                "timestamp": "2025-01-01T00:00:00Z",
+                "model": "stub",
+                "original_format": "png",
+                "query": query,
+            },
+        }
+        for i in range(count)
+    ]
+
+
+def make_session(request, lifetime=60):
+    """Realtime API のセッション作成レスポンスに似せたダミーデータを生成する"""
+    return {
+        "id": f"sess_{uuid.uuid4().hex}",
+        "object": "realtime.session",
+        "model": request.get("model"),
+        "modalities": request.get("modalities", ["audio", "text"]),
+        "client_secret": {
+            "value": f"ek_{uuid.uuid4().hex}",
+            "expires_at": int(time.time()) + lifetime,
+        },
+    }
+
+
+def make_embeddings(request, dim=256):
+    """
+    埋め込みAPIのレスポンスに似せたダミーデータを生成する
+
+    ベクトルは入力のテキストから決まる乱数で、同じテキストには同じベクトルを返す。
+    """
+    data = []
+    for i, text in enumerate(request.get("input", [])):
+        rng = random.Random(text)
+        data.append(
+            {
+                "object": "embedding",
+                "index": i,
+                "embedding": [rng.gauss(0, 1) for _ in range(dim)],
+            }
+        )
+    return {"object": "list", "data": data, "model": request.get("model")}
+
+
+def parse_latency(spec):
+    """
+    遅延の指定を、乱数生成器を受け取って遅延（秒）を返す関数に変換する
+
+    指定の形式:
+        0.2                     常に 0.2 秒
+        uniform:0.1,0.3         0.1〜0.3 秒の一様分布
+        lognormal:0.2,0.5       中央値 0.2 秒、σ=0.5 の対数正規分布
+        bimodal:0.1,2,0.05      通常 0.1 秒、5% の確率で 2 秒
+
+    :param spec: 指定の文字列、数値、またはすでに変換済みの関数
+    """
+    if callable(spec):
+        return spec
+    if isinstance(spec, (int, float)):
+        return lambda rng: spec
+    kind, _, params = spec.partition(":")
+    if not params:
+        value = float(kind)
+        return lambda rng: value
+    values = [float(v) for v in params.split(",")]
+    if kind == "uniform":
+        low, high = values
+        return lambda rng: rng.uniform(low, high)
+    if kind == "lognormal":
+        median, sigma = values
+        return lambda rng: rng.lognormvariate(math.log(median), sigma)
+    if kind == "bimodal":
+        fast, slow, slow_rate = values
+        return lambda rng: slow if rng.random() < slow_rate else fast
+    raise ValueError(f"不明な遅延の指定です: {spec}")
+
+
+class StubApp:
+    """
+    :param latency: 遅延の指定（parse_latency の形式）
+    :param error_rate: 500 を返すリクエストの割合
+    :param routes: パスの先頭ごとの遅延の指定（{"/answer": "2"} など）
+    :param seed: 乱数のシード（同じシードなら同じ遅延・エラーの列になる）
+    """
+
+    def __init__(self, latency=0.2, error_rate=0.0, routes=None, seed=None):
+        self.latency = parse_latency(latency)
+        self.error_rate = error_rate
+        self.routes = {
+            prefix: parse_latency(spec) for prefix, spec in (routes or {}).items()
+        }
+        self.rng = random.Random(seed)
+
+    def sample_latency(self, path):
+        """パスに応じた遅延（秒）を1つ選ぶ"""
+        for prefix, latency in self.routes.items():
+            if path.startswith(prefix):
+                return latency(self.rng)
+        return self.latency(self.rng)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+        request = json.loads(body or b"{}")
+        query = request.get("query", "")
+        latency = self.sample_latency(scope["path"])
+        failed = self.rng.random() < self.error_rate
+        await asyncio.sleep(latency)
+        if failed:
+            payload = json.dumps({"error": "stub error"}).encode()
+        elif request.get("stream"):
+            await self.stream_answer(query, send, latency)
+            return
+        elif scope["path"] == "/v1/realtime/sessions":
+            payload = json.dumps(make_session(request)).encode()
+        elif scope["path"] == "/embeddings":
+            payload = json.dumps(make_embeddings(request)).encode()
+        else:
+            payload = json.dumps(make_results(query)).encode()
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 500 if failed else 200,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(payload)).encode()),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": payload})
+
+    async def stream_answer(self, query, send, latency):
+        """Claude API のストリーミング形式で、回答を1文字ずつ送る"""
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [(b"content-type", b"text/event-stream")],
+            }
+        )
+        for char in f"「{query}」についての回答です。":
+            event = {"type": "content_block_delta", "delta": {"text": char}}
+            data = f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
+            await send(
+                {"type": "http.response.body", "body": data.encode(), "more_body": True}
+            )
+            await asyncio.sleep(latency / 10)
+        await send({"type": "http.response.body", "body": b""})
+
+
+class StubServer(uvicorn.Server):
+    def install_signal_handlers(self):
+        # メインスレッド以外で起動するためシグナルハンドラは登録しない
+        pass
+
+    def stop(self):
+        self.should_exit = True
+
+
+def start(latency=0.2, host="127.0.0.1", error_rate=0.0, routes=None, seed=None):
+    """
+    スタブサーバーをバックグラウンドスレッドで起動する
+
+    引数は StubApp と同じ。
+
+    :return: (サーバー, ベースURL)
+    """
+    sock = socket.socket()
+    sock.bind((host, 0))
+    config = uvicorn.Config(
+        StubApp(latency, error_rate, routes, seed),
+        log_level="warning",
+        lifespan="off",
+        backlog=2048,
+    )
+    server = StubServer(config)
+    threading.Thread(target=server.run, kwargs={"sockets": [sock]}, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return server, f"http://{host}:{sock.getsockname()[1]}"
+
+
+def parse_routes(values):
+    """["/answer=2", ...] を {"/answer": "2", ...} に変換する"""
+    routes = {}
+    for value in values or []:
+        prefix, _, spec = value.partition("=")
+        routes[prefix] = spec
+    return routes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", default="0.2", help="遅延の指定")
+    parser.add_argument(
+        "--route-latency",
+        action="append",
+        metavar="PREFIX=SPEC",
+        help="パスの先頭ごとの遅延の指定（複数指定可）",
+    )
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    app = StubApp(
+        args.latency, args.error_rate, parse_routes(args.route_latency), args.seed
+    )
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning", backlog=2048)
+
+
+if __name__ == "__main__":
+    main()
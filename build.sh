@@ -5,8 +5,26 @@ set -o errexit
 # Modify this line as needed for your package manager (pip, poetry, etc.)
 pip install -r requirements.txt
 
+# Bundle and minify each page's scripts (collected and hashed by collectstatic)
+python -m main.bundles
+
+# Build each app's Tailwind stylesheet and its inlined critical CSS
+python -m main.stylesheets
+
 # Convert static asset files
 python manage.py collectstatic --no-input
 
+# Build the local keizokuryoku search index when the page data and the
+# embedding model are provided (the vectors come from the embedding API)
+if [ -n "$KEIZOKURYOKU_PAGES_JSON" ] && [ -n "$EMBEDDING_MODEL" ]; then
+  python manage.py build_keizokuryoku_index "$KEIZOKURYOKU_PAGES_JSON"
+fi
+
+# Build the local emoji search index when the corpus snapshot and the
+# embedding model are provided (the vectors come from the embedding API)
+if [ -n "$EMOJI_FINDER_CORPUS_JSON" ] && [ -n "$EMBEDDING_MODEL" ]; then
+  python manage.py build_emoji_index "$EMOJI_FINDER_CORPUS_JSON"
+fi
+
 # Apply any outstanding database migrations
 python manage.py migrate
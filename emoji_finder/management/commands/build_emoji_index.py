@@ -0,0 +1,48 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from emoji_finder import search_index
+from main import embeddings, upstream
+
+
+class Command(BaseCommand):
+    help = (
+        "絵文字のコーパスを埋め込みAPI（EMBEDDING_MODEL）でベクトルにして"
+        "ローカル検索インデックスを作成する"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "source",
+            help='絵文字の JSON ファイル（[{"id": ..., "text": ..., "metadata": {...}}, ...]）',
+        )
+        parser.add_argument(
+            "--output",
+            default=None,
+            help="出力先ディレクトリ（省略時は EMOJI_FINDER_INDEX_DIR）",
+        )
+
+    def handle(self, *args, **options):
+        if not embeddings.available():
+            raise CommandError("EMBEDDING_MODEL を設定してください。")
+        try:
+            with open(options["source"], encoding="utf-8") as f:
+                emojis = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            raise CommandError(f"絵文字を読み込めませんでした: {e}")
+
+        if not isinstance(emojis, list) or not all("text" in e for e in emojis):
+            raise CommandError("各絵文字には text が必要です。")
+
+        output = options["output"] or settings.EMOJI_FINDER_INDEX_DIR
+        try:
+            search_index.build(emojis, output)
+        except upstream.UpstreamError as e:
+            raise CommandError(f"絵文字をベクトルにできませんでした: {e}")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{len(emojis)} 件の絵文字のインデックスを作成しました: {output}"
+            )
+        )
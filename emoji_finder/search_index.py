@@ -0,0 +1,85 @@
+"""
+絵文字の類似検索インデックス
+
+絵文字のコーパスは小さくほとんど変わらないため、説明文を上流APIの
+埋め込みモデルでベクトルにして float16 で保存したインデックスを作っておき、
+検索キーワードだけを同じモデルでベクトルにしてプロセス内で検索する。
+"""
+
+import logging
+
+import numpy as np
+from django.conf import settings
+
+from main import embeddings, metrics, server_timing, upstream
+from main.textindex import SharedIndex, build_index
+
+logger = logging.getLogger(__name__)
+
+_index = SharedIndex("EMOJI_FINDER_INDEX_DIR")
+
+
+def build(emojis, directory=None):
+    """
+    絵文字の配列からインデックスを作成する
+
+    :param emojis: {"id": ..., "text": 説明文, "metadata": {...}} の配列
+        （id を省略した場合は metadata の filename を使う）
+    """
+    docs = [
+        {
+            "id": emoji.get("id", emoji.get("metadata", {}).get("filename")),
+            "metadata": emoji.get("metadata", {}),
+        }
+        for emoji in emojis
+    ]
+    texts = [emoji["text"] for emoji in emojis]
+    build_index(
+        directory or settings.EMOJI_FINDER_INDEX_DIR,
+        texts,
+        docs,
+        embeddings.embed_documents(texts),
+        settings.EMBEDDING_MODEL,
+        dtype=np.float16,
+        bm25=False,
+    )
+
+
+def load():
+    """インデックスを読み込んでおく（ワーカーの起動時に呼ぶ）"""
+    if settings.EMOJI_FINDER_LOCAL_INDEX:
+        _index.get()
+
+
+async def search(query, k=None):
+    """
+    ローカルのインデックスで検索し、APIと同じ形式の絵文字の配列を返す
+
+    検索キーワードは埋め込みAPIでベクトルにする（一度ベクトルにした検索キーワードは
+    全ワーカーで共有するキャッシュから読む）。ローカル検索が無効な場合、
+    インデックスがないか別のモデルで作られている場合、埋め込みAPIを
+    呼べなかった場合、類似度が正の絵文字がない場合は None を返す
+    （呼び出し側はリモートの検索APIを使う）。
+    """
+    if not settings.EMOJI_FINDER_LOCAL_INDEX or not embeddings.available():
+        return None
+    index = _index.get()
+    if index is None or index.model != settings.EMBEDDING_MODEL:
+        metrics.LOCAL_SEARCHES.labels("emoji_finder", "unavailable").inc()
+        return None
+    try:
+        vector = await embeddings.embed_query(query)
+    except upstream.UpstreamError as e:
+        logger.warning("Embedding the emoji query failed: %s", e)
+        metrics.LOCAL_SEARCHES.labels("emoji_finder", "embedding_failed").inc()
+        return None
+    with server_timing.phase("search"):
+        results = index.search(query, k or settings.EMOJI_FINDER_TOP_K, vector=vector)
+    if not results:
+        metrics.LOCAL_SEARCHES.labels("emoji_finder", "no_results").inc()
+        return None
+    metrics.LOCAL_SEARCHES.labels("emoji_finder", "local").inc()
+    return [
+        {"similarity": similarity, "metadata": dict(index.docs[i]["metadata"])}
+        for i, _, similarity in results
+    ]
@@ -5,6 +5,7 @@ document.addEventListener('DOMContentLoaded', function() {
   // DOM要素
   const searchInput = document.getElementById('search-query');
   const searchButton = document.getElementById('search-button');
+  const searchSuggestions = document.getElementById('search-suggestions');
   const errorMessage = document.getElementById('error-message');
   const errorText = document.getElementById('error-text');
   const loadingIndicator = document.getElementById('loading-indicator');
@@ -13,6 +14,8 @@ document.addEventListener('DOMContentLoaded', function() {
   const resultsCount = document.getElementById('results-count');
   const emojiResults = document.getElementById('emoji-results');
   const noResults = document.getElementById('no-results');
+  const loadMoreContainer = document.getElementById('load-more-container');
+  const loadMoreButton = document.getElementById('load-more-button');
 
   // モーダル要素
   const modal = document.getElementById('emoji-modal');
@@ -24,9 +27,19 @@ document.addEventListener('DOMContentLoaded', function() {
   let currentSearchResults = [];
   let currentQuery = '';
 
+  // 次ページのカーソルと、先読み中の次ページ
+  let nextCursor = null;
+  let prefetchedPage = null;
+
+  // 取得中の入力候補のリクエスト（次の入力で取り消す）
+  let suggestController = null;
+
   // 検索ボタンのイベントリスナー
   searchButton.addEventListener('click', performSearch);
 
+  // 続きを読み込むボタンのイベントリスナー
+  loadMoreButton.addEventListener('click', loadMore);
+
   // Enter キーでも検索できるようにする
   searchInput.addEventListener('keypress', function(e) {
     if (e.key === 'Enter') {
@@ -34,6 +47,9 @@ document.addEventListener('DOMContentLoaded', function() {
     }
   });
 
+  // 入力のたびに過去の検索キーワードから候補を表示する
+  searchInput.addEventListener('input', updateSuggestions);
+
   // モーダルを閉じるボタンのイベントリスナー
   closeButton.addEventListener('click', closeModal);
 
@@ -51,6 +67,42 @@ document.addEventListener('DOMContentLoaded', function() {
     }
   });
 
+  /**
+   * 入力中の文字列で始まる過去の検索キーワードを候補に表示する
+   */
+  function updateSuggestions() {
+    const prefix = searchInput.value.trim();
+
+    // 前の候補の取得が終わっていなければ取り消す
+    if (suggestController) {
+      suggestController.abort();
+    }
+    if (!prefix) {
+      searchSuggestions.innerHTML = '';
+      return;
+    }
+
+    suggestController = new AbortController();
+    fetch(`/emoji_finder/suggest/?prefix=${encodeURIComponent(prefix)}`, {
+      headers: {
+        'X-Requested-With': 'XMLHttpRequest'
+      },
+      signal: suggestController.signal
+    })
+    .then(response => response.ok ? response.json() : { suggestions: [] })
+    .then(data => {
+      searchSuggestions.innerHTML = '';
+      data.suggestions.forEach(suggestion => {
+        const option = document.createElement('option');
+        option.value = suggestion;
+        searchSuggestions.appendChild(option);
+      });
+    })
+    .catch(() => {
+      // 候補が出せなくても検索はできるため、エラーは表示しない
+    });
+  }
+
   /**
    * 検索を実行する
    */
@@ -67,11 +119,42 @@ document.addEventListener('DOMContentLoaded', function() {
     resetUI();
     setSearchingState(true);
     
+    // 検索リクエスト（先頭ページ）
+    fetchPage(query, null)
+    .then(data => {
+      // 検索結果をグローバル変数に保存
+      currentSearchResults = data.emojis || [];
+      currentQuery = data.query || query;
+      
+      // 検索結果を表示
+      displayResults(data);
+      updateLoadMore(data);
+    })
+    .catch(error => {
+      showError(`検索中にエラーが発生しました: ${error.message}`);
+    })
+    .finally(() => {
+      // 検索中状態を解除
+      setSearchingState(false);
+    });
+  }
+
+  /**
+   * 検索結果の1ページを取得する
+   * @param {string} query - 検索クエリ
+   * @param {string|null} cursor - ページのカーソル（先頭ページは null）
+   * @returns {Promise<Object>} - APIからのレスポンスデータ
+   */
+  function fetchPage(query, cursor) {
     // CSRF トークンを取得
     const csrfToken = getCookie('csrftoken');
-    
-    // 検索リクエスト
-    fetch(`/emoji_finder/query/?query=${encodeURIComponent(query)}`, {
+
+    const params = new URLSearchParams({ query: query });
+    if (cursor) {
+      params.append('cursor', cursor);
+    }
+
+    return fetch(`/emoji_finder/query/?${params.toString()}`, {
       method: 'GET',
       headers: {
         'X-Requested-With': 'XMLHttpRequest',
@@ -85,21 +168,60 @@ document.addEventListener('DOMContentLoaded', function() {
         });
       }
       return response.json();
-    })
+    });
+  }
+
+  /**
+   * 次ページの有無に応じてボタンを切り替え、次ページを先読みする
+   * @param {Object} data - APIからのレスポンスデータ
+   */
+  function updateLoadMore(data) {
+    nextCursor = data.next_cursor || null;
+    if (!nextCursor) {
+      prefetchedPage = null;
+      loadMoreContainer.classList.add('hidden');
+      return;
+    }
+
+    // 現在のページを見ている間に次のページを取得しておく
+    const cursor = nextCursor;
+    prefetchedPage = {
+      cursor: cursor,
+      promise: fetchPage(currentQuery, cursor)
+    };
+    // 先読みの失敗はボタンを押したときに再取得するので、ここでは無視する
+    prefetchedPage.promise.catch(() => {});
+    loadMoreContainer.classList.remove('hidden');
+  }
+
+  /**
+   * 次のページを読み込んで結果の末尾に追加する
+   */
+  function loadMore() {
+    if (!nextCursor) return;
+
+    loadMoreButton.disabled = true;
+    const cursor = nextCursor;
+    const pending = prefetchedPage && prefetchedPage.cursor === cursor
+      ? prefetchedPage.promise.catch(() => fetchPage(currentQuery, cursor))
+      : fetchPage(currentQuery, cursor);
+
+    pending
     .then(data => {
-      // 検索結果をグローバル変数に保存
-      currentSearchResults = data.emojis || [];
-      currentQuery = data.query || query;
-      
-      // 検索結果を表示
-      displayResults(data);
+      // 読み込み中に別の検索が始まっていれば破棄する
+      if (data.query !== currentQuery) return;
+
+      const emojis = data.emojis || [];
+      const startIndex = currentSearchResults.length;
+      currentSearchResults = currentSearchResults.concat(emojis);
+      appendEmojis(emojis, startIndex);
+      updateLoadMore(data);
     })
     .catch(error => {
       showError(`検索中にエラーが発生しました: ${error.message}`);
     })
     .finally(() => {
-      // 検索中状態を解除
-      setSearchingState(false);
+      loadMoreButton.disabled = false;
     });
   }
 
@@ -153,13 +275,23 @@ document.addEventListener('DOMContentLoaded', function() {
     }
     
     // 結果の件数を表示
-    resultsCount.innerHTML = `<p>${data.emojis.length}件の結果が見つかりました</p>`;
+    resultsCount.innerHTML = `<p>${data.total || data.emojis.length}件の結果が見つかりました</p>`;
     
     // 絵文字結果をクリア
     emojiResults.innerHTML = '';
     
+    appendEmojis(data.emojis, 0);
+  }
+
+  /**
+   * 絵文字のカードを結果の末尾に追加する
+   * @param {Array} emojis - 絵文字の配列
+   * @param {number} startIndex - 先頭の絵文字の検索結果全体でのインデックス
+   */
+  function appendEmojis(emojis, startIndex) {
     // 各絵文字のカードを作成
-    data.emojis.forEach((emoji, index) => {
+    emojis.forEach((emoji, i) => {
+      const index = startIndex + i;
       const emojiCard = document.createElement('div');
       emojiCard.className = 'bg-white rounded-lg shadow-md p-4 hover:shadow-lg transition-shadow transform hover:-translate-y-1 cursor-pointer';
       emojiCard.dataset.index = index; // インデックスを記録
@@ -308,6 +440,9 @@ document.addEventListener('DOMContentLoaded', function() {
     errorMessage.classList.add('hidden');
     resultsContainer.classList.add('hidden');
     noResults.classList.add('hidden');
+    loadMoreContainer.classList.add('hidden');
+    nextCursor = null;
+    prefetchedPage = null;
   }
 
   /**
@@ -1,3 +1,88 @@
-from django.test import TestCase
+import shutil
+import tempfile
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.test import SimpleTestCase, override_settings
+
+from benchmarks import stub_api
+from main import embeddings, upstream
+from main.textindex import SharedIndex
+
+from . import search_index
+
+EMOJIS = [
+    {"text": "笑顔", "metadata": {"filename": "U+1F600.png"}},
+    {"text": "泣き顔", "metadata": {"filename": "U+1F622.png"}},
+    {"text": "ハート", "metadata": {"filename": "U+2764.png"}},
+]
+
+
+class LocalSearchTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server, api_host = stub_api.start(latency=0)
+        cls.addClassCleanup(cls.server.stop)
+        cls.tmp = Path(tempfile.mkdtemp())
+        cls.addClassCleanup(shutil.rmtree, cls.tmp)
+        cls.enterClassContext(
+            override_settings(
+                API_KEY="test",
+                UPSTREAM_URLS={
+                    **settings.UPSTREAM_URLS,
+                    "embedding": f"{api_host}/embeddings",
+                },
+                EMBEDDING_MODEL="stub",
+                EMOJI_FINDER_LOCAL_INDEX=True,
+                EMOJI_FINDER_INDEX_DIR=cls.tmp / "index",
+                CACHES={
+                    **settings.CACHES,
+                    "embeddings": {
+                        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+                        "LOCATION": str(cls.tmp / "embeddings"),
+                    },
+                },
+            )
+        )
+        search_index.build(EMOJIS)
+
+    def setUp(self):
+        patcher = mock.patch.object(
+            search_index, "_index", SharedIndex("EMOJI_FINDER_INDEX_DIR")
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def test_returns_positive_cosine_similarities_in_order(self):
+        results = await search_index.search("ハート")
+        self.assertEqual(results[0]["metadata"]["filename"], "U+2764.png")
+        # float16 で保存したベクトルでも同じ文のコサイン類似度はほぼ 1
+        self.assertAlmostEqual(results[0]["similarity"], 1.0, 2)
+
+        cosine = search_index._index.get().cosine_scores(
+            await embeddings.embed_query("ハート")
+        )
+        similarities = [result["similarity"] for result in results]
+        self.assertEqual(similarities, sorted(similarities, reverse=True))
+        self.assertEqual(len(results), int((cosine > 0).sum()))
+
+    async def test_query_vector_is_shared_after_first_embedding(self):
+        with mock.patch.object(
+            upstream, "post_json", wraps=upstream.post_json
+        ) as post_json:
+            await search_index.search("泣き顔")
+            await search_index.search("泣き顔")
+        self.assertEqual(post_json.call_count, 1)
+
+    async def test_falls_back_to_remote_without_model(self):
+        with override_settings(EMBEDDING_MODEL=""):
+            self.assertIsNone(await search_index.search("笑顔"))
+
+    async def test_falls_back_to_remote_when_embedding_fails(self):
+        with mock.patch.object(
+            upstream, "post_json", side_effect=upstream.Overloaded(1)
+        ):
+            with self.assertLogs("emoji_finder.search_index", "WARNING"):
+                self.assertIsNone(await search_index.search("埋め込めない検索"))
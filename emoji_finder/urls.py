@@ -7,4 +7,6 @@ app_name = "emoji_finder"
 urlpatterns = [
     path("", views.index, name="index"),
     path("query/", views.query, name="query"),
+    path("batch/", views.batch, name="batch"),
+    path("suggest/", views.suggest, name="suggest"),
 ]
@@ -1,4 +1,8 @@
 from django.shortcuts import render
 
+from main.prerender import prerendered
+
+
+@prerendered("facemesh/index.html")
 def index(request):
     return render(request, "facemesh/index.html")
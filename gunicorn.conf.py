@@ -0,0 +1,38 @@
+"""
+gunicorn の設定
+
+複数のワーカープロセスのメトリクスを /metrics でまとめて返せるよう、
+prometheus_client のマルチプロセスモードを有効にする。
+ワーカーはリクエストを受け付ける前にウォームアップ（main.warmup）を行う。
+"""
+
+import os
+import shutil
+import tempfile
+
+# prometheus_client を読み込む前に設定する必要がある
+os.environ.setdefault(
+    "PROMETHEUS_MULTIPROC_DIR",
+    os.path.join(tempfile.gettempdir(), "apps_jugoya_ai_metrics"),
+)
+
+from prometheus_client import multiprocess  # noqa: E402
+
+
+def on_starting(server):
+    # 前回の起動で残ったワーカーの値を消す
+    directory = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory, exist_ok=True)
+
+
+def child_exit(server, worker):
+    # 終了したワーカーの実行中の値（ゲージ）を集計から外す
+    multiprocess.mark_process_dead(worker.pid)
+
+
+def post_worker_init(worker):
+    # アプリケーション（Django）の読み込みが終わってから呼ばれる
+    from main import warmup
+
+    warmup.prepare()
@@ -1,6 +1,9 @@
 from django.shortcuts import render
 
+from main.prerender import prerendered
 
+
+@prerendered("kalman_filter/index.html")
 def index(request):
     """カルマンフィルタの説明とデモのメインページ"""
     return render(request, "kalman_filter/index.html")
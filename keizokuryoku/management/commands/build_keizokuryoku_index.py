@@ -0,0 +1,48 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from keizokuryoku import search_index
+from main import embeddings, upstream
+
+
+class Command(BaseCommand):
+    help = (
+        "事業継続力強化計画のページを埋め込みAPI（EMBEDDING_MODEL）で"
+        "ベクトルにしてローカル検索インデックスを作成する"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "source",
+            help='ページの JSON ファイル（[{"content": ..., "metadata": {...}}, ...]）',
+        )
+        parser.add_argument(
+            "--output",
+            default=None,
+            help="出力先ディレクトリ（省略時は KEIZOKURYOKU_INDEX_DIR）",
+        )
+
+    def handle(self, *args, **options):
+        if not embeddings.available():
+            raise CommandError("EMBEDDING_MODEL を設定してください。")
+        try:
+            with open(options["source"], encoding="utf-8") as f:
+                pages = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            raise CommandError(f"ページを読み込めませんでした: {e}")
+
+        if not isinstance(pages, list) or not all("content" in p for p in pages):
+            raise CommandError("各ページには content が必要です。")
+
+        output = options["output"] or settings.KEIZOKURYOKU_INDEX_DIR
+        try:
+            search_index.build(pages, output)
+        except upstream.UpstreamError as e:
+            raise CommandError(f"ページをベクトルにできませんでした: {e}")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{len(pages)} ページのインデックスを作成しました: {output}"
+            )
+        )
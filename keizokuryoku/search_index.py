@@ -0,0 +1,102 @@
+"""
+事業継続力強化計画のページ検索インデックス
+
+ドキュメントは1つで内容も固定のため、ページ本文を上流APIの埋め込みモデルで
+ベクトルにしたインデックスをあらかじめ作っておき、プロセス内で
+BM25 とベクトルのハイブリッド検索を行う。
+"""
+
+import logging
+import re
+
+from django.conf import settings
+
+from main import embeddings, metrics, server_timing, upstream
+from main.textindex import SharedIndex, build_index
+
+logger = logging.getLogger(__name__)
+
+DOCUMENT_TITLE = "事業継続力強化計画"
+
+PAGE_NUMBER_PATTERN = re.compile(r"Page_(\d+)")
+
+_index = SharedIndex("KEIZOKURYOKU_INDEX_DIR")
+
+
+def page_number(filename):
+    """filename からページ番号を抽出する。見つからなければ 0"""
+    match = PAGE_NUMBER_PATTERN.search(filename)
+    return int(match.group(1)) if match else 0
+
+
+def build(pages, directory=None):
+    """
+    ページの配列からインデックスを作成する
+
+    ページ番号とドキュメント名は作成時にメタデータへ付与しておく。
+
+    :param pages: {"content": 本文, "metadata": {...}} の配列
+    """
+    docs = []
+    for page in pages:
+        metadata = dict(page.get("metadata", {}))
+        metadata["page_number"] = page_number(metadata.get("filename", ""))
+        metadata["document_title"] = DOCUMENT_TITLE
+        docs.append({"metadata": metadata})
+    texts = [page["content"] for page in pages]
+    build_index(
+        directory or settings.KEIZOKURYOKU_INDEX_DIR,
+        texts,
+        docs,
+        embeddings.embed_documents(texts),
+        settings.EMBEDDING_MODEL,
+    )
+
+
+def load():
+    """インデックスを読み込んでおく（ワーカーの起動時に呼ぶ）"""
+    if settings.KEIZOKURYOKU_LOCAL_INDEX:
+        _index.get()
+
+
+async def search(query, k=None):
+    """
+    ローカルのインデックスで検索し、APIと同じ形式のページの配列を返す
+
+    検索キーワードは埋め込みAPIでベクトルにする。ローカル検索が無効な場合、
+    インデックスがないか別のモデルで作られている場合、埋め込みAPIを
+    呼べなかった場合、最も類似したページのコサイン類似度が
+    KEIZOKURYOKU_LOCAL_MIN_SIMILARITY 未満の場合は None を返す
+    （呼び出し側はリモートの検索APIを使う）。
+
+    ページは BM25 とコサイン類似度を混ぜたスコアの順に並べ、similarity には
+    リモートの検索APIと同じくコサイン類似度を入れる。
+    """
+    if not settings.KEIZOKURYOKU_LOCAL_INDEX or not embeddings.available():
+        return None
+    index = _index.get()
+    if index is None or index.model != settings.EMBEDDING_MODEL:
+        metrics.LOCAL_SEARCHES.labels("keizokuryoku", "unavailable").inc()
+        return None
+    try:
+        vector = await embeddings.embed_query(query)
+    except upstream.UpstreamError as e:
+        logger.warning("Embedding the keizokuryoku query failed: %s", e)
+        metrics.LOCAL_SEARCHES.labels("keizokuryoku", "embedding_failed").inc()
+        return None
+    with server_timing.phase("search"):
+        results = index.search(
+            query,
+            k or settings.KEIZOKURYOKU_TOP_K,
+            vector=vector,
+            keyword_weight=settings.KEIZOKURYOKU_KEYWORD_WEIGHT,
+        )
+    best = max((similarity for _, _, similarity in results), default=0.0)
+    if best < settings.KEIZOKURYOKU_LOCAL_MIN_SIMILARITY:
+        metrics.LOCAL_SEARCHES.labels("keizokuryoku", "low_confidence").inc()
+        return None
+    metrics.LOCAL_SEARCHES.labels("keizokuryoku", "local").inc()
+    return [
+        {"similarity": similarity, "metadata": dict(index.docs[i]["metadata"])}
+        for i, _, similarity in results
+    ]
@@ -5,6 +5,7 @@ document.addEventListener('DOMContentLoaded', function() {
   // DOM要素
   const searchInput = document.getElementById('search-query');
   const searchButton = document.getElementById('search-button');
+  const searchSuggestions = document.getElementById('search-suggestions');
   const errorMessage = document.getElementById('error-message');
   const errorText = document.getElementById('error-text');
   const loadingIndicator = document.getElementById('loading-indicator');
@@ -25,6 +26,9 @@ document.addEventListener('DOMContentLoaded', function() {
   let currentQuery = '';
   let currentPageIndex = 0;
 
+  // 取得中の入力候補のリクエスト（次の入力で取り消す）
+  let suggestController = null;
+
   // 検索ボタンのイベントリスナー
   searchButton.addEventListener('click', performSearch);
 
@@ -35,6 +39,9 @@ document.addEventListener('DOMContentLoaded', function() {
     }
   });
 
+  // 入力のたびに過去の検索キーワードから候補を表示する
+  searchInput.addEventListener('input', updateSuggestions);
+
   // モーダルを閉じるボタンのイベントリスナー
   closeButton.addEventListener('click', closeModal);
 
@@ -52,6 +59,42 @@ document.addEventListener('DOMContentLoaded', function() {
     }
   });
 
+  /**
+   * 入力中の文字列で始まる過去の検索キーワードを候補に表示する
+   */
+  function updateSuggestions() {
+    const prefix = searchInput.value.trim();
+
+    // 前の候補の取得が終わっていなければ取り消す
+    if (suggestController) {
+      suggestController.abort();
+    }
+    if (!prefix) {
+      searchSuggestions.innerHTML = '';
+      return;
+    }
+
+    suggestController = new AbortController();
+    fetch(`/keizokuryoku/suggest/?prefix=${encodeURIComponent(prefix)}`, {
+      headers: {
+        'X-Requested-With': 'XMLHttpRequest'
+      },
+      signal: suggestController.signal
+    })
+    .then(response => response.ok ? response.json() : { suggestions: [] })
+    .then(data => {
+      searchSuggestions.innerHTML = '';
+      data.suggestions.forEach(suggestion => {
+        const option = document.createElement('option');
+        option.value = suggestion;
+        searchSuggestions.appendChild(option);
+      });
+    })
+    .catch(() => {
+      // 候補が出せなくても検索はできるため、エラーは表示しない
+    });
+  }
+
   /**
    * 検索を実行する
    */
@@ -1,3 +1,86 @@
-from django.test import TestCase
+import shutil
+import tempfile
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.test import SimpleTestCase, override_settings
+
+from benchmarks import stub_api
+from main import embeddings, upstream
+from main.textindex import SharedIndex
+
+from . import search_index
+
+PAGES = [
+    {"content": "自然災害への備えと事前対策", "metadata": {"filename": "Page_1.png"}},
+    {"content": "感染症の拡大に備えた事業継続", "metadata": {"filename": "Page_2.png"}},
+    {"content": "設備の耐震化と代替拠点の確保", "metadata": {"filename": "Page_3.png"}},
+]
+
+
+class LocalSearchTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server, api_host = stub_api.start(latency=0)
+        cls.addClassCleanup(cls.server.stop)
+        cls.tmp = Path(tempfile.mkdtemp())
+        cls.addClassCleanup(shutil.rmtree, cls.tmp)
+        cls.enterClassContext(
+            override_settings(
+                API_KEY="test",
+                UPSTREAM_URLS={
+                    **settings.UPSTREAM_URLS,
+                    "embedding": f"{api_host}/embeddings",
+                },
+                EMBEDDING_MODEL="stub",
+                KEIZOKURYOKU_LOCAL_INDEX=True,
+                KEIZOKURYOKU_INDEX_DIR=cls.tmp / "index",
+                KEIZOKURYOKU_LOCAL_MIN_SIMILARITY=-1.0,
+                CACHES={
+                    **settings.CACHES,
+                    "embeddings": {
+                        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+                        "LOCATION": str(cls.tmp / "embeddings"),
+                    },
+                },
+            )
+        )
+        search_index.build(PAGES)
+
+    def setUp(self):
+        patcher = mock.patch.object(
+            search_index, "_index", SharedIndex("KEIZOKURYOKU_INDEX_DIR")
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def test_similarity_is_cosine(self):
+        query = PAGES[2]["content"]
+        pages = await search_index.search(query)
+        self.assertEqual(pages[0]["metadata"]["page_number"], 3)
+        self.assertEqual(pages[0]["metadata"]["document_title"], "事業継続力強化計画")
+
+        cosine = search_index._index.get().cosine_scores(
+            await embeddings.embed_query(query)
+        )
+        for page in pages:
+            number = page["metadata"]["page_number"]
+            self.assertAlmostEqual(page["similarity"], float(cosine[number - 1]), 5)
+
+    async def test_query_vector_is_shared_after_first_embedding(self):
+        with mock.patch.object(
+            upstream, "post_json", wraps=upstream.post_json
+        ) as post_json:
+            await search_index.search("耐震化の計画")
+            await search_index.search(" 耐震化の計画　")
+        self.assertEqual(post_json.call_count, 1)
+
+    async def test_low_similarity_falls_back_to_remote(self):
+        with override_settings(KEIZOKURYOKU_LOCAL_MIN_SIMILARITY=1.1):
+            self.assertIsNone(await search_index.search("代替拠点の確保"))
+
+    async def test_model_mismatch_falls_back_to_remote(self):
+        with override_settings(EMBEDDING_MODEL="other"):
+            self.assertIsNone(await search_index.search("代替拠点の確保"))
@@ -1,15 +1,15 @@
 from django.shortcuts import render
-from django.contrib.auth.decorators import permission_required
-import requests
-import dotenv
-import os
+from django.contrib.auth.decorators import login_required, permission_required
 import json
-import re
-from django.http import JsonResponse, HttpResponseServerError
-
-dotenv.load_dotenv()
+from django.http import HttpResponseServerError
+from django.conf import settings
+from main import batch_search, query_cache, server_timing, suggestions, upstream
+from main.prerender import prerendered
+from main.server_timing import JsonResponse
+from . import search_index
 
 
+@prerendered("keizokuryoku/index.html")
 def index(request):
     """
     メインページを表示する
@@ -17,7 +17,42 @@ def index(request):
     return render(request, "keizokuryoku/index.html")
 
 
-def query(request):
+async def search(search_query):
+    """
+    事業継続力強化計画のページを検索し、類似度順のページの配列を返す
+
+    ローカルのインデックスで十分に類似したページが見つかれば、その結果を返す。
+    見つからなければリモートの検索APIに問い合わせる。どちらの結果もキャッシュする。
+
+    :param search_query: 検索キーワード
+    :return: ページ番号とドキュメント名を付与したページの配列
+    """
+    api_url = settings.UPSTREAM_URLS["keizokuryoku"]
+    headers = {
+        "Content-Type": "application/json",
+        "api-key": settings.API_KEY,
+    }
+    payload = {
+        "query": search_query,
+    }
+
+    async def fetch():
+        pages = await search_index.search(search_query)
+        if pages is not None:
+            return pages
+
+        # APIリクエストの実行（共有コネクションプールを使い非同期で送信）
+        data = await upstream.post_json(
+            api_url, payload, headers, endpoint="keizokuryoku"
+        )
+        with server_timing.phase("decode"):
+            return process_pages(data)
+
+    # ページ番号付与・ソート済みの結果をキャッシュする
+    return await query_cache.cache.get_or_fetch("keizokuryoku", search_query, fetch)
+
+
+async def query(request):
     """
     事業継続力強化計画ドキュメント検索APIにクエリを送信し、結果をJSONで返す
     GETメソッドに対応
@@ -44,58 +79,80 @@ def query(request):
     }
 
     try:
-        api_url = f"{os.getenv('API_HOST')}{os.getenv('KEIZOKURYOKU_ENDPOINT')}"
-        headers = {
-            "Content-Type": "application/json",
-            "api-key": os.getenv("API_KEY"),
-        }
-        payload = {
-            "query": search_query,
-        }
-
-        # APIリクエストの実行
-        response = requests.post(api_url, json=payload, headers=headers)
-
-        # レスポンスのステータスコードを確認
-        if response.status_code != 200:
-            response_data["error"] = (
-                f"APIエラー: ステータスコード {response.status_code}"
-            )
-            return JsonResponse(response_data, status=500)
-
-        # JSONレスポンスをパース
-        try:
-            data = response.json()
-
-            # 各ページにページ番号情報を追加
-            processed_pages = []
-            for page in data:
-                # filenameからページ番号を抽出する
-                filename = page.get('metadata', {}).get('filename', '')
-                page_number_match = re.search(r'Page_(\d+)', filename)
-                page_number = int(page_number_match.group(1)) if page_number_match else 0
-                
-                # メタデータにページ番号情報を追加
-                if 'metadata' not in page:
-                    page['metadata'] = {}
-                page['metadata']['page_number'] = page_number
-                page['metadata']['document_title'] = "事業継続力強化計画"
-                
-                processed_pages.append(page)
-            
-            # 類似度の高い順にソート（降順）
-            processed_pages.sort(key=lambda x: x['similarity'], reverse=True)
-            
-            response_data["pages"] = processed_pages
-        except json.JSONDecodeError:
-            response_data["error"] = "APIからの応答を解析できませんでした。"
-            return JsonResponse(response_data, status=500)
-
-    except requests.RequestException as e:
-        response_data["error"] = f"API接続エラー: {str(e)}"
-        return JsonResponse(response_data, status=500)
+        response_data["pages"] = await search(search_query)
+        # 結果が得られた検索キーワードを入力候補に記録する
+        if response_data["pages"]:
+            await suggestions.record("keizokuryoku", search_query, request)
+    except upstream.UpstreamError as e:
+        response_data["error"] = str(e)
+        return JsonResponse(response_data, status=e.status, headers=e.headers)
     except Exception as e:
         response_data["error"] = f"予期しないエラーが発生しました: {str(e)}"
         return JsonResponse(response_data, status=500)
 
     return JsonResponse(response_data)
+
+
+@login_required
+async def batch(request):
+    """
+    複数の検索キーワードをまとめて検索し、検索キーワードごとの結果をJSONで返す
+    POSTメソッド（JSON）に対応
+
+    リクエスト:
+        queries: 検索キーワードの配列
+        limit: 1件あたりの件数（省略時は全件）
+
+    各結果は query と同じ形式で、失敗した場合は error と status を持つ。
+
+    ログインしたユーザーのみ利用でき、CSRF トークンが必要。
+
+    :param request: HTTPリクエスト
+    :return: JSON形式のレスポンス
+    """
+    return await batch_search.respond(request, search, "pages", paginated=False)
+
+
+async def suggest(request):
+    """
+    過去に結果が得られた検索キーワードから入力候補を返す
+    GETメソッドに対応
+
+    パラメータ:
+        prefix: 入力中の文字列（ひらがな・カタカナ、全角・半角を区別しない）
+
+    :param request: HTTPリクエスト
+    :return: JSON形式のレスポンス
+    """
+    prefix = request.GET.get("prefix", "")
+    return JsonResponse(
+        {"prefix": prefix, "suggestions": suggestions.suggest("keizokuryoku", prefix)}
+    )
+
+
+def process_pages(data):
+    """
+    APIの検索結果に、ページ番号とドキュメント名を付与して類似度順に並べる
+
+    :param data: APIから返されたページの配列
+    :return: 処理済みのページの配列
+    """
+    # 各ページにページ番号情報を追加
+    processed_pages = []
+    for page in data:
+        # filenameからページ番号を抽出する
+        filename = page.get("metadata", {}).get("filename", "")
+        page_number = search_index.page_number(filename)
+
+        # メタデータにページ番号情報を追加
+        if "metadata" not in page:
+            page["metadata"] = {}
+        page["metadata"]["page_number"] = page_number
+        page["metadata"]["document_title"] = search_index.DOCUMENT_TITLE
+
+        processed_pages.append(page)
+
+    # 類似度の高い順にソート（降順）
+    processed_pages.sort(key=lambda x: x["similarity"], reverse=True)
+
+    return processed_pages
@@ -0,0 +1,142 @@
+"""
+上流APIごとの同時実行数の制限（アドミッション制御）
+
+アクセスが集中したときに上流APIへの同時リクエストが際限なく増えると、
+全員の応答が遅くなり、最後にはタイムアウトする。そこで上流APIごとに
+同時実行数の上限を設け、超えた分は待ち行列に並ばせる。
+
+待ち行列が一杯のときや、待ち時間の上限を過ぎたときは待たずに
+Rejected を送出し、呼び出し元はすぐに 503 を返す（ロードシェディング）。
+"""
+
+import asyncio
+import math
+import weakref
+from collections import Counter, deque
+
+from django.conf import settings
+
+from main import metrics
+
+
+class Rejected(Exception):
+    """同時実行数の上限に達していて受け付けられなかったことを表す例外"""
+
+    def __init__(self, endpoint, retry_after):
+        super().__init__(f"{endpoint}: 同時実行数の上限に達しています")
+        self.retry_after = retry_after
+
+
+class Limiter:
+    """同時実行数の上限と、長さ・待ち時間に上限のある待ち行列"""
+
+    def __init__(self, name, concurrency, queue_size, max_wait):
+        self.name = name
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.max_wait = max_wait
+        self.in_flight = 0
+        self._waiters = deque()
+        self._stats = Counter()
+        self._queue_depth = metrics.UPSTREAM_QUEUE_DEPTH.labels(name)
+
+    @property
+    def retry_after(self):
+        """再試行までの目安（秒）。待ち時間の上限を切り上げた値"""
+        return max(1, math.ceil(self.max_wait))
+
+    def busy(self):
+        """上限まで実行中かどうか（待たずに実行できないかどうか）"""
+        return self.in_flight >= self.concurrency
+
+    async def acquire(self):
+        """
+        実行枠を1つ確保する。空きがなければ待ち行列に並んで待つ
+
+        :raises Rejected: 待ち行列が一杯の場合と、max_wait 秒待っても
+            順番が来なかった場合
+        """
+        if self.in_flight < self.concurrency and not self._waiters:
+            self.in_flight += 1
+            self._stats["admitted"] += 1
+            return
+
+        if len(self._waiters) >= self.queue_size:
+            self._stats["rejected"] += 1
+            raise Rejected(self.name, self.retry_after)
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self._queue_depth.inc()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.max_wait)
+        except (TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # 待ち終わると同時に枠が渡されていた
+                if isinstance(e, TimeoutError):
+                    self._stats["admitted"] += 1
+                    return
+                self.release()
+                raise
+            waiter.cancel()
+            self._waiters.remove(waiter)
+            self._queue_depth.dec()
+            if isinstance(e, TimeoutError):
+                self._stats["timed_out"] += 1
+                raise Rejected(self.name, self.retry_after) from None
+            raise
+        self._stats["admitted"] += 1
+
+    def release(self):
+        """実行枠を返す。待っている呼び出し元がいれば、その枠をそのまま渡す"""
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            self._queue_depth.dec()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.in_flight -= 1
+
+    def counts(self):
+        return {
+            "in_flight": self.in_flight,
+            "queued": len(self._waiters),
+            **{
+                name: self._stats[name]
+                for name in ("admitted", "rejected", "timed_out")
+            },
+        }
+
+
+_limiters = weakref.WeakKeyDictionary()
+
+
+def limiter(endpoint):
+    """
+    実行中のイベントループで使う、上流APIの Limiter を返す
+
+    待ち行列の Future はイベントループに属するため、ループごとに作る。
+    """
+    loop = asyncio.get_running_loop()
+    limiters = _limiters.setdefault(loop, {})
+    endpoint_limiter = limiters.get(endpoint)
+    if endpoint_limiter is None:
+        concurrency, queue_size, max_wait = settings.UPSTREAM_LIMITS.get(
+            endpoint, settings.UPSTREAM_DEFAULT_LIMIT
+        )
+        endpoint_limiter = limiters[endpoint] = Limiter(
+            endpoint, concurrency, queue_size, max_wait
+        )
+    return endpoint_limiter
+
+
+def stats():
+    """上流APIごとの実行中・待ち行列の長さ（ゲージ）と受付・拒否の回数を返す"""
+    totals = {}
+    for limiters in list(_limiters.values()):
+        for name, endpoint_limiter in list(limiters.items()):
+            counts = totals.setdefault(name, Counter())
+            counts.update(endpoint_limiter.counts())
+            counts["concurrency"] = endpoint_limiter.concurrency
+            counts["queue_size"] = endpoint_limiter.queue_size
+    return {name: dict(counts) for name, counts in totals.items()}
@@ -0,0 +1,9 @@
+from django.contrib.staticfiles.apps import StaticFilesConfig as BaseStaticFilesConfig
+
+
+class StaticFilesConfig(BaseStaticFilesConfig):
+    # Tailwind の入力ファイルは配信しない。@import "tailwindcss" を
+    # ManifestStaticFilesStorage が解決できず、collectstatic が失敗するため
+    ignore_patterns = BaseStaticFilesConfig.ignore_patterns + [
+        "tailwindcss/css/input.css",
+    ]
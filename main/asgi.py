@@ -14,3 +14,9 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "main.settings")
 
 application = get_asgi_application()
+
+# django.setup() のあとで読み込む
+from main import warmup  # noqa: E402
+
+# リクエストを受け付ける前にウォームアップを行う
+application = warmup.lifespan(application)
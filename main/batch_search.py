@@ -0,0 +1,123 @@
+"""
+複数の検索キーワードをまとめて検索するバッチAPI
+
+1リクエストで受け取った検索キーワードを並行して検索する。
+上流APIに一度に大量のリクエストが流れないよう、同時実行数には上限を設ける。
+検索キーワードごとに成功・失敗を返すため、一部が失敗しても残りの結果は得られる。
+"""
+
+import asyncio
+import json
+
+from django.conf import settings
+
+from main import pagination
+from main.server_timing import JsonResponse
+from main.upstream import UpstreamError
+
+
+def parse_request(request):
+    """
+    リクエストの JSON から検索キーワードの配列と1件あたりの件数を取り出す
+
+    :return: (重複を除いた検索キーワードの配列, 件数。指定がなければ None)
+    :raises ValueError: リクエストが不正な場合
+    """
+    try:
+        body = json.loads(request.body or b"{}")
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        raise ValueError("リクエストの JSON を解析できませんでした。")
+
+    queries = body.get("queries") if isinstance(body, dict) else None
+    if not isinstance(queries, list) or not all(isinstance(q, str) for q in queries):
+        raise ValueError("queries には検索キーワードの配列を指定してください。")
+    if len(queries) > settings.BATCH_SEARCH_MAX_QUERIES:
+        raise ValueError(
+            f"一度に検索できるのは {settings.BATCH_SEARCH_MAX_QUERIES} 件までです。"
+        )
+
+    limit = body.get("limit")
+    if limit is not None:
+        limit = pagination.parse_limit(str(limit))
+    return list(dict.fromkeys(q.strip() for q in queries)), limit
+
+
+async def run(queries, search):
+    """
+    検索キーワードごとに search() を並行して実行し、結果または例外を返す
+
+    同時に実行する数は BATCH_SEARCH_CONCURRENCY までに制限する。
+
+    :param search: 検索キーワードを受け取り、結果の配列を返すコルーチン関数
+    :return: {検索キーワード: 結果の配列または例外}
+    """
+    semaphore = asyncio.Semaphore(settings.BATCH_SEARCH_CONCURRENCY)
+
+    async def search_one(search_query):
+        async with semaphore:
+            return await search(search_query)
+
+    results = await asyncio.gather(
+        *(search_one(q) for q in queries), return_exceptions=True
+    )
+    return dict(zip(queries, results))
+
+
+def item(results_key, result, limit, paginated=True):
+    """
+    1つの検索キーワードの結果を、通常の検索APIと同じ形式にする
+
+    通常の検索APIがカーソルを受け付けない（paginated=False）場合は、
+    続きを取得できないため next_cursor を返さない。
+    """
+    if isinstance(result, UpstreamError):
+        return {results_key: [], "error": str(result), "status": result.status}
+    if isinstance(result, BaseException):
+        return {
+            results_key: [],
+            "error": f"予期しないエラーが発生しました: {str(result)}",
+            "status": 500,
+        }
+    if limit is None:
+        return {results_key: result, "error": None}
+    page, next_cursor = pagination.paginate(result, 0, limit)
+    if not paginated:
+        return {results_key: page, "total": len(result), "error": None}
+    return {
+        results_key: page,
+        "next_cursor": next_cursor,
+        "total": len(result),
+        "error": None,
+    }
+
+
+async def respond(request, search, results_key, paginated=True):
+    """
+    バッチ検索のリクエストを処理し、検索キーワードごとの結果を返す
+
+    :param search: アプリの検索処理（検索キーワード -> 結果の配列）
+    :param results_key: 結果の配列を入れるキー（"emojis" など）
+    :param paginated: 通常の検索APIがページ単位で返すかどうか
+    """
+    if request.method != "POST":
+        return JsonResponse({"error": "POSTリクエストのみ対応しています。"}, status=400)
+
+    try:
+        queries, limit = parse_request(request)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    if paginated and limit is None:
+        limit = pagination.DEFAULT_LIMIT
+
+    empty = [q for q in queries if not q]
+    queries = [q for q in queries if q]
+    results = await run(queries, search)
+
+    items = {q: item(results_key, r, limit, paginated) for q, r in results.items()}
+    for q in empty:
+        items[q] = {
+            results_key: [],
+            "error": "検索キーワードを入力してください。",
+            "status": 400,
+        }
+    return JsonResponse({"results": items, "error": None})
@@ -0,0 +1,139 @@
+"""
+ページごとの JavaScript のバンドル
+
+各ページのスクリプトを1つのファイルにまとめて最小化し、STATIC_BUILD_DIR に
+書き出す。collectstatic（CompressedManifestStaticFilesStorage）がファイル名に
+内容のハッシュを付け、gzip と Brotli で圧縮したファイルを作る。WhiteNoise は
+ハッシュ付きのファイルを immutable なキャッシュヘッダーで配信する。
+
+スクリプトはモジュールではなく、グローバルを共有する通常のスクリプトのため、
+読み込む順に連結してから最小化する（トップレベルの名前は変えない）。
+最小化には esbuild を使い、使えない環境では連結だけ行う。
+
+build.sh から collectstatic の前に実行する。
+
+    python -m main.bundles
+"""
+
+import os
+import subprocess
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+
+# バンドル名: 読み込む順に並べたスクリプト（静的ファイルのパス）
+BUNDLES = {
+    "read_images": ["read_images/js/app.js"],
+    "emoji_finder": ["emoji_finder/js/app.js"],
+    "qiita": ["qiita/js/app.js"],
+    "keizokuryoku": ["keizokuryoku/js/app.js"],
+    "kalman_filter": ["kalman_filter/js/kalman_visualization.js"],
+    "openai_rtc": ["openai_rtc/js/webrtc-client.js"],
+    "translator": [
+        "translator/js/webrtc-client.js",
+        "translator/js/webrtc-api.js",
+        "translator/js/webrtc-core.js",
+        "translator/js/webrtc-main.js",
+    ],
+    "subtitle_client": ["subtitle/js/subtitle-client.js"],
+    "subtitle_viewer": ["subtitle/js/subtitle-viewer.js"],
+}
+
+# esbuild の起動コマンド（標準入力のスクリプトを最小化して標準出力に書く）
+ESBUILD_COMMAND = os.environ.get("ESBUILD_COMMAND", "npx --yes esbuild@0.25").split()
+
+
+def path(name):
+    """バンドルの静的ファイルのパス"""
+    return f"bundles/{name}.js"
+
+
+def scripts(name):
+    """
+    ページで読み込むスクリプトの静的ファイルのパスを返す
+
+    JS_BUNDLES が有効ならバンドル1つ、無効なら元のスクリプトを順に返す。
+    """
+    if settings.JS_BUNDLES:
+        return [path(name)]
+    return BUNDLES[name]
+
+
+def concatenate(sources):
+    """スクリプトを順に連結する（末尾のセミコロンが省略されていても壊れないようにする）"""
+    parts = []
+    for source in sources:
+        with open(finders.find(source), encoding="utf-8") as f:
+            parts.append(f"/* {source} */\n{f.read().rstrip()}\n;\n")
+    return "".join(parts)
+
+
+def minify(code):
+    """
+    esbuild でスクリプトを最小化する
+
+    :return: 最小化したスクリプト。esbuild を実行できなかった場合は None
+    """
+    try:
+        result = subprocess.run(
+            [
+                *ESBUILD_COMMAND,
+                "--minify",
+                "--loader=js",
+                "--charset=utf8",
+                "--target=es2020",
+            ],
+            input=code,
+            capture_output=True,
+            text=True,
+            check=True,
+            timeout=120,
+        )
+    except (OSError, subprocess.SubprocessError) as e:
+        reason = (getattr(e, "stderr", None) or str(e)).strip().splitlines()[0]
+        print(f"esbuild を実行できなかったため、最小化せずに連結します: {reason}")
+        return None
+    return result.stdout
+
+
+def build(output_dir=None):
+    """
+    すべてのバンドルを書き出す
+
+    :return: [(バンドル名, 元のサイズ, バンドルのサイズ, 最小化したか)]
+    """
+    output_dir = Path(output_dir or settings.STATIC_BUILD_DIR)
+    results = []
+    use_esbuild = True
+    for name, sources in BUNDLES.items():
+        code = concatenate(sources)
+        minified = minify(code) if use_esbuild else None
+        # 一度失敗したら、残りのバンドルでは esbuild を試さない
+        use_esbuild = minified is not None
+        output = output_dir / path(name)
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(minified or code, encoding="utf-8")
+        results.append(
+            (
+                name,
+                len(code.encode()),
+                output.stat().st_size,
+                minified is not None,
+            )
+        )
+    return results
+
+
+def main():
+    import django
+
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "main.settings")
+    django.setup()
+    for name, original, size, minified in build():
+        note = "" if minified else "（最小化なし）"
+        print(f"{path(name)}: {original:,} -> {size:,} bytes{note}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+"""
+上流APIごとのサーキットブレーカー
+
+上流APIが障害中でも、リクエストのたびにタイムアウトや失敗を待つと
+ワーカーの処理能力が失われる。直近の呼び出しの失敗率・遅延の割合が
+しきい値を超えたら回路を開き（open）、しばらくの間は上流APIを呼ばずに
+すぐに失敗させる。一定時間が経つと少数の試行だけを通し（half-open）、
+成功すれば元に戻す（closed）。
+"""
+
+import threading
+import time
+from collections import Counter, deque
+
+from django.conf import settings
+
+from main import metrics
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# メトリクスで状態を表す値
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpen(Exception):
+    """回路が開いていて呼び出しを行わなかったことを表す例外"""
+
+    def __init__(self, endpoint, retry_after):
+        super().__init__(f"{endpoint}: サーキットブレーカーが開いています")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    直近 window 回の呼び出しの結果から、回路の開閉を判断する
+
+    次のどちらかを満たすと回路を開く（直近の呼び出しが min_calls 回以上のとき）。
+    - 失敗の割合が error_rate 以上
+    - slow_call_seconds 秒以上かかった呼び出しの割合が slow_call_rate 以上
+    """
+
+    def __init__(
+        self,
+        name,
+        window,
+        min_calls,
+        error_rate,
+        slow_call_seconds,
+        slow_call_rate,
+        open_seconds,
+        half_open_calls,
+    ):
+        self.name = name
+        self.window = window
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate = slow_call_rate
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+        self.state = CLOSED
+        # 直近の呼び出しの (失敗したか, 遅かったか)
+        self._results = deque(maxlen=window)
+        self._opened_at = 0.0
+        self._probes = 0
+        self._probe_successes = 0
+        self._lock = threading.Lock()
+        self._stats = Counter()
+
+    def before_call(self):
+        """
+        呼び出してよいかを確認する
+
+        :raises CircuitOpen: 回路が開いている場合と、half-open で
+            試行の枠がすでに使われている場合
+        """
+        with self._lock:
+            if self.state == OPEN:
+                remaining = self._opened_at + self.open_seconds - time.monotonic()
+                if remaining > 0:
+                    self._stats["rejected"] += 1
+                    raise CircuitOpen(self.name, remaining)
+                self._set_state(HALF_OPEN)
+                self._probes = 0
+                self._probe_successes = 0
+            if self.state == HALF_OPEN:
+                if self._probes >= self.half_open_calls:
+                    self._stats["rejected"] += 1
+                    raise CircuitOpen(self.name, 1)
+                self._probes += 1
+
+    def abandon(self):
+        """
+        before_call のあとで呼び出しをやめた（結果が出なかった）ことを記録する
+
+        half-open の試行の枠を返し、次のリクエストで試行できるようにする。
+        """
+        with self._lock:
+            if self.state == HALF_OPEN and self._probes > 0:
+                self._probes -= 1
+
+    def record(self, failed, duration):
+        """呼び出しの結果を記録し、回路の状態を更新する"""
+        slow = duration >= self.slow_call_seconds
+        with self._lock:
+            self._stats["failures" if failed else "successes"] += 1
+            if slow:
+                self._stats["slow_calls"] += 1
+
+            if self.state == HALF_OPEN:
+                if failed or slow:
+                    self._open()
+                else:
+                    self._probe_successes += 1
+                    if self._probe_successes >= self.half_open_calls:
+                        self._set_state(CLOSED)
+                        self._results.clear()
+                return
+            if self.state == OPEN:
+                return
+
+            self._results.append((failed, slow))
+            if len(self._results) < self.min_calls:
+                return
+            failures = sum(1 for f, _ in self._results if f)
+            slow_calls = sum(1 for _, s in self._results if s)
+            if (
+                failures / len(self._results) >= self.error_rate
+                or slow_calls / len(self._results) >= self.slow_call_rate
+            ):
+                self._open()
+
+    def _set_state(self, state):
+        self.state = state
+        metrics.CIRCUIT_STATE.labels(self.name).set(STATE_VALUES[state])
+
+    def _open(self):
+        self._set_state(OPEN)
+        self._opened_at = time.monotonic()
+        self._results.clear()
+        self._stats["opened"] += 1
+
+    def snapshot(self):
+        """回路の状態と、直近の失敗率・呼び出し回数などを返す"""
+        with self._lock:
+            calls = len(self._results)
+            failures = sum(1 for f, _ in self._results if f)
+            snapshot = {
+                "state": self.state,
+                "recent_calls": calls,
+                "recent_error_rate": failures / calls if calls else None,
+                **{
+                    name: self._stats[name]
+                    for name in (
+                        "successes",
+                        "failures",
+                        "slow_calls",
+                        "rejected",
+                        "opened",
+                    )
+                },
+            }
+            if self.state == OPEN:
+                snapshot["retry_after"] = max(
+                    0, self._opened_at + self.open_seconds - time.monotonic()
+                )
+            return snapshot
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def breaker(endpoint):
+    """上流APIのサーキットブレーカーを返す（プロセスごとに1つ）"""
+    with _breakers_lock:
+        endpoint_breaker = _breakers.get(endpoint)
+        if endpoint_breaker is None:
+            config = settings.CIRCUIT_BREAKER
+            endpoint_breaker = _breakers[endpoint] = CircuitBreaker(
+                endpoint,
+                window=config["window"],
+                min_calls=config["min_calls"],
+                error_rate=config["error_rate"],
+                slow_call_seconds=settings.CIRCUIT_BREAKER_SLOW_CALL_SECONDS.get(
+                    endpoint, config["slow_call_seconds"]
+                ),
+                slow_call_rate=config["slow_call_rate"],
+                open_seconds=config["open_seconds"],
+                half_open_calls=config["half_open_calls"],
+            )
+        return endpoint_breaker
+
+
+def stats():
+    """上流APIごとの回路の状態を返す"""
+    with _breakers_lock:
+        breakers = list(_breakers.items())
+    return {name: endpoint_breaker.snapshot() for name, endpoint_breaker in breakers}
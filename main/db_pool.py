@@ -0,0 +1,46 @@
+"""
+データベースのコネクションプールの統計
+
+PostgreSQL で OPTIONS["pool"] を設定すると、Django はワーカープロセスごとに
+psycopg_pool のプールを作る。リクエストの終了ごとにプールの統計を取り出し、
+接続の待ち時間や待ち行列の長さを Prometheus のメトリクスとして記録する。
+"""
+
+from django.core.signals import request_finished
+from django.db import connections
+
+from main import metrics
+
+
+def get_pool(alias="default"):
+    """プールを返す。プールを使っていない（SQLite など）場合は None"""
+    return getattr(connections[alias], "pool", None)
+
+
+def stats(alias="default"):
+    """プールの接続数・待ち数などを返す。プールを使っていなければ None"""
+    pool = get_pool(alias)
+    if pool is None:
+        return None
+    return pool.get_stats()
+
+
+def export_metrics(sender, **kwargs):
+    """前回からの待ち時間・貸し出し回数と、現在の接続数をメトリクスに記録する"""
+    pool = get_pool()
+    if pool is None:
+        return
+    # pop_stats() は累積値を取り出してリセットするため、差分を加算できる
+    pool_stats = pool.pop_stats()
+    metrics.DB_POOL_WAIT.inc(pool_stats.get("requests_wait_ms", 0) / 1000)
+    metrics.DB_POOL_REQUESTS.inc(pool_stats.get("requests_num", 0))
+    metrics.DB_POOL_ERRORS.inc(pool_stats.get("requests_errors", 0))
+    for state, key in (
+        ("open", "pool_size"),
+        ("available", "pool_available"),
+        ("waiting", "requests_waiting"),
+    ):
+        metrics.DB_POOL_CONNECTIONS.labels(state).set(pool_stats.get(key, 0))
+
+
+request_finished.connect(export_metrics, dispatch_uid="db_pool_export_metrics")
@@ -0,0 +1,46 @@
+"""
+リクエストごとの処理期限（デッドライン）
+
+リクエストを受け付けた時点で期限を決め、コンテキスト変数で上流APIの
+呼び出しまで引き継ぐ。上流APIの呼び出しは残り時間を超えて待たないため、
+遅い上流APIがあってもリクエスト全体の応答時間は期限で頭打ちになる。
+
+コンテキスト変数は asyncio のタスクにもコピーされるため、リクエストの
+処理中に起動したタスク（並行検索など）も同じ期限に従う。リクエストより
+長く動き続けるタスクは、空のコンテキスト（contextvars.Context()）で起動する。
+"""
+
+import contextvars
+import time
+
+_deadline = contextvars.ContextVar("deadline", default=None)
+
+
+def start(seconds):
+    """
+    現在のコンテキストに、今から seconds 秒後の期限を設定する
+
+    :param seconds: 期限までの秒数。None か 0 以下なら期限を設けない
+    :return: reset() に渡すトークン
+    """
+    value = time.monotonic() + seconds if seconds and seconds > 0 else None
+    return _deadline.set(value)
+
+
+def reset(token):
+    """start() で設定した期限を元に戻す"""
+    _deadline.reset(token)
+
+
+def remaining():
+    """期限までの残り秒数を返す（期限を過ぎていれば 0 以下）。期限がなければ None"""
+    value = _deadline.get()
+    if value is None:
+        return None
+    return value - time.monotonic()
+
+
+def expired():
+    """期限を過ぎているかどうか"""
+    left = remaining()
+    return left is not None and left <= 0
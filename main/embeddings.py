@@ -0,0 +1,114 @@
+"""
+上流APIの埋め込みモデルによるテキストのベクトル
+
+ローカル検索インデックス（main.textindex）の文書ベクトルは、インデックスの
+作成時に埋め込みAPI（UPSTREAM_URLS["embedding"]）から取得して保存しておく。
+検索時は検索キーワードだけを同じモデルでベクトルにし、保存したベクトルとの
+コサイン類似度を計算する。
+
+埋め込みAPIは OpenAI 互換の形式（{"model": ..., "input": [...]} を送り、
+{"data": [{"index": ..., "embedding": [...]}, ...]} を受け取る）とする。
+EMBEDDING_MODEL にはリモートの検索APIと同じモデルを指定する。
+
+検索キーワードのベクトルは、同じモデルであれば変わらないため、全ワーカーで
+共有するキャッシュ（CACHES["embeddings"]）に長期間保存する。一度ベクトルにした
+検索キーワードは、結果キャッシュの期限が切れたあとや別のワーカーでも
+埋め込みAPIを呼ばずに検索できる。
+"""
+
+import hashlib
+
+import httpx
+import numpy as np
+from django.conf import settings
+from django.core.cache import caches
+
+from main import metrics, upstream
+from main.query_cache import normalize_query
+
+# インデックスの作成時に1回のリクエストで送るテキストの数
+BATCH_SIZE = 64
+
+
+def available():
+    """埋め込みモデルが設定されているかどうか"""
+    return bool(settings.EMBEDDING_MODEL)
+
+
+def _headers():
+    return {"Content-Type": "application/json", "api-key": settings.API_KEY}
+
+
+def _payload(texts):
+    return {"model": settings.EMBEDDING_MODEL, "input": list(texts)}
+
+
+def _vectors(data, count):
+    """埋め込みAPIの応答を L2 正規化した float32 の行列にする"""
+    try:
+        items = sorted(data["data"], key=lambda item: item["index"])
+        vectors = np.array([item["embedding"] for item in items], dtype=np.float32)
+    except (KeyError, TypeError, ValueError) as e:
+        raise upstream.UpstreamError(
+            "埋め込みAPIからの応答を解析できませんでした。"
+        ) from e
+    if vectors.ndim != 2 or len(vectors) != count:
+        raise upstream.UpstreamError("埋め込みAPIからの応答を解析できませんでした。")
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms > 0, norms, 1.0)
+
+
+def embed_documents(texts, batch_size=BATCH_SIZE):
+    """
+    文書をベクトルにする（インデックスの作成用。同期的に呼ぶ）
+
+    :return: (文書数, 次元数) の L2 正規化した行列
+    """
+    vectors = []
+    with httpx.Client(timeout=settings.UPSTREAM_READ_TIMEOUT) as client:
+        for start in range(0, len(texts), batch_size):
+            batch = texts[start : start + batch_size]
+            try:
+                response = client.post(
+                    settings.UPSTREAM_URLS["embedding"],
+                    json=_payload(batch),
+                    headers=_headers(),
+                )
+                response.raise_for_status()
+                data = response.json()
+            except (httpx.HTTPError, ValueError) as e:
+                raise upstream.UpstreamError(f"埋め込みAPIエラー: {e}") from e
+            vectors.append(_vectors(data, len(batch)))
+    return np.concatenate(vectors)
+
+
+def _cache_key(text):
+    digest = hashlib.sha256(
+        f"{settings.EMBEDDING_MODEL}\n{normalize_query(text)}".encode()
+    ).hexdigest()
+    return f"embedding:{digest}"
+
+
+async def embed_query(text):
+    """
+    検索キーワードをベクトルにする
+
+    共有キャッシュにあればそれを使い、なければ埋め込みAPIを呼んで保存する。
+    失敗した場合は UpstreamError を送出する。
+    """
+    cache = caches["embeddings"]
+    key = _cache_key(text)
+    cached = await cache.aget(key)
+    if cached is not None:
+        metrics.EMBEDDING_CACHE.labels("hits").inc()
+        return np.frombuffer(cached, dtype=np.float32)
+    metrics.EMBEDDING_CACHE.labels("misses").inc()
+    data = await upstream.post_json(
+        settings.UPSTREAM_URLS["embedding"],
+        _payload([text]),
+        _headers(),
+        endpoint="embedding",
+    )
+    vector = _vectors(data, 1)[0]
+    await cache.aset(key, vector.tobytes())
+    return vector
@@ -0,0 +1,32 @@
+"""
+ワーカープロセス間で共有する世代番号
+
+gunicorn の各ワーカーはメモリを共有しないため、プロセス内キャッシュを
+全ワーカーで一斉に無効化したいときは、共有ディレクトリ上のファイルの
+更新時刻を世代番号として使う。
+"""
+
+import os
+import time
+from pathlib import Path
+
+from django.conf import settings
+
+
+class SharedGeneration:
+    def __init__(self, name):
+        self.path = Path(settings.SHARED_STATE_DIR) / f"{name}.generation"
+
+    def current(self):
+        """現在の世代番号を返す。一度も更新されていなければ 0"""
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return 0
+
+    def bump(self):
+        """世代番号を進め、他のワーカーのキャッシュを無効化する"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.path.touch()
+        now = time.time_ns()
+        os.utime(self.path, ns=(now, now))
@@ -0,0 +1,138 @@
+"""
+上流APIへのヘッジリクエスト
+
+上流APIの応答がときどき極端に遅くなると、その分だけ p99 が悪化する。
+最初の呼び出しが、その上流APIで観測した応答時間の p95 を過ぎても返らない場合に、
+同じリクエストをもう1つ送り、先に返った方を使う。
+
+ヘッジは上流APIへの負荷を増やすため、リトライ予算で量を制限する。
+通常のリクエスト1回ごとに ratio だけ予算が貯まり、ヘッジ1回で1を使う。
+上流APIが障害で全体的に遅くなっても、ヘッジは通常のリクエストの
+ratio の割合までしか増えない。
+"""
+
+import math
+import threading
+from collections import Counter, deque
+
+from django.conf import settings
+
+
+class LatencyWindow:
+    """直近の応答時間を保持し、分位点を返す"""
+
+    def __init__(self, size, min_samples):
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=size)
+
+    def record(self, seconds):
+        self._samples.append(seconds)
+
+    def quantile(self, q):
+        """直近の応答時間の q 分位点（秒）。サンプルが min_samples 未満なら None"""
+        if len(self._samples) < self.min_samples:
+            return None
+        samples = sorted(self._samples)
+        return samples[min(len(samples) - 1, math.ceil(q * len(samples)) - 1)]
+
+
+class RetryBudget:
+    """通常のリクエストの数に比例して貯まるヘッジの予算"""
+
+    def __init__(self, ratio, capacity):
+        self.ratio = ratio
+        self.capacity = capacity
+        self.tokens = 0.0
+
+    def deposit(self):
+        self.tokens = min(self.capacity, self.tokens + self.ratio)
+
+    def try_withdraw(self):
+        """予算が残っていれば1回分を使って True を返す"""
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class HedgePolicy:
+    """上流APIごとの応答時間の記録とヘッジの予算"""
+
+    def __init__(self, quantile, window, min_samples, budget_ratio, budget_capacity):
+        self.quantile = quantile
+        self.latencies = LatencyWindow(window, min_samples)
+        self.budget = RetryBudget(budget_ratio, budget_capacity)
+        self._lock = threading.Lock()
+        self._stats = Counter()
+
+    def record(self, seconds):
+        """成功した呼び出しの応答時間を記録する"""
+        with self._lock:
+            self.latencies.record(seconds)
+
+    def begin(self):
+        """
+        通常のリクエストを1回数え、ヘッジを送るまでの待ち時間を返す
+
+        :return: 待ち時間（秒）。応答時間のサンプルが足りなければ None（ヘッジしない）
+        """
+        with self._lock:
+            self._stats["requests"] += 1
+            self.budget.deposit()
+            return self.latencies.quantile(self.quantile)
+
+    def try_hedge(self):
+        """予算が残っていればヘッジを1回分使って True を返す"""
+        with self._lock:
+            if self.budget.try_withdraw():
+                self._stats["hedged"] += 1
+                return True
+            self._stats["skipped_budget"] += 1
+            return False
+
+    def count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                **{
+                    name: self._stats[name]
+                    for name in ("requests", "hedged", "hedge_wins", "skipped_budget")
+                },
+                "hedge_delay": self.latencies.quantile(self.quantile),
+                "budget": round(self.budget.tokens, 2),
+            }
+
+
+_policies = {}
+_policies_lock = threading.Lock()
+
+
+def policy(endpoint):
+    """
+    上流APIのヘッジの設定を返す（プロセスごとに1つ）
+
+    UPSTREAM_HEDGE_ENDPOINTS に含まれない上流APIは None（ヘッジしない）。
+    """
+    if endpoint not in settings.UPSTREAM_HEDGE_ENDPOINTS:
+        return None
+    with _policies_lock:
+        endpoint_policy = _policies.get(endpoint)
+        if endpoint_policy is None:
+            endpoint_policy = _policies[endpoint] = HedgePolicy(
+                settings.UPSTREAM_HEDGE_QUANTILE,
+                settings.UPSTREAM_HEDGE_WINDOW,
+                settings.UPSTREAM_HEDGE_MIN_SAMPLES,
+                settings.UPSTREAM_RETRY_BUDGET_RATIO,
+                settings.UPSTREAM_RETRY_BUDGET_CAPACITY,
+            )
+        return endpoint_policy
+
+
+def stats():
+    """上流APIごとのヘッジの回数・待ち時間・残りの予算を返す"""
+    with _policies_lock:
+        policies = list(_policies.items())
+    return {name: endpoint_policy.snapshot() for name, endpoint_policy in policies}
@@ -0,0 +1,123 @@
+"""
+Prometheus 形式のメトリクス
+
+リクエスト数・ステータス・応答時間（アプリ・ビューごと）、上流APIの
+応答時間・実行中の呼び出し数・待ち行列の長さ（上流APIごと）、
+検索キャッシュのヒット数を記録する。
+
+gunicorn の複数ワーカーで動かす場合は、gunicorn.conf.py が
+PROMETHEUS_MULTIPROC_DIR を設定し、各ワーカーが値をそのディレクトリの
+ファイルに書き出す。/metrics はどのワーカーが応答しても全ワーカーの合計を返す。
+"""
+
+import os
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+# 上流APIの回答生成は数十秒かかることがあるため、長めのバケットまで用意する
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+REQUESTS = Counter(
+    "http_requests_total",
+    "処理したリクエストの数",
+    ["app", "view", "method", "status"],
+)
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "リクエストを受けてからレスポンスを返すまでの時間",
+    ["app", "view"],
+    buckets=LATENCY_BUCKETS,
+)
+UPSTREAM_DURATION = Histogram(
+    "upstream_request_duration_seconds",
+    "上流APIの応答（ストリーミングはヘッダー）が返るまでの時間",
+    ["endpoint", "outcome"],
+    buckets=LATENCY_BUCKETS,
+)
+UPSTREAM_IN_FLIGHT = Gauge(
+    "upstream_in_flight",
+    "実行中の上流APIの呼び出しの数",
+    ["endpoint"],
+    multiprocess_mode="livesum",
+)
+UPSTREAM_QUEUE_DEPTH = Gauge(
+    "upstream_queue_depth",
+    "上流APIの同時実行数の上限に達して、待ち行列で待っている呼び出しの数",
+    ["endpoint"],
+    multiprocess_mode="livesum",
+)
+UPSTREAM_REJECTED = Counter(
+    "upstream_rejected_total",
+    "上流APIを呼ばずに断った数（overloaded: 同時実行数の上限, circuit_open: 回路が開いている）",
+    ["endpoint", "reason"],
+)
+CIRCUIT_STATE = Gauge(
+    "upstream_circuit_state",
+    "サーキットブレーカーの状態（0: closed, 1: half_open, 2: open）",
+    ["endpoint"],
+    multiprocess_mode="livemax",
+)
+CACHE_REQUESTS = Counter(
+    "query_cache_requests_total",
+    "検索キャッシュの参照の数（hits, stale, negative, misses）",
+    ["endpoint", "result"],
+)
+ANSWER_PREFETCH = Counter(
+    "answer_prefetch_total",
+    "回答の先読みの数（started, hits, joined, failed, wasted: 使われずに期限切れ,"
+    " skipped_budget: 無駄の予算に達していて先読みしなかった）",
+    ["result"],
+)
+LOCAL_SEARCHES = Counter(
+    "local_index_searches_total",
+    "ローカル検索インデックスでの検索の数（local: ローカルの結果を返した,"
+    " それ以外: リモートの検索APIを使った理由）",
+    ["app", "result"],
+)
+EMBEDDING_CACHE = Counter(
+    "embedding_cache_requests_total",
+    "検索キーワードの埋め込みベクトルのキャッシュの参照の数（hits, misses）",
+    ["result"],
+)
+
+DB_POOL_WAIT = Counter(
+    "db_pool_wait_seconds_total",
+    "データベースのコネクションプールで空きを待った時間の合計",
+)
+DB_POOL_REQUESTS = Counter(
+    "db_pool_requests_total",
+    "データベースのコネクションプールから接続を借りた回数",
+)
+DB_POOL_ERRORS = Counter(
+    "db_pool_errors_total",
+    "データベースのコネクションプールから接続を借りられなかった回数（タイムアウトなど）",
+)
+DB_POOL_CONNECTIONS = Gauge(
+    "db_pool_connections",
+    "データベースのコネクションプールの接続数（open, available）と待ち数（waiting）",
+    ["state"],
+    multiprocess_mode="livesum",
+)
+
+
+def render():
+    """
+    メトリクスを Prometheus のテキスト形式で返す
+
+    :return: (本文, Content-Type)
+    """
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
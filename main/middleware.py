@@ -0,0 +1,229 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+from main import deadline, metrics, prerender, server_timing
+
+
+class AsyncWhiteNoiseMiddleware(WhiteNoiseMiddleware):
+    """
+    ASGI 上でも同期処理に切り替わらない WhiteNoiseMiddleware
+
+    WhiteNoiseMiddleware は同期専用のため、ASGI で動かすと全リクエストが
+    スレッドを経由してから非同期ビューに戻ることになる。
+    静的ファイル以外のリクエストはイベントループ上のまま次へ渡す。
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, *args, **kwargs):
+        super().__init__(get_response, *args, **kwargs)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            # ファイルの stat やヘッダー生成はブロッキングI/Oを含むためスレッドで実行する
+            return await sync_to_async(self.serve, thread_sensitive=False)(
+                static_file, request
+            )
+        return await self.get_response(request)
+
+
+class RequestDeadlineMiddleware:
+    """
+    リクエストごとに処理期限（REQUEST_DEADLINE_SECONDS 秒）を設定する
+
+    上流APIの呼び出しは main.upstream が期限の残り時間までしか待たない。
+    ストリーミングレスポンスの本文を送る間は期限を適用しない。
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = deadline.start(settings.REQUEST_DEADLINE_SECONDS)
+        try:
+            return self.get_response(request)
+        finally:
+            deadline.reset(token)
+
+    async def __acall__(self, request):
+        token = deadline.start(settings.REQUEST_DEADLINE_SECONDS)
+        try:
+            return await self.get_response(request)
+        finally:
+            deadline.reset(token)
+
+
+class MetricsMiddleware:
+    """
+    リクエストの数・ステータス・応答時間をアプリとビューごとに記録する
+
+    ストリーミングレスポンスは、本文を送り始めるまでの時間を記録する。
+    URL に一致しなかったリクエストは view="unmatched" にまとめる。
+    メソッドは利用者が任意の文字列を送れるため、ラベルの種類が増え続けない
+    よう METHODS 以外は "other" にまとめる。
+    """
+
+    METHODS = frozenset({"GET", "POST", "HEAD", "OPTIONS"})
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started = time.monotonic()
+        response = self.get_response(request)
+        self.record(request, response, time.monotonic() - started)
+        return response
+
+    async def __acall__(self, request):
+        started = time.monotonic()
+        response = await self.get_response(request)
+        self.record(request, response, time.monotonic() - started)
+        return response
+
+    @staticmethod
+    def record(request, response, duration):
+        match = request.resolver_match
+        if match is None:
+            app, view = "", "unmatched"
+        else:
+            app, view = match.app_name or "main", match.url_name or match.view_name
+        method = request.method
+        if method not in MetricsMiddleware.METHODS:
+            method = "other"
+        metrics.REQUESTS.labels(app, view, method, response.status_code).inc()
+        metrics.REQUEST_DURATION.labels(app, view).observe(duration)
+
+
+class ServerTimingMiddleware:
+    """
+    レスポンスに Server-Timing ヘッダーを付け、処理時間の内訳を返す
+
+    フェーズの時間は main.server_timing.phase() などで各処理が記録する。
+    認証の時間は process_view（ビューの呼び出し直前）から最初のフェーズまでとする。
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+            self.process_view = self.aprocess_view
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timings, token = server_timing.start()
+        request.server_timing = timings
+        try:
+            response = self.get_response(request)
+        finally:
+            server_timing.reset(token)
+        response["Server-Timing"] = timings.header()
+        return response
+
+    async def __acall__(self, request):
+        timings, token = server_timing.start()
+        request.server_timing = timings
+        try:
+            response = await self.get_response(request)
+        finally:
+            server_timing.reset(token)
+        response["Server-Timing"] = timings.header()
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.server_timing.view_started = time.monotonic()
+
+    async def aprocess_view(self, request, view_func, view_args, view_kwargs):
+        # ASGI で動くときに process_view をスレッド経由で呼ばせないための非同期版
+        request.server_timing.view_started = time.monotonic()
+
+
+class PrerenderedPageMiddleware:
+    """
+    セッションの Cookie がないリクエストに、描画済みのページ（main.prerender）を返す
+
+    Cookie がなければログインしていないため、セッション・認証・CSRF などの
+    ミドルウェアとビューを通さずに返せる。SessionMiddleware より前に置く。
+    省いた XFrameOptionsMiddleware のヘッダーはここで付ける。
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        template_name = self.template_for(request)
+        if template_name is None:
+            return self.get_response(request)
+        return self.serve(request, template_name)
+
+    async def __acall__(self, request):
+        template_name = self.template_for(request)
+        if template_name is None:
+            return await self.get_response(request)
+        # 更新時刻を確かめたばかりならメモリ上のページをそのまま返す
+        if prerender.fresh(template_name):
+            return self.serve(request, template_name)
+        # テンプレートとマニフェストの stat（変わっていれば描画）はスレッドで実行する
+        return await sync_to_async(self.serve, thread_sensitive=False)(
+            request, template_name
+        )
+
+    @staticmethod
+    def template_for(request):
+        """描画済みのページを返すリクエストならテンプレート名、そうでなければ None"""
+        if request.method not in ("GET", "HEAD"):
+            return None
+        if settings.SESSION_COOKIE_NAME in request.COOKIES:
+            return None
+        entry = prerender.paths().get(request.path_info)
+        if entry is None:
+            return None
+        match, template_name = entry
+        # MetricsMiddleware がビューごとに記録できるようにする
+        request.resolver_match = match
+        return template_name
+
+    @staticmethod
+    def serve(request, template_name):
+        response = prerender.response(request, template_name)
+        response.setdefault("X-Frame-Options", settings.X_FRAME_OPTIONS)
+        return response
@@ -0,0 +1,79 @@
+"""
+検索結果のカーソルページネーションとフィールドの絞り込み
+"""
+
+import base64
+import binascii
+import json
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+
+def encode_cursor(offset):
+    """次ページの開始位置を不透明なカーソル文字列にする"""
+    raw = json.dumps({"o": offset}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """
+    カーソル文字列から開始位置を取り出す。空なら先頭
+
+    :raises ValueError: カーソルが不正な場合
+    """
+    if not cursor:
+        return 0
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        offset = json.loads(raw)["o"]
+    except (binascii.Error, ValueError, KeyError, TypeError) as e:
+        raise ValueError("不正なカーソルです。") from e
+    if not isinstance(offset, int) or offset < 0:
+        raise ValueError("不正なカーソルです。")
+    return offset
+
+
+def parse_limit(value):
+    """
+    limit パラメータを 1〜MAX_LIMIT の整数として解釈する
+
+    :raises ValueError: 整数でない場合
+    """
+    if not value:
+        return DEFAULT_LIMIT
+    try:
+        limit = int(value)
+    except ValueError as e:
+        raise ValueError("limit には整数を指定してください。") from e
+    return max(1, min(limit, MAX_LIMIT))
+
+
+def paginate(items, offset, limit):
+    """
+    items から1ページ分を切り出す
+
+    :return: (ページの要素, 次ページのカーソル。最後のページなら None)
+    """
+    page = items[offset : offset + limit]
+    next_offset = offset + limit
+    next_cursor = encode_cursor(next_offset) if next_offset < len(items) else None
+    return page, next_cursor
+
+
+def project(value, spec):
+    """
+    spec で指定したフィールドだけを残す
+
+    spec は残すキーを {キー: True または入れ子の spec} で表す。
+    リストには各要素に同じ spec を適用する。
+    """
+    if spec is True:
+        return value
+    if isinstance(value, list):
+        return [project(item, spec) for item in value]
+    if isinstance(value, dict):
+        return {
+            key: project(value[key], sub) for key, sub in spec.items() if key in value
+        }
+    return value
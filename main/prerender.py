@@ -0,0 +1,193 @@
+"""
+ログインしていないユーザー向けの、あらかじめ描画したページ
+
+カルマンフィルタや検索アプリのトップページは、ログインしていなければ誰に対しても
+同じ内容になる。毎回テンプレートを描画せず、最初に（ウォームアップでは起動時に）
+描画した結果をメモリに置き、強い ETag を付けて返す。If-None-Match が一致すれば
+304 を返す。
+
+テンプレートのファイルか静的ファイルのマニフェスト（collectstatic が書き出す
+staticfiles.json）の更新時刻が変われば描画し直す。更新時刻は
+CHECK_INTERVAL 秒に1回だけ確かめ、それ以外はファイルにアクセスせずに返す。
+
+- @prerendered(template_name): ビューに付ける。ログインしていなければ
+  描画済みのページを返し、ログインしていれば元のビューを呼ぶ
+- PrerenderedPageMiddleware（main.middleware）: セッションの Cookie がない
+  リクエストには、セッション・認証などのミドルウェアを通さずに返す
+  （対象は PRERENDERED_PAGES の URL 名）
+"""
+
+import functools
+import hashlib
+import os
+import threading
+import time
+from typing import NamedTuple
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.http import HttpResponse
+from django.template.autoreload import reset_loaders
+from django.template.loader import get_template, render_to_string
+from django.urls import resolve, reverse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+
+from main import stylesheets
+
+
+# テンプレートとマニフェストの更新時刻を確かめる間隔（秒）
+CHECK_INTERVAL = 1.0
+
+
+class Page(NamedTuple):
+    content: bytes
+    etag: str
+    # 描画したときのテンプレートとマニフェストの更新時刻
+    signature: tuple
+    # 最後に更新時刻を確かめた時刻（time.monotonic()）
+    checked: float
+
+
+_lock = threading.Lock()
+_pages = {}
+_paths = None
+_manifest_mtime = None
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except (OSError, TypeError):
+        return None
+
+
+def _manifest_path():
+    """マニフェストのパス。マニフェストを使わないストレージ（開発時）では None"""
+    manifest_name = getattr(staticfiles_storage, "manifest_name", None)
+    if manifest_name is None:
+        return None
+    try:
+        return staticfiles_storage.manifest_storage.path(manifest_name)
+    except NotImplementedError:
+        return None
+
+
+def _reload_manifest(mtime):
+    """
+    マニフェストが書き換えられていれば読み込み直す
+
+    ストレージはマニフェストを起動時に一度だけ読むため、読み込み直さないと
+    {% static %} が古いハッシュ付きのファイル名を返し続ける。
+    """
+    global _manifest_mtime
+    if _manifest_mtime is not None and mtime != _manifest_mtime:
+        staticfiles_storage.hashed_files, staticfiles_storage.manifest_hash = (
+            staticfiles_storage.load_manifest()
+        )
+        stylesheets.critical.cache_clear()
+    _manifest_mtime = mtime
+
+
+def _render(template_name):
+    content = render_to_string(template_name, {"user": AnonymousUser()}).encode()
+    etag = '"%s"' % hashlib.md5(content, usedforsecurity=False).hexdigest()
+    return content, etag
+
+
+def fresh(template_name):
+    """
+    ファイルにアクセスせずに描画済みのページを返せるかどうか
+
+    描画済みで、更新時刻を確かめてから CHECK_INTERVAL 秒以内なら True。
+    """
+    cached = _pages.get(template_name)
+    return cached is not None and time.monotonic() - cached.checked < CHECK_INTERVAL
+
+
+def page(template_name):
+    """
+    描画済みのページを返す
+
+    まだ描画していないか、テンプレートかマニフェストが更新されていれば描画する。
+    """
+    cached = _pages.get(template_name)
+    now = time.monotonic()
+    if cached is not None and now - cached.checked < CHECK_INTERVAL:
+        return cached
+    origin = get_template(template_name).origin.name
+    manifest_mtime = _mtime(_manifest_path())
+    signature = (_mtime(origin), manifest_mtime)
+    with _lock:
+        cached = _pages.get(template_name)
+        if cached is not None and cached.signature == signature:
+            cached = _pages[template_name] = cached._replace(checked=now)
+            return cached
+        if cached is not None and cached.signature[0] != signature[0]:
+            # キャッシュするローダーが古いテンプレートを返さないようにする
+            reset_loaders()
+        _reload_manifest(manifest_mtime)
+        cached = Page(*_render(template_name), signature, now)
+        _pages[template_name] = cached
+    return cached
+
+
+def response(request, template_name):
+    """描画済みのページの応答。If-None-Match が ETag と一致すれば 304 を返す"""
+    cached = page(template_name)
+    result = HttpResponse(cached.content)
+    result["ETag"] = cached.etag
+    # 内容はログインしているかどうかで変わるため、毎回検証させる
+    result["Cache-Control"] = "no-cache"
+    patch_vary_headers(result, ["Cookie"])
+    return get_conditional_response(request, etag=cached.etag, response=result)
+
+
+def prerendered(template_name):
+    """
+    ログインしていないユーザーには描画済みのページを返すビューのデコレーター
+
+    ビューは template_name をそのまま描画するもの（ユーザー以外の文脈を
+    使わないもの）に限る。
+    """
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method in ("GET", "HEAD") and not request.user.is_authenticated:
+                return response(request, template_name)
+            return view(request, *args, **kwargs)
+
+        wrapper.prerendered_template = template_name
+        return wrapper
+
+    return decorator
+
+
+def paths():
+    """
+    PRERENDERED_PAGES の URL のパスから (ResolverMatch, テンプレート名) への辞書を返す
+    """
+    global _paths
+    if _paths is None:
+        result = {}
+        for name in settings.PRERENDERED_PAGES:
+            path = reverse(name)
+            match = resolve(path)
+            result[path] = (match, match.func.prerendered_template)
+        _paths = result
+    return _paths
+
+
+def prepare():
+    """PRERENDERED_PAGES のページをすべて描画しておく（ウォームアップ用）"""
+    for _, template_name in paths().values():
+        page(template_name)
+
+
+def stats():
+    """描画済みのページのサイズと ETag を返す"""
+    return {
+        name: {"bytes": len(cached.content), "etag": cached.etag}
+        for name, cached in _pages.items()
+    }
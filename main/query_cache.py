@@ -0,0 +1,203 @@
+"""
+検索APIの結果キャッシュ
+
+同じ検索が繰り返されることが多いため、上流APIの結果をプロセス内の
+LRU キャッシュに保存する。キーはエンドポイント名と正規化したクエリ。
+
+各エントリは次の2つの期限を持つ。
+- fresh_until: これを過ぎるまではそのまま返す（エンドポイントごとの TTL）
+- stale_until: fresh_until を過ぎてもこの期限までは古い結果をすぐに返し、
+  裏で上流APIから取り直す（stale-while-revalidate）
+
+上流APIのエラーと空の結果は短い TTL で保存し（ネガティブキャッシュ）、
+障害中の上流APIにすべてのタブからの再試行が殺到しないようにする。
+"""
+
+import threading
+import time
+import unicodedata
+from collections import OrderedDict, namedtuple
+
+from django.conf import settings
+
+from main import metrics, server_timing
+from main.generation import SharedGeneration
+from main.singleflight import SingleFlight
+from main.upstream import UpstreamError
+
+# キャッシュに存在しないことを表す値（None や空リストも結果として保存するため）
+MISS = object()
+
+# error が None でなければ、上流APIのエラー (メッセージ, ステータス, ヘッダー) を保存したエントリ
+Entry = namedtuple("Entry", ["fresh_until", "stale_until", "value", "error"])
+
+
+def normalize_query(query):
+    """
+    キャッシュキー用にクエリを正規化する
+
+    NFKC 正規化で全角英数字・半角カナ・全角スペースを統一し、
+    連続する空白を1つにまとめる。
+    """
+    return " ".join(unicodedata.normalize("NFKC", query).split())
+
+
+class QueryCache:
+    """エンドポイントごとの TTL を持つ、件数上限付きの LRU キャッシュ"""
+
+    def __init__(
+        self, max_entries, ttls, default_ttl=300, stale_ttl=86400, negative_ttl=10
+    ):
+        self.max_entries = max_entries
+        self.ttls = ttls
+        self.default_ttl = default_ttl
+        self.stale_ttl = stale_ttl
+        self.negative_ttl = negative_ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = SharedGeneration("query_cache")
+        self._seen_generation = self._generation.current()
+        self._stats = {}
+        self.flights = SingleFlight()
+
+    def _count(self, endpoint, result):
+        stats = self._stats.setdefault(
+            endpoint, {"hits": 0, "misses": 0, "stale": 0, "negative": 0}
+        )
+        stats[result] += 1
+        metrics.CACHE_REQUESTS.labels(endpoint, result).inc()
+
+    def _sync_generation(self):
+        # 別のワーカーでクリアされていれば、このワーカーの内容も破棄する
+        generation = self._generation.current()
+        if generation != self._seen_generation:
+            self._entries.clear()
+            self._seen_generation = generation
+
+    def _lookup(self, key):
+        """期限内（古い結果を返せる期間を含む）のエントリを返す。なければ None"""
+        with self._lock:
+            self._sync_generation()
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.stale_until <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def _store(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, endpoint, query):
+        """期限内のキャッシュされた結果を返す。なければ MISS"""
+        entry = self._lookup((endpoint, normalize_query(query)))
+        if entry is None or entry.error or entry.fresh_until <= time.monotonic():
+            return MISS
+        return entry.value
+
+    def set(self, endpoint, query, value):
+        """結果を保存し、上限を超えた分を古い順に捨てる"""
+        self._store_value((endpoint, normalize_query(query)), value)
+
+    def _store_value(self, key, value):
+        now = time.monotonic()
+        # 空の結果は上流側の一時的な不調の可能性があるため短期間だけ保存する
+        ttl = self.ttls.get(key[0], self.default_ttl) if value else self.negative_ttl
+        self._store(key, Entry(now + ttl, now + ttl + self.stale_ttl, value, None))
+
+    def _store_error(self, key, error):
+        """
+        上流APIのエラーを記録する
+
+        古い結果があればそれを返し、しばらくは取り直さずにその結果を使い続ける。
+        なければエラーを短期間キャッシュしたうえで送出する。
+        """
+        now = time.monotonic()
+        entry = self._lookup(key)
+        if entry is not None and entry.error is None:
+            self._store(key, entry._replace(fresh_until=now + self.negative_ttl))
+            return entry.value
+        # 同時実行数の制限やサーキットブレーカーで断っただけなら保存しない
+        if not error.cacheable:
+            raise error
+        error_info = (str(error), error.status, error.headers)
+        until = now + self.negative_ttl
+        self._store(key, Entry(until, until, None, error_info))
+        raise error
+
+    async def get_or_fetch(self, endpoint, query, fetch):
+        """
+        キャッシュにあればその結果を返し、なければ fetch() の結果を保存して返す
+
+        同じエンドポイント・正規化クエリの取得が実行中であれば、
+        新たに上流APIを呼ばずにその結果を待つ。
+        期限切れ後の古い結果はすぐに返し、裏で取り直す。
+
+        :param fetch: 上流APIから結果を取得するコルーチン関数
+        """
+        key = (endpoint, normalize_query(query))
+
+        async def fetch_and_store():
+            try:
+                value = await fetch()
+            except UpstreamError as e:
+                return self._store_error(key, e)
+            self._store_value(key, value)
+            return value
+
+        with server_timing.phase("cache"):
+            entry = self._lookup(key)
+        if entry is not None:
+            if entry.error is not None:
+                self._count(endpoint, "negative")
+                raise UpstreamError(*entry.error)
+            if entry.fresh_until > time.monotonic():
+                self._count(endpoint, "hits")
+                return entry.value
+            self._count(endpoint, "stale")
+            self.flights.start(key, fetch_and_store)
+            return entry.value
+
+        self._count(endpoint, "misses")
+        return await self.flights.do(key, fetch_and_store)
+
+    def clear(self):
+        """全ワーカーのキャッシュを破棄し、このワーカーで破棄した件数を返す"""
+        with self._lock:
+            count = len(self._entries)
+            self._entries.clear()
+            self._generation.bump()
+            self._seen_generation = self._generation.current()
+        return count
+
+    def stats(self):
+        """エンドポイントごとのヒット/ミス回数と現在の件数を返す"""
+        with self._lock:
+            endpoints = {}
+            for endpoint, counts in self._stats.items():
+                total = sum(counts.values())
+                served = counts["hits"] + counts["stale"] + counts["negative"]
+                endpoints[endpoint] = {
+                    **counts,
+                    "hit_ratio": served / total if total else None,
+                }
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "endpoints": endpoints,
+                **self.flights.stats(),
+            }
+
+
+cache = QueryCache(
+    settings.SEARCH_CACHE_MAX_ENTRIES,
+    settings.SEARCH_CACHE_TTL,
+    stale_ttl=settings.SEARCH_CACHE_STALE_TTL,
+    negative_ttl=settings.SEARCH_CACHE_NEGATIVE_TTL,
+)
@@ -0,0 +1,246 @@
+"""
+OpenAI Realtime API のセッショントークン（エフェメラルキー）のプール
+
+セッショントークンの発行は外部APIへの往復が必要で、WebRTC の接続開始を
+待たせてしまう。そこで、同じ設定（モデル・音声・モダリティ・指示文など）の
+プロファイルごとにトークンをあらかじめ発行しておき、リクエストが来たら
+すぐに渡す。
+
+トークンには有効期限があるため、プロファイルごとのバックグラウンドタスクが
+期限切れが近いトークンを捨てて補充する。一定時間使われなかった
+プロファイルの補充は止める。
+
+トークンの発行は有料のため、プールするのは設定
+（REALTIME_TOKEN_POOL_PROFILES）で許可したプロファイルだけにする。
+それ以外の設定のリクエストには、プールを使わずにその場で発行する。
+"""
+
+import asyncio
+import contextvars
+import json
+import logging
+import time
+import weakref
+from collections import Counter, deque, namedtuple
+
+from django.conf import settings
+
+from main import server_timing, upstream
+
+# expires_at は UNIX 時刻（秒）
+Token = namedtuple("Token", ["value", "expires_at"])
+
+# 発行APIが有効期限を返さなかった場合に仮定するトークンの寿命（秒）
+DEFAULT_LIFETIME = 60
+
+# 補充に失敗したときに再試行するまでの秒数
+RETRY_DELAY = 5
+
+
+class SessionError(upstream.UpstreamError):
+    """セッショントークンを発行できなかったことを表す例外"""
+
+
+async def mint(payload):
+    """
+    セッションを作成し、トークンを返す
+
+    :param payload: セッション作成APIに送る設定（model, voice など）
+    :raises SessionError: API がトークンを返さなかった場合
+    :raises upstream.Overloaded: 同時実行数の上限に達していた場合
+    """
+    response = await upstream.post(
+        settings.OPENAI_REALTIME_SESSIONS_URL,
+        "realtime_sessions",
+        headers={
+            "Authorization": f"Bearer {settings.OPENAI_API_KEY}",
+            "Content-Type": "application/json",
+        },
+        json=payload,
+    )
+    if response.status_code != 200:
+        raise SessionError(
+            f"Failed to create session: {response.status_code} - {response.text}",
+            status=response.status_code,
+        )
+
+    client_secret = response.json().get("client_secret") or {}
+    value = client_secret.get("value")
+    if not value:
+        raise SessionError("No value in client_secret")
+    expires_at = client_secret.get("expires_at") or time.time() + DEFAULT_LIFETIME
+    return Token(value, expires_at)
+
+
+class _Profile:
+    def __init__(self, payload):
+        self.payload = payload
+        self.tokens = deque()
+        self.last_used = time.monotonic()
+        self.task = None
+        # トークンが取り出されたり期限切れで捨てられたりしたときに補充タスクを起こす
+        self.taken = asyncio.Event()
+
+    def discard_expiring(self, min_ttl):
+        """残りの有効期間が min_ttl 秒未満のトークンを捨て、捨てた数を返す"""
+        deadline = time.time() + min_ttl
+        kept = [t for t in self.tokens if t.expires_at > deadline]
+        discarded = len(self.tokens) - len(kept)
+        self.tokens = deque(kept)
+        return discarded
+
+
+def _profile_key(payload):
+    return json.dumps(payload, sort_keys=True)
+
+
+class TokenPool:
+    """
+    プロファイルごとに発行済みのトークンを保持するプール
+
+    :param profiles: プールするプロファイル（セッション作成APIに送る設定）の配列
+    """
+
+    def __init__(self, size, min_ttl, idle_timeout, profiles):
+        self.size = size
+        self.min_ttl = min_ttl
+        self.idle_timeout = idle_timeout
+        self._allowed = {_profile_key(payload) for payload in profiles}
+        self._profiles = {}
+        self._stats = Counter()
+
+    def _profile(self, payload):
+        """プールするプロファイルを返す。許可されていない設定なら None"""
+        key = _profile_key(payload)
+        if key not in self._allowed:
+            return None
+        profile = self._profiles.get(key)
+        if profile is None:
+            profile = self._profiles[key] = _Profile(payload)
+        return profile
+
+    async def acquire(self, payload):
+        """
+        プロファイルのトークンを1つ返す
+
+        プールにあればすぐに返し、なければその場で発行する。
+        どちらの場合もプロファイルの補充タスクを動かしておく。
+        プールしないプロファイルは、常にその場で発行する。
+
+        :param payload: セッション作成APIに送る設定
+        :return: クライアントに渡すトークンの値
+        """
+        profile = self._profile(payload)
+        if profile is None:
+            self._stats["unpooled"] += 1
+            return (await mint(payload)).value
+        profile.last_used = time.monotonic()
+        if self.size > 0 and (profile.task is None or profile.task.done()):
+            # 補充はリクエストより長く続くため、リクエストの期限や計測を引き継がない
+            profile.task = asyncio.get_running_loop().create_task(
+                self._refill(profile), context=contextvars.Context()
+            )
+
+        expired = profile.discard_expiring(self.min_ttl)
+        self._stats["expired"] += expired
+        if profile.tokens:
+            self._stats["hits"] += 1
+            token = profile.tokens.popleft()
+            profile.taken.set()
+            return token.value
+
+        self._stats["misses"] += 1
+        if expired:
+            profile.taken.set()
+        return (await mint(payload)).value
+
+    async def _refill(self, profile):
+        """プロファイルが使われている間、有効なトークンを size 個に保つ"""
+        while True:
+            idle = time.monotonic() - profile.last_used
+            if idle >= self.idle_timeout:
+                return
+            self._stats["expired"] += profile.discard_expiring(self.min_ttl)
+
+            if len(profile.tokens) < self.size:
+                try:
+                    profile.tokens.append(await mint(profile.payload))
+                    self._stats["minted"] += 1
+                except Exception:
+                    logging.exception("Failed to refill realtime session tokens")
+                    self._stats["refill_errors"] += 1
+                    await asyncio.sleep(RETRY_DELAY)
+                continue
+
+            # 最も早く期限切れが近づくトークンの入れ替え時刻か、
+            # トークンが取り出されるまで待つ
+            replace_in = (
+                min(t.expires_at for t in profile.tokens) - self.min_ttl - time.time()
+            )
+            timeout = max(0, min(replace_in, self.idle_timeout - idle))
+            profile.taken.clear()
+            # asyncio.wait_for は待ち受けの完了と同時のキャンセルを握りつぶし、
+            # 補充タスクが止まらなくなることがあるため asyncio.timeout を使う
+            try:
+                async with asyncio.timeout(timeout):
+                    await profile.taken.wait()
+            except TimeoutError:
+                pass
+
+    def counts(self):
+        """プールから渡せた回数・その場で発行した回数などと、現在の在庫数を返す"""
+        return {
+            **{
+                name: self._stats[name]
+                for name in (
+                    "hits",
+                    "misses",
+                    "unpooled",
+                    "minted",
+                    "expired",
+                    "refill_errors",
+                )
+            },
+            "profiles": len(self._profiles),
+            "pooled_tokens": sum(len(p.tokens) for p in self._profiles.values()),
+        }
+
+
+_pools = weakref.WeakKeyDictionary()
+
+
+def get_pool():
+    """
+    実行中のイベントループで使うトークンのプールを返す
+
+    補充タスクはイベントループに属するため、ループごとに1つ作る。
+    """
+    loop = asyncio.get_running_loop()
+    pool = _pools.get(loop)
+    if pool is None:
+        pool = _pools[loop] = TokenPool(
+            settings.REALTIME_TOKEN_POOL_SIZE,
+            settings.REALTIME_TOKEN_MIN_TTL,
+            settings.REALTIME_TOKEN_POOL_IDLE,
+            settings.REALTIME_TOKEN_POOL_PROFILES,
+        )
+    return pool
+
+
+async def acquire(payload):
+    """プロファイル（セッション作成APIに送る設定）のトークンを1つ返す"""
+    with server_timing.phase("session"):
+        return await get_pool().acquire(payload)
+
+
+def stats():
+    """このプロセスのプールの状況を返す（イベントループが複数あれば合算する）"""
+    totals = Counter()
+    for pool in list(_pools.values()):
+        totals.update(pool.counts())
+    served = totals["hits"] + totals["misses"]
+    return {
+        **totals,
+        "hit_ratio": totals["hits"] / served if served else None,
+        "pool_size": settings.REALTIME_TOKEN_POOL_SIZE,
+    }
@@ -0,0 +1,136 @@
+"""
+Server-Timing ヘッダーによる処理時間の内訳
+
+リクエストの処理をフェーズ（認証、キャッシュ参照、上流APIの接続・応答、
+JSON の変換、シリアライズなど）に分けて時間を測り、Server-Timing ヘッダーで
+返す。ブラウザの開発者ツールで、遅いリクエストの原因を本番環境でも確認できる。
+
+計測中のリクエストはコンテキスト変数で引き継ぐため、上流APIの呼び出しなど
+深い階層からも phase() や add() で記録できる。リクエストの外（計測中の
+リクエストがないとき）ではどちらも何もしない。
+
+リクエストのコンテキストを引き継がないタスク（single-flight の共有の取得など）は
+collect() で別に集め、結果を待ったリクエストに merge() で加える。
+"""
+
+import contextlib
+import contextvars
+import time
+
+from django import http
+
+# フェーズ名と開発者ツールに表示する説明（ヘッダーに入れるため ASCII のみ）
+DESCRIPTIONS = {
+    "auth": "Auth/permission check",
+    "cache": "Cache lookup",
+    "search": "Local index search",
+    "flight": "Joined shared upstream fetch",
+    "session": "Session token",
+    "queue": "Upstream queue",
+    "connect": "Upstream connect",
+    "upstream": "Upstream response",
+    "decode": "JSON decode/transform",
+    "serialize": "Serialization",
+    "total": "Total",
+}
+
+_current = contextvars.ContextVar("server_timing", default=None)
+
+
+class Timings:
+    """1リクエストのフェーズごとの処理時間（同じフェーズは合計する）"""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.view_started = None
+        self.durations = {}
+
+    def add(self, name, seconds):
+        self.durations[name] = self.durations.get(name, 0.0) + seconds
+
+    def mark(self):
+        """
+        ビューの処理が最初のフェーズに入ったことを記録する
+
+        ビューの呼び出しから最初のフェーズまでを認証（ログイン・権限の
+        デコレーターによるセッションとユーザーの読み込み）の時間とする。
+        """
+        if self.view_started is not None and "auth" not in self.durations:
+            self.durations["auth"] = time.monotonic() - self.view_started
+
+    def header(self):
+        """Server-Timing ヘッダーの値を返す"""
+        durations = {
+            **self.durations,
+            "total": time.monotonic() - self.started,
+        }
+        return ", ".join(
+            f'{name};dur={seconds * 1000:.1f};desc="{DESCRIPTIONS.get(name, name)}"'
+            for name, seconds in durations.items()
+        )
+
+
+def start():
+    """
+    現在のコンテキストでリクエストの計測を始める
+
+    :return: (Timings, reset() に渡すトークン)
+    """
+    timings = Timings()
+    return timings, _current.set(timings)
+
+
+def reset(token):
+    _current.reset(token)
+
+
+def collect(context):
+    """
+    context の中で記録するフェーズの時間を、新しい Timings に集める
+
+    リクエストの外のタスク（空のコンテキストで起動したもの）で記録した
+    フェーズを、あとで merge() でリクエストに加えるために使う。
+    """
+    timings = Timings()
+    context.run(_current.set, timings)
+    return timings
+
+
+def merge(timings):
+    """collect() で集めたフェーズの時間を、計測中のリクエストに加える"""
+    current = _current.get()
+    if current is not None and timings.durations:
+        current.mark()
+        for name, seconds in timings.durations.items():
+            current.add(name, seconds)
+
+
+def add(name, seconds):
+    """計測中のリクエストにフェーズの時間を加える"""
+    timings = _current.get()
+    if timings is not None:
+        timings.mark()
+        timings.add(name, seconds)
+
+
+@contextlib.contextmanager
+def phase(name):
+    """ブロックの処理時間をフェーズの時間として記録する（with で使う）"""
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    timings.mark()
+    started = time.monotonic()
+    try:
+        yield
+    finally:
+        timings.add(name, time.monotonic() - started)
+
+
+class JsonResponse(http.JsonResponse):
+    """JSON への変換にかかった時間を serialize として記録する JsonResponse"""
+
+    def __init__(self, *args, **kwargs):
+        with phase("serialize"):
+            super().__init__(*args, **kwargs)
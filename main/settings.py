@@ -10,7 +10,9 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import json
 import os
+import tempfile
 from pathlib import Path
 from dotenv import load_dotenv
 import dj_database_url
@@ -66,7 +68,7 @@ INSTALLED_APPS = [
     "django.contrib.contenttypes",
     "django.contrib.sessions",
     "django.contrib.messages",
-    "django.contrib.staticfiles",
+    "main.apps.StaticFilesConfig",
     "read_images.apps.ReadImagesConfig",
     "emoji_finder.apps.EmojiFinderConfig",
     "accounts.apps.AccountsConfig",
@@ -82,7 +84,11 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
-    "whitenoise.middleware.WhiteNoiseMiddleware",
+    "main.middleware.AsyncWhiteNoiseMiddleware",
+    "main.middleware.ServerTimingMiddleware",
+    "main.middleware.MetricsMiddleware",
+    "main.middleware.RequestDeadlineMiddleware",
+    "main.middleware.PrerenderedPageMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -105,6 +111,10 @@ TEMPLATES = [
                 "django.contrib.auth.context_processors.auth",
                 "django.contrib.messages.context_processors.messages",
             ],
+            # main はアプリとして登録していないため、テンプレートタグはここで登録する
+            "libraries": {
+                "bundles": "main.templatetags.bundles",
+            },
         },
     },
 ]
@@ -129,7 +139,26 @@ if DJANGO_ENV == "production" and "DATABASE_URL" not in os.environ:
     )
 
 if "DATABASE_URL" in os.environ:
-    DATABASES["default"] = dj_database_url.config(conn_max_age=600)
+    # 接続はプールで再利用するため、Django 自身の永続接続は使わない。
+    # プールを使う場合、CONN_HEALTH_CHECKS は貸し出す前に接続が生きているかの
+    # 確認（切れていれば張り直す）を有効にする
+    DATABASES["default"] = dj_database_url.config(
+        conn_max_age=0, conn_health_checks=True
+    )
+
+# PostgreSQL ではワーカープロセスごとのコネクションプール（psycopg_pool）を使う。
+# ASGI では非同期ビューの ORM 呼び出しがスレッドで実行され、スレッドごとの
+# 永続接続はリクエストのたびに張り直されるため、プールから貸し出す
+# DB_POOL_MIN_SIZE / DB_POOL_MAX_SIZE: ワーカーごとに保持する接続数の下限と上限
+# DB_POOL_TIMEOUT: 空きを待つ最大秒数（超えるとエラー）
+# DB_POOL_MAX_IDLE: この秒数使われなかった接続は下限を超える分を閉じる
+if DATABASES["default"]["ENGINE"] == "django.db.backends.postgresql":
+    DATABASES["default"].setdefault("OPTIONS", {})["pool"] = {
+        "min_size": int(os.environ.get("DB_POOL_MIN_SIZE", "1")),
+        "max_size": int(os.environ.get("DB_POOL_MAX_SIZE", "4")),
+        "timeout": float(os.environ.get("DB_POOL_TIMEOUT", "10")),
+        "max_idle": float(os.environ.get("DB_POOL_MAX_IDLE", "300")),
+    }
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -168,7 +197,26 @@ USE_TZ = True
 STATIC_URL = "static/"
 if not DEBUG:
     STATIC_ROOT = os.path.join(BASE_DIR, "staticfiles")
-    STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
+    # ファイル名に内容のハッシュを付け、gzip と Brotli で圧縮したファイルも作る。
+    # WhiteNoise はハッシュ付きのファイルを immutable なキャッシュヘッダーで配信する
+    STORAGES = {
+        "default": {
+            "BACKEND": "django.core.files.storage.FileSystemStorage",
+        },
+        "staticfiles": {
+            "BACKEND": "whitenoise.storage.CompressedManifestStaticFilesStorage",
+        },
+    }
+
+# ビルド時に生成する静的ファイル（JavaScript のバンドル）の出力先。
+# build.sh が python -m main.bundles で書き出し、collectstatic で集める
+STATIC_BUILD_DIR = BASE_DIR / "build" / "static"
+STATICFILES_DIRS = [STATIC_BUILD_DIR] if STATIC_BUILD_DIR.is_dir() else []
+# ページのスクリプトをバンドルで読み込むか（開発時は元のファイルを個別に読み込む）
+JS_BUNDLES = os.environ.get("JS_BUNDLES", str(not DEBUG)) == "True"
+# アプリごとのスタイルシートとクリティカル CSS を使うか（python -m main.stylesheets
+# で書き出す。開発時はサイト全体のスタイルシートを読み込む）
+SPLIT_STYLESHEETS = os.environ.get("SPLIT_STYLESHEETS", str(not DEBUG)) == "True"
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
@@ -178,3 +226,315 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 # 認証関連の設定
 LOGIN_REDIRECT_URL = "/read_images/"  # ログイン後のリダイレクト先
 LOGOUT_REDIRECT_URL = "/accounts/login/"  # ログアウト後のリダイレクト先
+
+# 上流API（API_HOST）の接続先と認証情報
+# 環境変数は起動時にここで一度だけ読み込み、ビューからは settings 経由で参照する
+API_HOST = os.environ.get("API_HOST", "")
+API_KEY = os.environ.get("API_KEY")
+# 上流APIごとの URL（キーは main.upstream に渡すエンドポイント名）
+UPSTREAM_URLS = {
+    endpoint: API_HOST + os.environ.get(variable, "")
+    for endpoint, variable in (
+        ("query", "QUERY_ENDPOINT"),
+        ("answer", "ANSWER_ENDPOINT"),
+        ("emoji_finder", "EMOJI_FINDER_ENDPOINT"),
+        ("qiita", "QIITA_ENDPOINT"),
+        ("keizokuryoku", "KEIZOKURYOKU_ENDPOINT"),
+        ("embedding", "EMBEDDING_ENDPOINT"),
+    )
+}
+# ローカル検索インデックスのベクトルを作る埋め込みモデル（main.embeddings）
+# リモートの検索APIと同じモデルを指定する。未設定の場合や、インデックスを
+# 作ったモデルと異なる場合はローカル検索を使わない
+EMBEDDING_MODEL = os.environ.get("EMBEDDING_MODEL", "")
+# OpenAI Realtime API のセッション作成に使うキー
+OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
+
+# 上流API（API_HOST / OpenAI）へのHTTPクライアントの設定
+# プールサイズはワーカープロセス（イベントループ）ごとの最大接続数
+UPSTREAM_POOL_SIZE = int(os.environ.get("UPSTREAM_POOL_SIZE", "20"))
+UPSTREAM_KEEPALIVE_EXPIRY = float(os.environ.get("UPSTREAM_KEEPALIVE_EXPIRY", "60"))
+UPSTREAM_HTTP2 = os.environ.get("UPSTREAM_HTTP2", "True") == "True"
+UPSTREAM_CONNECT_TIMEOUT = float(os.environ.get("UPSTREAM_CONNECT_TIMEOUT", "5"))
+UPSTREAM_READ_TIMEOUT = float(os.environ.get("UPSTREAM_READ_TIMEOUT", "60"))
+
+# /metrics にアクセスするための Bearer トークン（未設定なら管理者のログインのみ）
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+
+# リクエストごとの処理期限（秒）。上流APIの呼び出しは残り時間までしか待たず、
+# 期限を過ぎると 504 を返す。0 で期限を設けない
+REQUEST_DEADLINE_SECONDS = float(os.environ.get("REQUEST_DEADLINE_SECONDS", "30"))
+
+# 上流APIへのヘッジリクエスト
+# HEDGE_ENDPOINTS: ヘッジする上流API（カンマ区切り。冪等な検索APIのみ指定すること）
+# HEDGE_QUANTILE: 最初の呼び出しがこの分位点の応答時間を過ぎたらヘッジを送る
+# HEDGE_WINDOW / HEDGE_MIN_SAMPLES: 分位点を計算する直近の応答の数と、最低限必要な数
+# RETRY_BUDGET_RATIO: 通常のリクエストに対するヘッジの割合の上限
+# RETRY_BUDGET_CAPACITY: 貯めておけるヘッジの回数の上限（一度に送れるヘッジの数）
+UPSTREAM_HEDGE_ENDPOINTS = {
+    name.strip()
+    for name in os.environ.get("UPSTREAM_HEDGE_ENDPOINTS", "").split(",")
+    if name.strip()
+}
+UPSTREAM_HEDGE_QUANTILE = float(os.environ.get("UPSTREAM_HEDGE_QUANTILE", "0.95"))
+UPSTREAM_HEDGE_WINDOW = int(os.environ.get("UPSTREAM_HEDGE_WINDOW", "200"))
+UPSTREAM_HEDGE_MIN_SAMPLES = int(os.environ.get("UPSTREAM_HEDGE_MIN_SAMPLES", "20"))
+UPSTREAM_RETRY_BUDGET_RATIO = float(
+    os.environ.get("UPSTREAM_RETRY_BUDGET_RATIO", "0.1")
+)
+UPSTREAM_RETRY_BUDGET_CAPACITY = float(
+    os.environ.get("UPSTREAM_RETRY_BUDGET_CAPACITY", "10")
+)
+
+# ワーカープロセス間で状態（キャッシュの世代番号など）を共有するディレクトリ
+SHARED_STATE_DIR = os.environ.get(
+    "SHARED_STATE_DIR", os.path.join(tempfile.gettempdir(), "apps_jugoya_ai")
+)
+
+# 認証バックエンド
+# CachedModelBackend はセッションのユーザーと権限をプロセス内にキャッシュする。
+# ModelBackend は、導入前にログインしたセッション（バックエンド名が保存されている）
+# を引き続き有効にするために残している
+AUTHENTICATION_BACKENDS = [
+    "accounts.backends.CachedModelBackend",
+    "django.contrib.auth.backends.ModelBackend",
+]
+# ユーザーと権限のキャッシュ（件数はワーカープロセスごとの上限、TTLは秒）
+AUTH_CACHE_MAX_ENTRIES = int(os.environ.get("AUTH_CACHE_MAX_ENTRIES", "1000"))
+AUTH_CACHE_TTL = int(os.environ.get("AUTH_CACHE_TTL", "300"))
+
+# セッションはキャッシュを優先して読み、データベースには書き込み時のみアクセスする。
+# ログアウトが全ワーカーに即時に反映されるよう、キャッシュはワーカー間で
+# 共有するファイルベースのものを使う
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "sessions": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": os.path.join(SHARED_STATE_DIR, "sessions"),
+        "TIMEOUT": None,
+        "OPTIONS": {
+            "MAX_ENTRIES": int(os.environ.get("SESSION_CACHE_MAX_ENTRIES", "10000")),
+        },
+    },
+    # 先読みした回答（read_images.prefetch）。回答のリクエストを受けた
+    # ワーカーが、別のワーカーで生成した回答を使えるよう共有する
+    "prefetch": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": os.path.join(SHARED_STATE_DIR, "prefetch"),
+    },
+    # 検索キーワードの埋め込みベクトル（main.embeddings）。モデルが同じなら
+    # 変わらないため、全ワーカーで共有して長期間保存する
+    "embeddings": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": os.path.join(SHARED_STATE_DIR, "embeddings"),
+        "TIMEOUT": int(os.environ.get("EMBEDDING_CACHE_TTL", "2592000")),
+        "OPTIONS": {
+            "MAX_ENTRIES": int(os.environ.get("EMBEDDING_CACHE_MAX_ENTRIES", "20000")),
+        },
+    },
+    # 入力候補のキーワードを検索した利用者（main.suggestions）。
+    # 候補に出すのに必要な人数を、全ワーカーを合わせて数える
+    "suggestions": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": os.path.join(SHARED_STATE_DIR, "suggestions"),
+        "TIMEOUT": int(os.environ.get("SUGGEST_CACHE_TTL", "604800")),
+        "OPTIONS": {
+            "MAX_ENTRIES": int(os.environ.get("SUGGEST_CACHE_MAX_ENTRIES", "20000")),
+        },
+    },
+}
+SESSION_ENGINE = "django.contrib.sessions.backends.cached_db"
+SESSION_CACHE_ALIAS = "sessions"
+
+# 検索結果キャッシュの設定（件数はワーカープロセスごとの上限、TTLは秒）
+# STALE_TTL: TTL切れ後も古い結果を返しつつ裏で取り直す期間
+# NEGATIVE_TTL: 上流APIのエラーや空の結果を保存しておく期間
+SEARCH_CACHE_MAX_ENTRIES = int(os.environ.get("SEARCH_CACHE_MAX_ENTRIES", "2000"))
+SEARCH_CACHE_STALE_TTL = int(os.environ.get("SEARCH_CACHE_STALE_TTL", "86400"))
+SEARCH_CACHE_NEGATIVE_TTL = int(os.environ.get("SEARCH_CACHE_NEGATIVE_TTL", "10"))
+SEARCH_CACHE_TTL = {
+    name: int(os.environ.get(f"SEARCH_CACHE_TTL_{name.upper()}", default))
+    for name, default in [
+        ("emoji_finder", "3600"),
+        ("qiita", "600"),
+        ("keizokuryoku", "3600"),
+        ("read_images", "600"),
+    ]
+}
+
+# 事業継続力強化計画のローカル検索インデックス
+# （python manage.py build_keizokuryoku_index で、EMBEDDING_MODEL のベクトルから作成。
+# なければリモートAPIを使う）
+# KEIZOKURYOKU_LOCAL_INDEX=False にすると、インデックスがあってもリモートAPIを使う
+KEIZOKURYOKU_INDEX_DIR = Path(
+    os.environ.get("KEIZOKURYOKU_INDEX_DIR", BASE_DIR / "keizokuryoku" / "index")
+)
+KEIZOKURYOKU_LOCAL_INDEX = os.environ.get("KEIZOKURYOKU_LOCAL_INDEX", "True") == "True"
+# ローカルの結果を返すのに必要な、最も類似したページのコサイン類似度
+# （下回ればリモートAPIを使う。埋め込みモデルに合わせて調整する）
+KEIZOKURYOKU_LOCAL_MIN_SIMILARITY = float(
+    os.environ.get("KEIZOKURYOKU_LOCAL_MIN_SIMILARITY", "0.5")
+)
+KEIZOKURYOKU_TOP_K = int(os.environ.get("KEIZOKURYOKU_TOP_K", "10"))
+# ハイブリッド検索での BM25（キーワード一致）の重み。残りがベクトル類似度の重み
+KEIZOKURYOKU_KEYWORD_WEIGHT = float(
+    os.environ.get("KEIZOKURYOKU_KEYWORD_WEIGHT", "0.5")
+)
+
+# 絵文字のローカル検索インデックス
+# （python manage.py build_emoji_index で、EMBEDDING_MODEL のベクトルから作成）
+# EMOJI_FINDER_LOCAL_INDEX=False にすると、インデックスがあってもリモートAPIを使う
+EMOJI_FINDER_INDEX_DIR = Path(
+    os.environ.get("EMOJI_FINDER_INDEX_DIR", BASE_DIR / "emoji_finder" / "index")
+)
+EMOJI_FINDER_LOCAL_INDEX = os.environ.get("EMOJI_FINDER_LOCAL_INDEX", "True") == "True"
+EMOJI_FINDER_TOP_K = int(os.environ.get("EMOJI_FINDER_TOP_K", "100"))
+
+# 検索キーワードの入力候補として記録する件数の上限（アプリ・ワーカープロセスごと）
+SUGGEST_MAX_ENTRIES = int(os.environ.get("SUGGEST_MAX_ENTRIES", "5000"))
+# 入力候補に出すのに必要な、そのキーワードを検索した利用者（IP アドレス）の数
+# （全ワーカープロセスを合わせた人数）
+SUGGEST_MIN_CLIENTS = int(os.environ.get("SUGGEST_MIN_CLIENTS", "3"))
+# アプリの前にあるリバースプロキシの段数。利用者の IP アドレスを
+# X-Forwarded-For から取り出すのに使う（0 なら REMOTE_ADDR を使う）
+TRUSTED_PROXY_COUNT = int(os.environ.get("TRUSTED_PROXY_COUNT", "0"))
+
+# 先読みする場合に、画像検索のAI回答に使う上位の画像の件数
+# （先読みしない場合は検索結果のすべての画像を使う）
+READ_IMAGES_ANSWER_TOP_N = int(os.environ.get("READ_IMAGES_ANSWER_TOP_N", "10"))
+# 検索結果を返した時点でAIの回答を先読みするかどうか
+# TTL: 先読みした回答を保持する秒数
+# WASTE_BUDGET: BUDGET_WINDOW 秒の間に使われずに終わった先読みの上限
+#   （全ワーカーの合計）。これに達している間は先読みしない
+READ_IMAGES_PREFETCH = os.environ.get("READ_IMAGES_PREFETCH", "False") == "True"
+READ_IMAGES_PREFETCH_TTL = int(os.environ.get("READ_IMAGES_PREFETCH_TTL", "120"))
+READ_IMAGES_PREFETCH_WASTE_BUDGET = int(
+    os.environ.get("READ_IMAGES_PREFETCH_WASTE_BUDGET", "30")
+)
+READ_IMAGES_PREFETCH_BUDGET_WINDOW = int(
+    os.environ.get("READ_IMAGES_PREFETCH_BUDGET_WINDOW", "3600")
+)
+
+# バッチ検索API（/<app>/batch/）で1リクエストに指定できる検索キーワードの上限と、
+# 並行して検索する数の上限
+BATCH_SEARCH_MAX_QUERIES = int(os.environ.get("BATCH_SEARCH_MAX_QUERIES", "50"))
+BATCH_SEARCH_CONCURRENCY = int(os.environ.get("BATCH_SEARCH_CONCURRENCY", "8"))
+
+# OpenAI Realtime API のセッション作成API（テスト時はスタブのURLに差し替えられる）
+OPENAI_REALTIME_SESSIONS_URL = os.environ.get(
+    "OPENAI_REALTIME_SESSIONS_URL", "https://api.openai.com/v1/realtime/sessions"
+)
+# セッショントークンのプール
+# POOL_SIZE: プロファイルごとに発行しておくトークンの数（0 でプールしない）
+# MIN_TTL: 残りの有効期間がこの秒数を切ったトークンは渡さずに入れ替える
+# POOL_IDLE: この秒数使われなかったプロファイルは補充を止める
+# POOL_PROFILES: プールするプロファイル（セッション作成APIに送る設定の JSON 配列）。
+#   トークンの発行は有料のため、各アプリの既定の設定だけをプールし、
+#   利用者が指定したそれ以外の設定はリクエストのたびにその場で発行する
+REALTIME_TOKEN_POOL_SIZE = int(os.environ.get("REALTIME_TOKEN_POOL_SIZE", "2"))
+REALTIME_TOKEN_MIN_TTL = int(os.environ.get("REALTIME_TOKEN_MIN_TTL", "20"))
+REALTIME_TOKEN_POOL_IDLE = int(os.environ.get("REALTIME_TOKEN_POOL_IDLE", "600"))
+_REALTIME_MODEL = "gpt-4o-realtime-preview-2024-12-17"
+REALTIME_TOKEN_POOL_PROFILES = json.loads(
+    os.environ.get("REALTIME_TOKEN_POOL_PROFILES", "null")
+) or [
+    # openai_rtc
+    {"model": _REALTIME_MODEL, "voice": "verse"},
+    # translator
+    {"model": _REALTIME_MODEL, "voice": "verse", "modalities": ["text"]},
+    # subtitle
+    {
+        "model": _REALTIME_MODEL,
+        "voice": "verse",
+        "instructions": "Please respond in Japanese.",
+        "modalities": ["text"],
+    },
+]
+
+# 上流APIごとの同時実行数の上限
+# UPSTREAM_LIMIT_<NAME>="同時実行数,待ち行列の長さ,最大待ち時間（秒）" で変更できる。
+# 待ち行列が一杯のときや最大待ち時間を過ぎたときは 503 と Retry-After を返す
+UPSTREAM_DEFAULT_LIMIT = (10, 50, 5.0)
+
+
+def _upstream_limit(name, default):
+    value = os.environ.get(f"UPSTREAM_LIMIT_{name.upper()}")
+    if not value:
+        return default
+    concurrency, queue_size, max_wait = value.split(",")
+    return int(concurrency), int(queue_size), float(max_wait)
+
+
+UPSTREAM_LIMITS = {
+    name: _upstream_limit(name, default)
+    for name, default in [
+        ("query", (10, 50, 5.0)),
+        ("answer", (4, 20, 10.0)),
+        ("emoji_finder", (10, 50, 5.0)),
+        ("qiita", (10, 50, 5.0)),
+        ("keizokuryoku", (10, 50, 5.0)),
+        ("realtime_sessions", (5, 20, 5.0)),
+        # 検索キーワードの埋め込み。待たされるとローカル検索の意味がないため、
+        # 待ち時間を短くし、あふれた分はリモートの検索APIで検索する
+        ("embedding", (10, 20, 1.0)),
+    ]
+}
+
+# 上流APIごとのサーキットブレーカー
+# 直近 WINDOW 回の呼び出しのうち MIN_CALLS 回以上の結果があり、失敗の割合が
+# ERROR_RATE 以上か、SLOW_CALL_SECONDS 秒以上かかった呼び出しの割合が
+# SLOW_CALL_RATE 以上になったら回路を開く。開いている OPEN_SECONDS 秒の間は
+# 上流APIを呼ばずに 503 を返し（キャッシュにあればそれを返す）、
+# その後 HALF_OPEN_CALLS 回の試行が成功すれば閉じる
+CIRCUIT_BREAKER = {
+    "window": int(os.environ.get("CIRCUIT_WINDOW", "20")),
+    "min_calls": int(os.environ.get("CIRCUIT_MIN_CALLS", "10")),
+    "error_rate": float(os.environ.get("CIRCUIT_ERROR_RATE", "0.5")),
+    "slow_call_seconds": float(os.environ.get("CIRCUIT_SLOW_CALL_SECONDS", "10")),
+    "slow_call_rate": float(os.environ.get("CIRCUIT_SLOW_CALL_RATE", "0.8")),
+    "open_seconds": float(os.environ.get("CIRCUIT_OPEN_SECONDS", "30")),
+    "half_open_calls": int(os.environ.get("CIRCUIT_HALF_OPEN_CALLS", "1")),
+}
+# 遅い呼び出しとみなす秒数（上流APIごと。CIRCUIT_SLOW_CALL_SECONDS_<NAME> で変更できる）
+# 回答の生成はもともと時間がかかるため、しきい値を長くしておく
+CIRCUIT_BREAKER_SLOW_CALL_SECONDS = {
+    name: float(os.environ[f"CIRCUIT_SLOW_CALL_SECONDS_{name.upper()}"])
+    for name in UPSTREAM_LIMITS
+    if os.environ.get(f"CIRCUIT_SLOW_CALL_SECONDS_{name.upper()}")
+}
+CIRCUIT_BREAKER_SLOW_CALL_SECONDS.setdefault(
+    "answer", max(30.0, CIRCUIT_BREAKER["slow_call_seconds"])
+)
+
+# ワーカーの起動時のウォームアップ（main.warmup）
+# TEMPLATES: あらかじめ読み込んでおくテンプレート
+# UPSTREAM_CONNECTIONS: 上流APIのホストごとに張っておく接続の数（0 で張らない）
+# UPSTREAM_TIMEOUT: 上流APIへの接続を待つ最大秒数（つながらなくても起動は続ける）
+WARMUP_TEMPLATES = [
+    "registration/login.html",
+    "read_images/index.html",
+    "read_images/results.html",
+    "emoji_finder/index.html",
+    "qiita/index.html",
+    "keizokuryoku/index.html",
+    "kalman_filter/index.html",
+    "openai_rtc/index.html",
+    "translator/index.html",
+    "subtitle/index.html",
+    "subtitle/viewer.html",
+    "facemesh/index.html",
+]
+WARMUP_UPSTREAM_CONNECTIONS = int(os.environ.get("WARMUP_UPSTREAM_CONNECTIONS", "1"))
+WARMUP_UPSTREAM_TIMEOUT = float(os.environ.get("WARMUP_UPSTREAM_TIMEOUT", "5"))
+
+# ログインしていないユーザーに描画済みのページを返すビュー（main.prerender）の URL 名
+# ビューには @prerendered を付けておく
+PRERENDERED_PAGES = [
+    "kalman_filter:index",
+    "facemesh:index",
+    "qiita:index",
+    "emoji_finder:index",
+    "keizokuryoku:index",
+]
@@ -0,0 +1,90 @@
+"""
+同一キーの非同期処理を1回にまとめる（single-flight）
+
+同じ検索語へのリクエストが同時に集中したとき、上流APIへの呼び出しは
+1つだけ実行し、残りの呼び出し元はその結果を待つ。
+
+共有する処理は特定のリクエストのものではないため、空のコンテキストで
+実行する（最初の呼び出し元の期限を引き継がない）。期限は呼び出し元ごとに、
+結果を待つ間だけ適用する。
+
+処理の中で記録した Server-Timing のフェーズ（上流APIの接続・応答、変換など）は
+別に集め、処理を始めた呼び出し元に加える。合流した呼び出し元には、待った時間を
+flight として記録する。
+"""
+
+import asyncio
+import contextvars
+from collections import Counter
+
+from main import server_timing, upstream
+
+
+class SingleFlight:
+    def __init__(self):
+        self._tasks = {}
+        self._coalesced = Counter()
+
+    async def do(self, key, fn):
+        """
+        key について実行中の処理があればその結果を待ち、なければ fn() を実行する
+
+        処理は独立したタスクとして実行するため、最初の呼び出し元が切断されて
+        キャンセルされても、待っている他の呼び出し元には結果が届く。
+        呼び出し元の期限を過ぎると、処理は続けたまま DeadlineExceeded を送出する。
+
+        :param key: タプルのキー。先頭要素ごとに合流した待機数を集計する
+        :param fn: 実行するコルーチン関数
+        """
+        task, timings = self._task_for(key, fn)
+        if timings is None:
+            self._coalesced[key[0]] += 1
+            with server_timing.phase("flight"):
+                async with upstream.within_deadline():
+                    return await asyncio.shield(task)
+        async with upstream.within_deadline():
+            try:
+                return await asyncio.shield(task)
+            finally:
+                if task.done():
+                    server_timing.merge(timings)
+
+    def start(self, key, fn):
+        """
+        key について実行中の処理がなければ fn() をバックグラウンドで開始する
+
+        結果は待たない。キャッシュの裏での取り直しなどに使う。
+        """
+        self._task_for(key, fn)
+
+    def _task_for(self, key, fn):
+        """
+        実行中のタスクと、タスクが記録するフェーズの Timings を返す
+
+        既存のタスクに合流した場合、Timings は None。
+        """
+        loop = asyncio.get_running_loop()
+        task = self._tasks.get(key)
+        # 別のイベントループで実行中のタスクは待てないため、合流しない
+        if task is not None and task.get_loop() is loop:
+            return task, None
+        context = contextvars.Context()
+        timings = server_timing.collect(context)
+        task = loop.create_task(fn(), context=context)
+        self._tasks[key] = task
+        task.add_done_callback(lambda t: self._forget(key, t))
+        return task, timings
+
+    def _forget(self, key, task):
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        # 待機者が全員キャンセルされた場合に未取得の例外として警告されないよう取得しておく
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self):
+        """合流した待機数（先頭キーごと）と実行中の処理数を返す"""
+        return {
+            "coalesced_waiters": dict(self._coalesced),
+            "in_flight": len(self._tasks),
+        }
@@ -0,0 +1,30 @@
+"""
+Server-Sent Events の組み立てと読み取り
+"""
+
+import json
+
+
+def format_event(event, data):
+    """イベント名と JSON データから、1件分の SSE メッセージを組み立てる"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def iter_data(response):
+    """
+    上流APIの text/event-stream のレスポンスから、各イベントの data を順に返す
+
+    OpenAI 形式の終端（data: [DONE]）が届いたら終了する。
+    """
+    lines = []
+    async for line in response.aiter_lines():
+        if line.startswith("data:"):
+            lines.append(line[5:].removeprefix(" "))
+        elif not line and lines:
+            data = "\n".join(lines)
+            lines = []
+            if data == "[DONE]":
+                return
+            yield data
+    if lines and "\n".join(lines) != "[DONE]":
+        yield "\n".join(lines)
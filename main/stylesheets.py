@@ -0,0 +1,275 @@
+"""
+アプリごとの Tailwind CSS と、ファーストビューのためのクリティカル CSS
+
+サイト全体で1つのスタイルシートを使うと、各ページが他のアプリでしか
+使わないスタイルまでダウンロードすることになる。そこでアプリごとに、
+そのアプリのテンプレートとスクリプトだけを走査（@source）した
+スタイルシートを Tailwind CSS v4 で作る。
+
+さらに、各アプリのテンプレートの先頭の要素（ファーストビュー）で使う
+ユーティリティと、テーマ変数・ベーススタイルだけを取り出した
+クリティカル CSS を作る。テンプレートはクリティカル CSS を <style> に
+埋め込み、スタイルシート全体は非同期に読み込む（{% stylesheet %}）。
+
+Tailwind CSS を実行できない環境では、サイト全体のスタイルシート
+（tailwindcss/css/output.css）をそのまま使う。
+
+build.sh から collectstatic の前に実行する。
+
+    python -m main.stylesheets
+"""
+
+import functools
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+from html.parser import HTMLParser
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+
+# スタイルシートを作るアプリ（テンプレートの {% stylesheet %} に渡す名前）
+APPS = [
+    "accounts",
+    "read_images",
+    "emoji_finder",
+    "qiita",
+    "keizokuryoku",
+    "kalman_filter",
+    "openai_rtc",
+    "translator",
+    "subtitle",
+    "facemesh",
+]
+
+# Tailwind CSS の CLI（-i の入力ファイルから -o の出力ファイルを作る）
+TAILWIND_COMMAND = os.environ.get(
+    "TAILWIND_COMMAND", "npx --yes @tailwindcss/cli@4.1"
+).split()
+
+# Tailwind CSS を実行できないときに使う、サイト全体のスタイルシート
+SITE_STYLESHEET = "tailwindcss/css/output.css"
+
+# ファーストビューとみなす、<body> から数えた要素の数
+ABOVE_THE_FOLD_ELEMENTS = 40
+
+_CLASS_PATTERN = re.compile(r"\.((?:\\.|[\w-])+)")
+_ESCAPE_PATTERN = re.compile(r"\\(.)")
+_NEWLINE_PATTERN = re.compile(r"\n\s*")
+_TEMPLATE_SYNTAX_PATTERN = re.compile(r"{%.*?%}|{{.*?}}|{#.*?#}")
+
+
+def path(app):
+    """アプリのスタイルシートの静的ファイルのパス"""
+    return f"css/{app}.css"
+
+
+def critical_path(app):
+    """アプリのクリティカル CSS の静的ファイルのパス"""
+    return f"css/{app}.critical.css"
+
+
+@functools.cache
+def critical(app):
+    """
+    アプリのクリティカル CSS を返す（プロセスごとに1回だけ読み込む）
+
+    :return: CSS。ビルドされていない場合は None
+    """
+    found = finders.find(critical_path(app))
+    if found is None:
+        return None
+    with open(found, encoding="utf-8") as f:
+        return f.read()
+
+
+def _sources(app):
+    """アプリのスタイルシートを作るときに走査するディレクトリ"""
+    base = Path(settings.BASE_DIR) / app
+    candidates = [base / "templates", base / "static" / app / "js"]
+    return [directory for directory in candidates if directory.is_dir()]
+
+
+def _templates(app):
+    return sorted((Path(settings.BASE_DIR) / app / "templates").rglob("*.html"))
+
+
+def compile_stylesheet(app, output):
+    """
+    Tailwind CSS でアプリのスタイルシートを作る
+
+    :return: 作れたかどうか（Tailwind CSS を実行できなかった場合は False）
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        source = Path(tmp) / "input.css"
+        # source(none) で自動検出を止め、アプリのファイルだけを走査する
+        lines = ['@import "tailwindcss" source(none);']
+        lines += [f'@source "{directory}";' for directory in _sources(app)]
+        source.write_text("\n".join(lines) + "\n", encoding="utf-8")
+        try:
+            subprocess.run(
+                [*TAILWIND_COMMAND, "-i", str(source), "-o", str(output), "--minify"],
+                cwd=settings.BASE_DIR,
+                capture_output=True,
+                text=True,
+                check=True,
+                timeout=300,
+            )
+        except (OSError, subprocess.SubprocessError) as e:
+            reason = (getattr(e, "stderr", None) or str(e)).strip().splitlines()[0]
+            print(
+                "Tailwind CSS を実行できなかったため、サイト全体の"
+                f"スタイルシートを使います: {reason}"
+            )
+            return False
+    return True
+
+
+class _FoldParser(HTMLParser):
+    """<body> から数えて limit 個目までの要素の class を集める"""
+
+    def __init__(self, limit):
+        super().__init__()
+        self.limit = limit
+        self.in_body = False
+        self.count = 0
+        self.classes = set()
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "html":
+            self._collect(attrs)
+        if tag == "body":
+            self.in_body = True
+        if not self.in_body or self.count >= self.limit:
+            return
+        self.count += 1
+        self._collect(attrs)
+
+    def _collect(self, attrs):
+        for name, value in attrs:
+            if name == "class" and value:
+                # {% if %} などテンプレートの構文は除き、条件付きの class は含める
+                self.classes.update(_TEMPLATE_SYNTAX_PATTERN.sub(" ", value).split())
+
+
+def above_the_fold_classes(templates, limit=ABOVE_THE_FOLD_ELEMENTS):
+    """テンプレートの先頭の要素で使われている class の集合を返す"""
+    classes = set()
+    for template in templates:
+        parser = _FoldParser(limit)
+        parser.feed(Path(template).read_text(encoding="utf-8"))
+        classes |= parser.classes
+    return classes
+
+
+def _blocks(css):
+    """
+    CSS を同じ階層の規則に分け、(プレリュード, 本体, 規則全体) を順に返す
+
+    本体は {} の中身で、@layer a, b; のような文の場合は None。
+    """
+    depth = 0
+    start = 0
+    body_start = None
+    quote = None
+    i = 0
+    while i < len(css):
+        char = css[i]
+        if quote:
+            if char == "\\":
+                i += 1
+            elif char == quote:
+                quote = None
+        elif css.startswith("/*", i):
+            end = css.find("*/", i + 2)
+            i = len(css) if end == -1 else end + 1
+        elif char in "\"'":
+            quote = char
+        elif char == "{":
+            if depth == 0:
+                body_start = i
+            depth += 1
+        elif char == "}":
+            depth -= 1
+            if depth == 0:
+                text = css[start : i + 1]
+                yield css[start:body_start].strip(), css[body_start + 1 : i], text
+                start = i + 1
+        elif char == ";" and depth == 0:
+            yield css[start:i].strip(), None, css[start : i + 1]
+            start = i + 1
+        i += 1
+
+
+def _selector_classes(selector):
+    return {
+        _ESCAPE_PATTERN.sub(r"\1", name) for name in _CLASS_PATTERN.findall(selector)
+    }
+
+
+def extract_critical(css, classes):
+    """
+    スタイルシートからクリティカル CSS を取り出す
+
+    ユーティリティ（@layer utilities）は classes のいずれかを使う規則だけを残し、
+    テーマ変数・ベーススタイル・@property などはすべて残す。
+    HTML に埋め込むため、改行とインデントは空白1つに詰める。
+    """
+    parts = []
+    for prelude, body, text in _blocks(css):
+        if body is not None and prelude == "@layer utilities":
+            rules = [
+                rule
+                for selector, _, rule in _blocks(body)
+                if _selector_classes(selector) & classes
+            ]
+            parts.append("@layer utilities{" + "".join(rules) + "}")
+        else:
+            parts.append(text)
+    return _NEWLINE_PATTERN.sub(" ", "".join(parts)).strip()
+
+
+def build(output_dir=None):
+    """
+    すべてのアプリのスタイルシートとクリティカル CSS を書き出す
+
+    :return: [(アプリ名, スタイルシートのサイズ, クリティカル CSS のサイズ,
+        Tailwind CSS で作ったか)]
+    """
+    output_dir = Path(output_dir or settings.STATIC_BUILD_DIR)
+    results = []
+    use_tailwind = True
+    for app in APPS:
+        output = output_dir / path(app)
+        output.parent.mkdir(parents=True, exist_ok=True)
+        compiled = compile_stylesheet(app, output) if use_tailwind else False
+        # 一度失敗したら、残りのアプリでは Tailwind CSS を試さない
+        use_tailwind = compiled
+        if not compiled:
+            shutil.copyfile(finders.find(SITE_STYLESHEET), output)
+
+        css = output.read_text(encoding="utf-8")
+        classes = above_the_fold_classes(_templates(app))
+        critical_output = output_dir / critical_path(app)
+        critical_output.write_text(extract_critical(css, classes), encoding="utf-8")
+        results.append(
+            (app, len(css.encode()), critical_output.stat().st_size, compiled)
+        )
+    return results
+
+
+def main():
+    import django
+
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "main.settings")
+    django.setup()
+    for app, size, critical_size, compiled in build():
+        note = "" if compiled else "（サイト全体のスタイルシート）"
+        print(f"{path(app)}: {size:,} bytes, critical {critical_size:,} bytes{note}")
+
+
+if __name__ == "__main__":
+    main()
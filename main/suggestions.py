@@ -0,0 +1,204 @@
+"""
+検索キーワードの入力候補
+
+過去に結果が得られた検索キーワードをアプリごとに記録し、
+入力中の文字列で始まるキーワードを検索した利用者の多い順に返す。
+候補に出るキーワードは検索結果キャッシュに載っている可能性が高いため、
+上流APIへの問い合わせを減らす効果もある。
+
+候補はログインしていない利用者にも返すため、1人の利用者が検索した
+キーワードや、同じキーワードを繰り返し検索して順位を上げようとした
+キーワードは出さない。利用者は接続元の IP アドレスで区別し、
+SUGGEST_MIN_CLIENTS 人以上が検索したキーワードだけを候補にする。
+
+インデックスはワーカープロセスごとに持つが、リクエストは複数の
+ワーカーに振り分けられるため、利用者の数はワーカー間で共有する
+キャッシュ（"suggestions"）で数える。候補に出せる人数に達するまでは
+キーワードを記録するたびに共有キャッシュを確かめ、達した後は
+そのワーカーの中だけで記録する。
+
+キーワードは正規化した文字列のソート済み配列に保持し、
+前方一致の範囲を二分探索で求める。
+"""
+
+import bisect
+import hashlib
+import heapq
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+
+from main.query_cache import normalize_query
+
+# 前方一致の範囲の終端に使う、どの文字よりも大きい文字
+_MAX_CHAR = "\U0010ffff"
+
+# カタカナ（ァ〜ヶ）をひらがなに変換する表
+_KATAKANA_TO_HIRAGANA = {code: code - 0x60 for code in range(0x30A1, 0x30F7)}
+
+# キーワードごとに覚えておく利用者の数の上限（順位はこの人数で頭打ちになる）
+MAX_CLIENTS_PER_QUERY = 100
+
+# 件数の上限に達したときに一度に捨てるキーワードの割合
+EVICT_FRACTION = 0.1
+
+
+def fold(text):
+    """
+    前方一致の比較用に文字列を正規化する
+
+    NFKC 正規化で全角英数字・半角カナを統一し、小文字にしたうえで
+    カタカナをひらがなにそろえる。
+    """
+    return normalize_query(text).lower().translate(_KATAKANA_TO_HIRAGANA)
+
+
+def client_id(request):
+    """
+    利用者を区別するための、接続元の IP アドレスのハッシュを返す
+
+    TRUSTED_PROXY_COUNT 段のプロキシを経由している場合は、X-Forwarded-For の
+    末尾からその段数分さかのぼったアドレスを使う（利用者が付けた値は使わない）。
+    """
+    address = request.META.get("REMOTE_ADDR", "")
+    if settings.TRUSTED_PROXY_COUNT:
+        forwarded = [
+            part.strip()
+            for part in request.META.get("HTTP_X_FORWARDED_FOR", "").split(",")
+            if part.strip()
+        ]
+        if len(forwarded) >= settings.TRUSTED_PROXY_COUNT:
+            address = forwarded[-settings.TRUSTED_PROXY_COUNT]
+    return hashlib.blake2b(address.encode(), digest_size=8).digest()
+
+
+class SuggestIndex:
+    """前方一致で検索できる、検索した利用者付きのキーワードの集合"""
+
+    def __init__(self, max_entries, min_clients=1):
+        self.max_entries = max_entries
+        self.min_clients = min_clients
+        self._keys = []
+        # 正規化したキーワード -> [検索回数, 表示用のキーワード, 利用者の集合,
+        #                          全ワーカーで数えた利用者の数]
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def record(self, query, client):
+        """
+        結果が得られた検索キーワードを記録する
+
+        :param client: 利用者を区別する値（client_id()）
+        :return: まだ min_clients 人に達していないキーワードなら、
+            正規化したキーワード（set_clients() で全ワーカーでの人数を渡す）
+        """
+        key = fold(query)
+        if not key:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                if len(self._entries) >= self.max_entries:
+                    self._evict()
+                entry = self._entries[key] = [0, None, set(), 0]
+                bisect.insort(self._keys, key)
+            entry[0] += 1
+            entry[1] = normalize_query(query)
+            if len(entry[2]) < MAX_CLIENTS_PER_QUERY:
+                entry[2].add(client)
+            return None if self._clients(entry) >= self.min_clients else key
+
+    def set_clients(self, key, count):
+        """キーワードを検索した全ワーカーでの利用者の数を記録する"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry[3] = max(entry[3], count)
+
+    @staticmethod
+    def _clients(entry):
+        return max(len(entry[2]), entry[3])
+
+    def _rank(self, key):
+        # 検索した利用者の数を優先し、同数なら検索回数で並べる
+        entry = self._entries[key]
+        return self._clients(entry), entry[0]
+
+    def _evict(self):
+        # 順位の低いキーワードをまとめて捨てる。1件ずつ捨てると、
+        # 上限に達した後はキーワードを追加するたびに全件を走査することになる
+        count = max(1, int(self.max_entries * EVICT_FRACTION))
+        evicted = set(heapq.nsmallest(count, self._entries, key=self._rank))
+        for key in evicted:
+            del self._entries[key]
+        self._keys = [k for k in self._keys if k not in evicted]
+
+    def suggest(self, prefix, limit=10):
+        """
+        prefix で始まるキーワードを、検索した利用者の多い順に最大 limit 件返す
+
+        min_clients 人未満の利用者しか検索していないキーワードは返さない。
+        """
+        prefix = fold(prefix)
+        if not prefix:
+            return []
+        with self._lock:
+            start = bisect.bisect_left(self._keys, prefix)
+            end = bisect.bisect_left(self._keys, prefix + _MAX_CHAR, lo=start)
+            candidates = (
+                k
+                for k in self._keys[start:end]
+                if self._clients(self._entries[k]) >= self.min_clients
+            )
+            keys = heapq.nlargest(limit, candidates, key=self._rank)
+            return [self._entries[k][1] for k in keys]
+
+
+# 1回の応答で返す候補の件数
+DEFAULT_LIMIT = 10
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def index_for(app):
+    """アプリごとの入力候補インデックスを返す"""
+    with _indexes_lock:
+        index = _indexes.get(app)
+        if index is None:
+            index = _indexes[app] = SuggestIndex(
+                settings.SUGGEST_MAX_ENTRIES, settings.SUGGEST_MIN_CLIENTS
+            )
+        return index
+
+
+async def _share_client(app, key, client):
+    """
+    キーワードを検索した利用者を全ワーカーで共有する集合に加え、その人数を返す
+
+    複数のワーカーが同時に書き込むと利用者が1人抜けることがあるが、
+    その利用者がもう一度検索すれば加わる。
+    """
+    cache = caches["suggestions"]
+    digest = hashlib.sha256(f"{app}\n{key}".encode()).hexdigest()
+    cache_key = f"suggest:{digest}"
+    clients = await cache.aget(cache_key, set())
+    if client not in clients:
+        clients.add(client)
+        await cache.aset(cache_key, clients)
+    return len(clients)
+
+
+async def record(app, query, request):
+    """アプリの検索キーワードを、検索したリクエストの利用者とともに記録する"""
+    index = index_for(app)
+    client = client_id(request)
+    key = index.record(query, client)
+    if key is not None:
+        index.set_clients(key, await _share_client(app, key, client))
+
+
+def suggest(app, prefix, limit=DEFAULT_LIMIT):
+    """アプリの入力候補を返す"""
+    return index_for(app).suggest(prefix, limit)
@@ -0,0 +1,76 @@
+"""
+ページのスタイルシート（main.stylesheets）とスクリプト（main.bundles のバンドル）を
+読み込むテンプレートタグ
+
+    {% load bundles %}
+    <head>
+      {% stylesheet "translator" %}
+      {% preload_scripts "translator" %}
+    </head>
+    <body>
+      ...
+      {% bundle_scripts "translator" %}
+    </body>
+"""
+
+from django import template
+from django.conf import settings
+from django.templatetags.static import static
+from django.utils.html import format_html, format_html_join
+from django.utils.safestring import mark_safe
+
+from main import bundles, stylesheets
+
+register = template.Library()
+
+
+@register.simple_tag
+def stylesheet(app):
+    """
+    アプリのスタイルシートを読み込む
+
+    SPLIT_STYLESHEETS が有効なら、クリティカル CSS を <style> に埋め込み、
+    スタイルシート全体は描画を止めないよう非同期に読み込む。
+    """
+    if not settings.SPLIT_STYLESHEETS:
+        return format_html(
+            '<link rel="stylesheet" href="{}">', static(stylesheets.SITE_STYLESHEET)
+        )
+    href = static(stylesheets.path(app))
+    critical = stylesheets.critical(app)
+    if critical is None:
+        return format_html('<link rel="stylesheet" href="{}">', href)
+    return format_html(
+        "<style>{}</style>\n"
+        '<link rel="preload" href="{}" as="style" '
+        "onload=\"this.onload=null;this.rel='stylesheet'\">\n"
+        '<noscript><link rel="stylesheet" href="{}"></noscript>',
+        # </style> で要素が閉じられないようにする
+        mark_safe(critical.replace("</", "<\\/")),
+        href,
+        href,
+    )
+
+
+@register.simple_tag
+def preload_scripts(name):
+    """
+    スクリプトの preload ヒントを出力する
+
+    スクリプトは本文の末尾で読み込むため、<head> でダウンロードを先に始めておく。
+    """
+    return format_html_join(
+        "\n",
+        '<link rel="preload" href="{}" as="script">',
+        ((static(path),) for path in bundles.scripts(name)),
+    )
+
+
+@register.simple_tag
+def bundle_scripts(name):
+    """スクリプトの <script> 要素を出力する"""
+    return format_html_join(
+        "\n",
+        '<script src="{}"></script>',
+        ((static(path),) for path in bundles.scripts(name)),
+    )
@@ -0,0 +1,14 @@
+"""テスト用の時計"""
+
+
+class FakeClock:
+    """time.monotonic() の代わりに、テストから進める時刻を返す"""
+
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def monotonic(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
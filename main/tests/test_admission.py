@@ -0,0 +1,55 @@
+import asyncio
+
+from django.test import SimpleTestCase, override_settings
+
+from main import admission, circuit, upstream
+
+
+class LimiterTests(SimpleTestCase):
+    async def test_rejects_when_queue_is_full(self):
+        limiter = admission.Limiter("test", concurrency=1, queue_size=1, max_wait=5)
+        await limiter.acquire()
+        waiter = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        with self.assertRaises(admission.Rejected) as cm:
+            await limiter.acquire()
+        self.assertEqual(cm.exception.retry_after, 5)
+
+        # 返した枠は待っている呼び出し元にそのまま渡す
+        limiter.release()
+        await waiter
+        self.assertEqual(limiter.in_flight, 1)
+        limiter.release()
+        self.assertEqual(limiter.in_flight, 0)
+        self.assertEqual(
+            limiter.counts(),
+            {
+                "in_flight": 0,
+                "queued": 0,
+                "admitted": 2,
+                "rejected": 1,
+                "timed_out": 0,
+            },
+        )
+
+    async def test_rejects_after_max_wait(self):
+        limiter = admission.Limiter("test", concurrency=1, queue_size=1, max_wait=0.01)
+        await limiter.acquire()
+        with self.assertRaises(admission.Rejected):
+            await limiter.acquire()
+        self.assertEqual(limiter.counts()["queued"], 0)
+        self.assertEqual(limiter.counts()["timed_out"], 1)
+
+    @override_settings(UPSTREAM_LIMITS={"test_overloaded": (1, 0, 1.0)})
+    async def test_admit_raises_overloaded(self):
+        self.addCleanup(circuit._breakers.pop, "test_overloaded", None)
+        async with upstream.admit("test_overloaded") as call:
+            with self.assertRaises(upstream.Overloaded) as cm:
+                async with upstream.admit("test_overloaded"):
+                    pass
+            call.finish(failed=False)
+        self.assertEqual(cm.exception.status, 503)
+        self.assertEqual(cm.exception.headers, {"Retry-After": "1"})
+        self.assertFalse(cm.exception.cacheable)
+        # 断った呼び出しはサーキットブレーカーの失敗に数えない
+        self.assertEqual(circuit.breaker("test_overloaded").snapshot()["failures"], 0)
@@ -0,0 +1,67 @@
+from unittest import mock
+
+from django.contrib.auth.models import Permission, User
+from django.test import Client, TestCase
+
+import emoji_finder.views
+import keizokuryoku.views
+import qiita.views
+
+
+async def search(search_query):
+    return [
+        {"similarity": 1.0, "metadata": {"query": search_query, "i": i}}
+        for i in range(3)
+    ]
+
+
+class BatchViewTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("batch")
+        self.user.user_permissions.add(
+            Permission.objects.get(
+                content_type__app_label="emoji_finder", codename="view_app"
+            )
+        )
+        for views in (emoji_finder.views, keizokuryoku.views, qiita.views):
+            patcher = mock.patch.object(views, "search", search)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def post(self, path, body, client=None):
+        return (client or self.client).post(path, body, content_type="application/json")
+
+    def test_requires_login(self):
+        for path in ("/qiita/batch/", "/keizokuryoku/batch/"):
+            response = self.post(path, {"queries": ["猫"]})
+            self.assertEqual(response.status_code, 302)
+            self.assertIn("/accounts/login/", response["Location"])
+
+    def test_requires_permission(self):
+        self.client.force_login(User.objects.create_user("no-permission"))
+        response = self.post("/emoji_finder/batch/", {"queries": ["猫"]})
+        self.assertEqual(response.status_code, 403)
+
+    def test_requires_csrf_token(self):
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.user)
+        for path in ("/emoji_finder/batch/", "/qiita/batch/", "/keizokuryoku/batch/"):
+            response = self.post(path, {"queries": ["猫"]}, client)
+            self.assertEqual(response.status_code, 403)
+
+    def test_paginated_results_have_cursor(self):
+        self.client.force_login(self.user)
+        response = self.post("/qiita/batch/", {"queries": ["猫"], "limit": 2})
+        item = response.json()["results"]["猫"]
+        self.assertEqual(len(item["articles"]), 2)
+        self.assertEqual(item["total"], 3)
+        self.assertIsNotNone(item["next_cursor"])
+
+    def test_results_without_cursor_support_have_no_cursor(self):
+        # keizokuryoku の query は cursor を受け付けないため、続きの位置は返さない
+        self.client.force_login(self.user)
+        response = self.post("/keizokuryoku/batch/", {"queries": ["猫"], "limit": 2})
+        item = response.json()["results"]["猫"]
+        self.assertEqual(len(item["pages"]), 2)
+        self.assertEqual(item["total"], 3)
+        self.assertNotIn("next_cursor", item)
@@ -0,0 +1,75 @@
+import contextlib
+import io
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+from django.template import Context, Template
+from django.test import SimpleTestCase, override_settings
+
+from main import bundles
+
+# 改行と行頭の空白を詰めるだけの最小化の代わり
+FAKE_ESBUILD = [
+    sys.executable,
+    "-c",
+    "import re, sys; sys.stdout.write(re.sub(r'\\n\\s*', '', sys.stdin.read()))",
+]
+
+
+class ScriptsTests(SimpleTestCase):
+    def render(self, name):
+        return Template("{% load bundles %}{% bundle_scripts name %}").render(
+            Context({"name": name})
+        )
+
+    @override_settings(JS_BUNDLES=True)
+    def test_bundle_replaces_page_scripts(self):
+        self.assertEqual(bundles.scripts("translator"), ["bundles/translator.js"])
+        self.assertEqual(self.render("translator").count("<script"), 1)
+
+    @override_settings(JS_BUNDLES=False)
+    def test_page_scripts_in_order_without_bundles(self):
+        html = self.render("translator")
+        positions = [html.index(source) for source in bundles.BUNDLES["translator"]]
+        self.assertEqual(positions, sorted(positions))
+
+
+class BuildTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.tmp)
+
+    def test_concatenates_scripts_in_order(self):
+        code = bundles.concatenate(bundles.BUNDLES["translator"])
+        headers = [f"/* {source} */" for source in bundles.BUNDLES["translator"]]
+        positions = [code.index(header) for header in headers]
+        self.assertEqual(positions, sorted(positions))
+        # 末尾のセミコロンが省略されたスクリプトが次のスクリプトとつながらない
+        self.assertEqual(code.count("\n;\n"), len(headers))
+
+    def test_writes_minified_bundles(self):
+        with mock.patch.object(bundles, "ESBUILD_COMMAND", FAKE_ESBUILD):
+            results = bundles.build(self.tmp)
+        self.assertEqual([r[0] for r in results], list(bundles.BUNDLES))
+        for name, original, size, minified in results:
+            self.assertTrue(minified)
+            self.assertLess(size, original)
+            self.assertTrue((self.tmp / bundles.path(name)).is_file())
+
+    def test_falls_back_to_concatenation_once_esbuild_fails(self):
+        with (
+            mock.patch.object(bundles, "ESBUILD_COMMAND", ["false"]),
+            mock.patch.object(bundles, "minify", wraps=bundles.minify) as minify,
+            contextlib.redirect_stdout(io.StringIO()),
+        ):
+            results = bundles.build(self.tmp)
+        self.assertEqual(minify.call_count, 1)
+        for name, original, size, minified in results:
+            self.assertFalse(minified)
+            self.assertEqual(
+                (self.tmp / bundles.path(name)).read_text(encoding="utf-8"),
+                bundles.concatenate(bundles.BUNDLES[name]),
+            )
@@ -0,0 +1,78 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from main import circuit
+from main.tests.clock import FakeClock
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch("main.circuit.time", self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = circuit.CircuitBreaker(
+            "test",
+            window=4,
+            min_calls=2,
+            error_rate=0.5,
+            slow_call_seconds=5,
+            slow_call_rate=1.0,
+            open_seconds=30,
+            half_open_calls=1,
+        )
+
+    def open_breaker(self):
+        self.breaker.record(failed=True, duration=0)
+        self.breaker.record(failed=True, duration=0)
+        self.assertEqual(self.breaker.state, circuit.OPEN)
+
+    def test_stays_closed_below_min_calls(self):
+        self.breaker.record(failed=True, duration=0)
+        self.assertEqual(self.breaker.state, circuit.CLOSED)
+        self.breaker.before_call()
+
+    def test_opens_on_error_rate(self):
+        self.breaker.record(failed=False, duration=0)
+        self.breaker.record(failed=True, duration=0)
+        self.assertEqual(self.breaker.state, circuit.OPEN)
+        self.clock.advance(10)
+        with self.assertRaises(circuit.CircuitOpen) as cm:
+            self.breaker.before_call()
+        self.assertEqual(cm.exception.retry_after, 20)
+
+    def test_opens_on_slow_call_rate(self):
+        self.breaker.record(failed=False, duration=5)
+        self.breaker.record(failed=False, duration=6)
+        self.assertEqual(self.breaker.state, circuit.OPEN)
+
+    def test_half_open_probe_success_closes(self):
+        self.open_breaker()
+        self.clock.advance(30)
+        self.breaker.before_call()
+        self.assertEqual(self.breaker.state, circuit.HALF_OPEN)
+        # 試行の枠は half_open_calls 回まで
+        with self.assertRaises(circuit.CircuitOpen):
+            self.breaker.before_call()
+        self.breaker.record(failed=False, duration=0)
+        self.assertEqual(self.breaker.state, circuit.CLOSED)
+        self.assertEqual(self.breaker.snapshot()["recent_calls"], 0)
+
+    def test_half_open_probe_failure_reopens(self):
+        self.open_breaker()
+        self.clock.advance(30)
+        self.breaker.before_call()
+        self.breaker.record(failed=False, duration=5)
+        self.assertEqual(self.breaker.state, circuit.OPEN)
+        self.assertEqual(self.breaker.snapshot()["opened"], 2)
+        with self.assertRaises(circuit.CircuitOpen):
+            self.breaker.before_call()
+
+    def test_abandoned_probe_frees_slot(self):
+        self.open_breaker()
+        self.clock.advance(30)
+        self.breaker.before_call()
+        self.breaker.abandon()
+        self.breaker.before_call()
+        self.assertEqual(self.breaker.state, circuit.HALF_OPEN)
@@ -0,0 +1,78 @@
+import time
+from unittest import mock
+
+from django.conf import settings
+from django.test import SimpleTestCase, override_settings
+
+from benchmarks import stub_api
+from main import circuit, deadline, upstream
+from main.tests.clock import FakeClock
+
+
+class DeadlineTests(SimpleTestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch("main.deadline.time", self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_remaining_time_counts_down(self):
+        token = deadline.start(5)
+        try:
+            self.clock.advance(2)
+            self.assertEqual(deadline.remaining(), 3)
+            self.assertFalse(deadline.expired())
+            self.clock.advance(3)
+            self.assertTrue(deadline.expired())
+        finally:
+            deadline.reset(token)
+        self.assertIsNone(deadline.remaining())
+
+    def test_zero_means_no_deadline(self):
+        token = deadline.start(0)
+        try:
+            self.assertIsNone(deadline.remaining())
+            self.assertFalse(deadline.expired())
+        finally:
+            deadline.reset(token)
+
+
+class UpstreamDeadlineTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server, cls.api_host = stub_api.start(latency=2)
+        cls.addClassCleanup(cls.server.stop)
+        cls.addClassCleanup(circuit._breakers.pop, "qiita", None)
+
+    async def test_call_gives_up_at_deadline(self):
+        token = deadline.start(0.1)
+        started = time.monotonic()
+        try:
+            with self.assertRaises(upstream.DeadlineExceeded):
+                await upstream.post(f"{self.api_host}/search", json={"query": "猫"})
+        finally:
+            deadline.reset(token)
+        self.assertLess(time.monotonic() - started, 1)
+
+    async def test_expired_deadline_does_not_call_upstream(self):
+        token = deadline.start(0.1)
+        try:
+            with mock.patch.object(upstream, "_attempt") as attempt:
+                with mock.patch("main.deadline.time", FakeClock(time.monotonic() + 1)):
+                    with self.assertRaises(upstream.DeadlineExceeded):
+                        await upstream.post(f"{self.api_host}/search")
+        finally:
+            deadline.reset(token)
+        attempt.assert_not_called()
+
+    async def test_view_returns_gateway_timeout(self):
+        with override_settings(
+            API_KEY="test",
+            REQUEST_DEADLINE_SECONDS=0.1,
+            UPSTREAM_URLS={**settings.UPSTREAM_URLS, "qiita": f"{self.api_host}/qiita"},
+        ):
+            response = await self.async_client.get(
+                "/qiita/query/", {"query": "deadline-timeout"}
+            )
+        self.assertEqual(response.status_code, 504)
@@ -0,0 +1,93 @@
+import itertools
+import time
+
+from django.test import SimpleTestCase, override_settings
+
+from benchmarks import stub_api
+from main import circuit, hedging, upstream
+
+ENDPOINT = "hedge_test"
+
+
+def slow_first(seconds):
+    """最初のリクエストだけ seconds 秒かかる遅延（stub_api の latency に渡す）"""
+    calls = itertools.count()
+    return lambda rng: seconds if next(calls) == 0 else 0.01
+
+
+class LatencyWindowTests(SimpleTestCase):
+    def test_quantile_needs_min_samples(self):
+        window = hedging.LatencyWindow(size=10, min_samples=3)
+        window.record(0.1)
+        window.record(0.2)
+        self.assertIsNone(window.quantile(0.95))
+        window.record(0.3)
+        self.assertEqual(window.quantile(0.5), 0.2)
+        self.assertEqual(window.quantile(0.95), 0.3)
+
+    def test_keeps_only_recent_samples(self):
+        window = hedging.LatencyWindow(size=2, min_samples=1)
+        for seconds in (5.0, 0.1, 0.2):
+            window.record(seconds)
+        self.assertEqual(window.quantile(1.0), 0.2)
+
+
+class RetryBudgetTests(SimpleTestCase):
+    def test_hedges_are_limited_to_ratio_of_requests(self):
+        budget = hedging.RetryBudget(ratio=0.5, capacity=10)
+        budget.deposit()
+        self.assertFalse(budget.try_withdraw())
+        budget.deposit()
+        self.assertTrue(budget.try_withdraw())
+        self.assertFalse(budget.try_withdraw())
+
+    def test_budget_is_capped(self):
+        budget = hedging.RetryBudget(ratio=1, capacity=2)
+        for _ in range(10):
+            budget.deposit()
+        self.assertEqual(budget.tokens, 2)
+
+
+@override_settings(
+    UPSTREAM_HEDGE_ENDPOINTS={ENDPOINT},
+    UPSTREAM_HEDGE_QUANTILE=0.95,
+    UPSTREAM_HEDGE_MIN_SAMPLES=1,
+    UPSTREAM_RETRY_BUDGET_CAPACITY=10,
+)
+class HedgedPostTests(SimpleTestCase):
+    def setUp(self):
+        self.addCleanup(hedging._policies.pop, ENDPOINT, None)
+        self.addCleanup(circuit._breakers.pop, ENDPOINT, None)
+
+    def start_stub(self, latency):
+        server, api_host = stub_api.start(latency=latency)
+        self.addCleanup(server.stop)
+        return f"{api_host}/search"
+
+    async def post(self, url):
+        started = time.monotonic()
+        response = await upstream.post(url, ENDPOINT, json={"query": "猫"})
+        self.assertEqual(response.status_code, 200)
+        return time.monotonic() - started
+
+    async def test_hedge_wins_when_first_call_is_slow(self):
+        with override_settings(UPSTREAM_RETRY_BUDGET_RATIO=1.0):
+            hedging.policy(ENDPOINT).record(0.02)
+            elapsed = await self.post(self.start_stub(slow_first(2)))
+        self.assertLess(elapsed, 1)
+        stats = hedging.stats()[ENDPOINT]
+        self.assertEqual((stats["hedged"], stats["hedge_wins"]), (1, 1))
+
+    async def test_no_hedge_without_budget(self):
+        with override_settings(UPSTREAM_RETRY_BUDGET_RATIO=0.1):
+            hedging.policy(ENDPOINT).record(0.02)
+            elapsed = await self.post(self.start_stub(slow_first(0.3)))
+        self.assertGreaterEqual(elapsed, 0.3)
+        stats = hedging.stats()[ENDPOINT]
+        self.assertEqual((stats["hedged"], stats["skipped_budget"]), (0, 1))
+
+    async def test_no_hedge_without_latency_samples(self):
+        with override_settings(UPSTREAM_RETRY_BUDGET_RATIO=1.0):
+            elapsed = await self.post(self.start_stub(slow_first(0.3)))
+        self.assertGreaterEqual(elapsed, 0.3)
+        self.assertEqual(hedging.stats()[ENDPOINT]["hedged"], 0)
@@ -0,0 +1,20 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from main import metrics
+
+
+class MetricsMiddlewareTests(SimpleTestCase):
+    def methods(self, method):
+        with mock.patch.object(metrics.REQUESTS, "labels") as labels:
+            self.client.generic(method, "/qiita/suggest/", QUERY_STRING="prefix=a")
+        return [call.args[2] for call in labels.call_args_list]
+
+    def test_known_methods_are_labelled_as_sent(self):
+        for method in ("GET", "POST", "HEAD", "OPTIONS"):
+            self.assertEqual(self.methods(method), [method])
+
+    def test_other_methods_share_one_label(self):
+        for method in ("PUT", "DELETE", "X-RANDOM-1"):
+            self.assertEqual(self.methods(method), ["other"])
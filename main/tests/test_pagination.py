@@ -0,0 +1,103 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+import qiita.views
+from main import pagination
+
+
+class CursorTests(SimpleTestCase):
+    def test_round_trip(self):
+        for offset in (0, 20, 12345):
+            cursor = pagination.encode_cursor(offset)
+            self.assertNotIn("=", cursor)
+            self.assertEqual(pagination.decode_cursor(cursor), offset)
+
+    def test_empty_cursor_is_first_page(self):
+        self.assertEqual(pagination.decode_cursor(""), 0)
+
+    def test_rejects_invalid_cursors(self):
+        for cursor in (
+            "%%%",
+            "bm90IGpzb24",  # "not json"
+            pagination.encode_cursor(-1),
+            pagination.encode_cursor("20"),
+        ):
+            with self.assertRaises(ValueError):
+                pagination.decode_cursor(cursor)
+
+
+class LimitTests(SimpleTestCase):
+    def test_defaults_and_clamps(self):
+        self.assertEqual(pagination.parse_limit(""), pagination.DEFAULT_LIMIT)
+        self.assertEqual(pagination.parse_limit("0"), 1)
+        self.assertEqual(pagination.parse_limit("1000"), pagination.MAX_LIMIT)
+        self.assertEqual(pagination.parse_limit("5"), 5)
+
+    def test_rejects_non_integers(self):
+        with self.assertRaises(ValueError):
+            pagination.parse_limit("ten")
+
+
+class PaginateTests(SimpleTestCase):
+    def test_last_page_has_no_cursor(self):
+        items = list(range(5))
+        page, cursor = pagination.paginate(items, 0, 2)
+        self.assertEqual(page, [0, 1])
+        self.assertEqual(pagination.decode_cursor(cursor), 2)
+        page, cursor = pagination.paginate(items, 4, 2)
+        self.assertEqual(page, [4])
+        self.assertIsNone(cursor)
+
+    def test_project_keeps_only_listed_fields(self):
+        spec = {"similarity": True, "metadata": {"url": True, "tags": {"name": True}}}
+        value = [
+            {
+                "similarity": 0.5,
+                "content": "本文",
+                "metadata": {
+                    "url": "https://example.com",
+                    "body": "本文",
+                    "tags": [{"name": "python", "id": 1}],
+                },
+            }
+        ]
+        self.assertEqual(
+            pagination.project(value, spec),
+            [
+                {
+                    "similarity": 0.5,
+                    "metadata": {
+                        "url": "https://example.com",
+                        "tags": [{"name": "python"}],
+                    },
+                }
+            ],
+        )
+
+
+class QueryPaginationTests(SimpleTestCase):
+    def setUp(self):
+        async def search(search_query):
+            return [{"metadata": {"title": f"記事{i}"}} for i in range(5)]
+
+        patcher = mock.patch.object(qiita.views, "search", search)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_follows_cursors_to_the_last_page(self):
+        titles, cursor = [], ""
+        while cursor is not None:
+            response = self.client.get(
+                "/qiita/query/", {"query": "記事", "limit": 2, "cursor": cursor}
+            )
+            self.assertEqual(response.status_code, 200)
+            data = response.json()
+            self.assertEqual(data["total"], 5)
+            titles += [a["metadata"]["title"] for a in data["articles"]]
+            cursor = data["next_cursor"]
+        self.assertEqual(titles, [f"記事{i}" for i in range(5)])
+
+    def test_invalid_cursor_is_a_bad_request(self):
+        response = self.client.get("/qiita/query/", {"query": "記事", "cursor": "%%%"})
+        self.assertEqual(response.status_code, 400)
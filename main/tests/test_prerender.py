@@ -0,0 +1,86 @@
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from main import prerender
+from main.tests.clock import FakeClock
+
+
+class PrerenderedPageTests(TestCase):
+    def test_anonymous_request_gets_validated_page(self):
+        response = self.client.get("/qiita/")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["ETag"].startswith('"'))
+        self.assertEqual(response["Cache-Control"], "no-cache")
+        self.assertIn("Cookie", response["Vary"])
+        self.assertEqual(response["X-Frame-Options"], settings.X_FRAME_OPTIONS)
+
+    def test_matching_etag_is_not_modified(self):
+        etag = self.client.get("/qiita/")["ETag"]
+        response = self.client.get("/qiita/", headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+        response = self.client.get("/qiita/", headers={"if-none-match": '"other"'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_logged_in_user_gets_the_view(self):
+        etag = self.client.get("/qiita/")["ETag"]
+        self.client.force_login(User.objects.create_user("reader"))
+        response = self.client.get("/qiita/", headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("ETag", response)
+
+
+class StalenessTests(SimpleTestCase):
+    name = "prerender_test.html"
+
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.template = self.tmp / self.name
+        self.write("1")
+        templates = override_settings(
+            TEMPLATES=[{**settings.TEMPLATES[0], "DIRS": [self.tmp]}]
+        )
+        templates.enable()
+        self.addCleanup(templates.disable)
+        self.clock = FakeClock()
+        patcher = mock.patch("main.prerender.time", self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(prerender._pages.pop, self.name, None)
+
+    def write(self, content, mtime_offset=0):
+        self.template.write_text(content, encoding="utf-8")
+        mtime = os.stat(self.template).st_mtime + mtime_offset
+        os.utime(self.template, (mtime, mtime))
+
+    def test_changed_template_is_rendered_again_after_check_interval(self):
+        first = prerender.page(self.name)
+        self.assertEqual(first.content, b"1")
+        self.write("2", mtime_offset=10)
+
+        # 確かめる間隔の間はファイルにアクセスせずに返す
+        self.clock.advance(prerender.CHECK_INTERVAL / 2)
+        self.assertTrue(prerender.fresh(self.name))
+        self.assertEqual(prerender.page(self.name), first)
+
+        self.clock.advance(prerender.CHECK_INTERVAL)
+        self.assertFalse(prerender.fresh(self.name))
+        second = prerender.page(self.name)
+        self.assertEqual(second.content, b"2")
+        self.assertNotEqual(second.etag, first.etag)
+
+    def test_unchanged_template_keeps_etag(self):
+        first = prerender.page(self.name)
+        self.clock.advance(prerender.CHECK_INTERVAL * 2)
+        second = prerender.page(self.name)
+        self.assertEqual(second.etag, first.etag)
+        self.assertEqual(second.checked, self.clock.now)
+        self.assertTrue(prerender.fresh(self.name))
@@ -0,0 +1,109 @@
+import asyncio
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from main import upstream
+from main.query_cache import QueryCache
+from main.tests.clock import FakeClock
+
+
+class QueryCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch("main.query_cache.time", self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.cache = QueryCache(100, {"search": 60}, stale_ttl=600, negative_ttl=10)
+        self.calls = 0
+
+    def fetcher(self, *results):
+        """呼ばれるたびに results を順に返す（例外なら送出する）fetch"""
+        results = list(results)
+
+        async def fetch():
+            self.calls += 1
+            result = results.pop(0)
+            if isinstance(result, Exception):
+                raise result
+            return result
+
+        return fetch
+
+    async def wait_for_revalidation(self):
+        while self.cache.flights.stats()["in_flight"]:
+            await asyncio.sleep(0)
+
+    async def test_fresh_result_is_cached(self):
+        fetch = self.fetcher(["a"], ["b"])
+        self.assertEqual(await self.cache.get_or_fetch("search", "猫", fetch), ["a"])
+        self.clock.advance(59)
+        # 全角スペースなどは正規化して同じキーにする
+        self.assertEqual(await self.cache.get_or_fetch("search", " 猫　", fetch), ["a"])
+        self.assertEqual(self.calls, 1)
+
+    async def test_stale_result_is_returned_while_revalidating(self):
+        fetch = self.fetcher(["a"], ["b"])
+        await self.cache.get_or_fetch("search", "猫", fetch)
+        self.clock.advance(61)
+        self.assertEqual(await self.cache.get_or_fetch("search", "猫", fetch), ["a"])
+        await self.wait_for_revalidation()
+        self.assertEqual(self.calls, 2)
+        self.assertEqual(await self.cache.get_or_fetch("search", "猫", fetch), ["b"])
+        self.assertEqual(self.cache.stats()["endpoints"]["search"]["stale"], 1)
+
+    async def test_stale_result_expires(self):
+        fetch = self.fetcher(["a"], ["b"])
+        await self.cache.get_or_fetch("search", "猫", fetch)
+        self.clock.advance(60 + 600)
+        self.assertEqual(await self.cache.get_or_fetch("search", "猫", fetch), ["b"])
+        self.assertEqual(self.calls, 2)
+
+    async def test_empty_result_uses_negative_ttl(self):
+        fetch = self.fetcher([], ["a"])
+        self.assertEqual(await self.cache.get_or_fetch("search", "猫", fetch), [])
+        self.clock.advance(9)
+        self.assertEqual(await self.cache.get_or_fetch("search", "猫", fetch), [])
+        self.assertEqual(self.calls, 1)
+        self.clock.advance(2)
+        # 期限切れ後は古い結果を返しつつ取り直す
+        await self.cache.get_or_fetch("search", "猫", fetch)
+        await self.wait_for_revalidation()
+        self.assertEqual(await self.cache.get_or_fetch("search", "猫", fetch), ["a"])
+        self.assertEqual(self.calls, 2)
+
+    async def test_error_is_cached_until_negative_ttl(self):
+        fetch = self.fetcher(upstream.UpstreamError("エラー", status=502), ["a"])
+        with self.assertRaises(upstream.UpstreamError):
+            await self.cache.get_or_fetch("search", "猫", fetch)
+        with self.assertRaises(upstream.UpstreamError) as cm:
+            await self.cache.get_or_fetch("search", "猫", fetch)
+        self.assertEqual(cm.exception.status, 502)
+        self.assertEqual(self.calls, 1)
+        self.clock.advance(10)
+        self.assertEqual(await self.cache.get_or_fetch("search", "猫", fetch), ["a"])
+        self.assertEqual(self.calls, 2)
+
+    async def test_error_keeps_serving_stale_result(self):
+        fetch = self.fetcher(["a"], upstream.UpstreamError("エラー"), ["b"])
+        await self.cache.get_or_fetch("search", "猫", fetch)
+        self.clock.advance(61)
+        await self.cache.get_or_fetch("search", "猫", fetch)
+        await self.wait_for_revalidation()
+        # 取り直しに失敗しても、negative_ttl の間は古い結果を新しい結果として扱う
+        self.clock.advance(9)
+        self.assertEqual(await self.cache.get_or_fetch("search", "猫", fetch), ["a"])
+        self.assertEqual(self.calls, 2)
+
+    async def test_uncacheable_error_is_not_cached(self):
+        for error in (upstream.Overloaded(1), upstream.Unavailable(1)):
+            with self.subTest(error=type(error).__name__):
+                fetch = self.fetcher(error, ["a"])
+                with self.assertRaises(type(error)):
+                    await self.cache.get_or_fetch("search", type(error).__name__, fetch)
+                self.assertEqual(
+                    await self.cache.get_or_fetch(
+                        "search", type(error).__name__, fetch
+                    ),
+                    ["a"],
+                )
@@ -0,0 +1,111 @@
+import asyncio
+import time
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from benchmarks import stub_api
+from main import circuit, realtime_sessions
+
+PROFILE = {"model": "gpt-4o-realtime-preview", "voice": "verse"}
+
+
+class ShiftedClock:
+    """time.time() を offset 秒だけ進めて返す（トークンの期限切れを試すため）"""
+
+    def __init__(self):
+        self.offset = 0
+
+    def time(self):
+        return time.time() + self.offset
+
+    def monotonic(self):
+        return time.monotonic()
+
+
+class TokenPoolTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # stub_api のトークンの寿命は 60 秒
+        cls.server, api_host = stub_api.start(latency=0.01)
+        cls.addClassCleanup(cls.server.stop)
+        cls.enterClassContext(
+            override_settings(
+                OPENAI_API_KEY="test",
+                OPENAI_REALTIME_SESSIONS_URL=f"{api_host}/v1/realtime/sessions",
+            )
+        )
+        cls.addClassCleanup(circuit._breakers.pop, "realtime_sessions", None)
+
+    def setUp(self):
+        self.clock = ShiftedClock()
+        # スタブのトークンの有効期限も同じ時計で決める
+        for target in ("main.realtime_sessions.time", "benchmarks.stub_api.time"):
+            patcher = mock.patch(target, self.clock)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.pool = realtime_sessions.TokenPool(
+            size=2, min_ttl=20, idle_timeout=600, profiles=[PROFILE]
+        )
+
+    async def wait_for_tokens(self, count):
+        for _ in range(200):
+            if self.pool.counts()["pooled_tokens"] == count:
+                return
+            await asyncio.sleep(0.01)
+        self.fail(f"pool did not reach {count} tokens: {self.pool.counts()}")
+
+    async def stop_refills(self):
+        tasks = [p.task for p in self.pool._profiles.values() if p.task]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def test_serves_from_pool_after_refill(self):
+        try:
+            first = await self.pool.acquire(PROFILE)
+            await self.wait_for_tokens(2)
+            second = await self.pool.acquire(PROFILE)
+            self.assertTrue(second.startswith("ek_"))
+            self.assertNotEqual(first, second)
+            # 取り出した分を補充する
+            await self.wait_for_tokens(2)
+        finally:
+            await self.stop_refills()
+        counts = self.pool.counts()
+        self.assertEqual((counts["hits"], counts["misses"]), (1, 1))
+        self.assertEqual(counts["minted"], 3)
+
+    async def test_expiring_tokens_are_replaced(self):
+        try:
+            await self.pool.acquire(PROFILE)
+            await self.wait_for_tokens(2)
+            # 残りの有効期間が min_ttl を切ったトークンは渡さない
+            self.clock.offset = 45
+            await self.pool.acquire(PROFILE)
+            counts = self.pool.counts()
+            self.assertEqual((counts["hits"], counts["misses"]), (0, 2))
+            self.assertEqual(counts["expired"], 2)
+            # 補充タスクは次の入れ替え時刻を待たずに補充する
+            await self.wait_for_tokens(2)
+            await self.pool.acquire(PROFILE)
+        finally:
+            await self.stop_refills()
+        self.assertEqual(self.pool.counts()["hits"], 1)
+
+    async def test_profiles_outside_allow_list_are_not_pooled(self):
+        value = await self.pool.acquire({**PROFILE, "instructions": "任意の指示"})
+        self.assertTrue(value.startswith("ek_"))
+        counts = self.pool.counts()
+        self.assertEqual(counts["unpooled"], 1)
+        self.assertEqual(counts["profiles"], 0)
+        self.assertEqual(counts["minted"], 0)
+
+    async def test_empty_pool_size_mints_on_demand(self):
+        pool = realtime_sessions.TokenPool(
+            size=0, min_ttl=20, idle_timeout=600, profiles=[PROFILE]
+        )
+        await pool.acquire(PROFILE)
+        self.assertIsNone(pool._profiles[realtime_sessions._profile_key(PROFILE)].task)
+        self.assertEqual(pool.counts()["misses"], 1)
@@ -0,0 +1,74 @@
+import asyncio
+
+from django.conf import settings
+from django.test import SimpleTestCase, override_settings
+
+from benchmarks import stub_api
+from main import server_timing
+from main.singleflight import SingleFlight
+
+
+def phases(response):
+    """Server-Timing ヘッダーのフェーズ名を返す"""
+    return [
+        entry.split(";")[0].strip()
+        for entry in response.headers["Server-Timing"].split(",")
+    ]
+
+
+class SingleFlightTimingTests(SimpleTestCase):
+    async def test_phases_of_shared_fetch_go_to_the_caller_that_started_it(self):
+        flights = SingleFlight()
+        release = asyncio.Event()
+
+        async def fetch():
+            with server_timing.phase("upstream"):
+                await release.wait()
+            return "結果"
+
+        async def request():
+            timings, token = server_timing.start()
+            try:
+                await flights.do(("search", "猫"), fetch)
+            finally:
+                server_timing.reset(token)
+            return timings.durations
+
+        first = asyncio.create_task(request())
+        second = asyncio.create_task(request())
+        await asyncio.sleep(0)
+        release.set()
+        self.assertEqual(list(await first), ["upstream"])
+        self.assertEqual(list(await second), ["flight"])
+
+
+class ServerTimingHeaderTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server, api_host = stub_api.start(latency=0.01)
+        cls.addClassCleanup(cls.server.stop)
+        cls.enterClassContext(
+            override_settings(
+                API_KEY="test",
+                UPSTREAM_URLS={
+                    **settings.UPSTREAM_URLS,
+                    "qiita": f"{api_host}/qiita",
+                },
+            )
+        )
+
+    async def test_cache_miss_reports_upstream_phases(self):
+        response = await self.async_client.get(
+            "/qiita/query/", {"query": "server-timing-miss"}
+        )
+        self.assertEqual(response.status_code, 200)
+        for name in ("cache", "connect", "upstream", "decode", "serialize", "total"):
+            self.assertIn(name, phases(response))
+        self.assertNotIn("flight", phases(response))
+
+    async def test_cache_hit_has_no_upstream_phases(self):
+        query = {"query": "server-timing-hit"}
+        await self.async_client.get("/qiita/query/", query)
+        response = await self.async_client.get("/qiita/query/", query)
+        self.assertNotIn("upstream", phases(response))
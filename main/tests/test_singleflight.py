@@ -0,0 +1,77 @@
+import asyncio
+
+from django.test import SimpleTestCase
+
+from main import deadline, upstream
+from main.singleflight import SingleFlight
+
+
+class SingleFlightTests(SimpleTestCase):
+    def setUp(self):
+        self.flights = SingleFlight()
+        self.calls = 0
+
+    def blocking_fetch(self, release, result="結果"):
+        async def fetch():
+            self.calls += 1
+            await release.wait()
+            return result
+
+        return fetch
+
+    async def test_concurrent_calls_are_coalesced(self):
+        release = asyncio.Event()
+        fetch = self.blocking_fetch(release)
+        waiters = [
+            asyncio.create_task(self.flights.do(("search", "猫"), fetch))
+            for _ in range(3)
+        ]
+        await asyncio.sleep(0)
+        release.set()
+        self.assertEqual(await asyncio.gather(*waiters), ["結果"] * 3)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(
+            self.flights.stats(), {"coalesced_waiters": {"search": 2}, "in_flight": 0}
+        )
+
+    async def test_different_keys_are_not_coalesced(self):
+        release = asyncio.Event()
+        release.set()
+        fetch = self.blocking_fetch(release)
+        await asyncio.gather(
+            self.flights.do(("search", "猫"), fetch),
+            self.flights.do(("search", "犬"), fetch),
+        )
+        self.assertEqual(self.calls, 2)
+
+    async def test_cancelled_caller_does_not_cancel_others(self):
+        release = asyncio.Event()
+        fetch = self.blocking_fetch(release)
+        first = asyncio.create_task(self.flights.do(("search", "猫"), fetch))
+        second = asyncio.create_task(self.flights.do(("search", "猫"), fetch))
+        await asyncio.sleep(0)
+        first.cancel()
+        release.set()
+        self.assertEqual(await second, "結果")
+        with self.assertRaises(asyncio.CancelledError):
+            await first
+
+    async def test_deadline_applies_to_each_caller(self):
+        release = asyncio.Event()
+        fetch = self.blocking_fetch(release)
+
+        async def with_deadline(seconds):
+            token = deadline.start(seconds)
+            try:
+                return await self.flights.do(("search", "猫"), fetch)
+            finally:
+                deadline.reset(token)
+
+        short = asyncio.create_task(with_deadline(0.01))
+        long = asyncio.create_task(with_deadline(5))
+        with self.assertRaises(upstream.DeadlineExceeded):
+            await short
+        # 最初の呼び出し元の期限が過ぎても、処理は続けて他の呼び出し元に返す
+        release.set()
+        self.assertEqual(await long, "結果")
+        self.assertEqual(self.calls, 1)
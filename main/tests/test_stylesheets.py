@@ -0,0 +1,101 @@
+import contextlib
+import io
+import shutil
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+from django.template import Context, Template
+from django.test import SimpleTestCase, override_settings
+
+from main import stylesheets
+
+CSS = """
+@layer theme, base, utilities;
+@layer theme {
+  :root { --color-red-500: red; }
+}
+@layer utilities {
+  .flex { display: flex; }
+  .hidden { display: none; }
+  .md\\:w-1\\/2 { width: 50%; }
+  .hover\\:text-red-500:hover { color: var(--color-red-500); }
+}
+@property --tw-shadow { syntax: "*"; inherits: false; }
+"""
+
+TEMPLATE = """
+<html class="h-full">
+<body class="flex {% if dark %}dark{% endif %}">
+  <div class="md:w-1/2"></div>
+  <footer class="hidden"></footer>
+</body>
+</html>
+"""
+
+
+class CriticalCssTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.tmp)
+
+    def test_collects_classes_above_the_fold(self):
+        template = self.tmp / "index.html"
+        template.write_text(TEMPLATE, encoding="utf-8")
+        self.assertEqual(
+            stylesheets.above_the_fold_classes([template], limit=2),
+            {"h-full", "flex", "dark", "md:w-1/2"},
+        )
+
+    def test_keeps_only_used_utilities(self):
+        critical = stylesheets.extract_critical(CSS, {"flex", "md:w-1/2"})
+        self.assertIn(".flex", critical)
+        self.assertIn(".md\\:w-1\\/2", critical)
+        self.assertNotIn(".hidden", critical)
+        self.assertNotIn("hover", critical)
+        # テーマ変数・レイヤーの宣言・@property はすべて残す
+        self.assertIn("--color-red-500: red", critical)
+        self.assertIn("@layer theme, base, utilities;", critical)
+        self.assertIn("@property --tw-shadow", critical)
+        self.assertNotIn("\n", critical)
+
+    def test_build_falls_back_to_site_stylesheet(self):
+        with (
+            mock.patch.object(stylesheets, "TAILWIND_COMMAND", ["false"]),
+            contextlib.redirect_stdout(io.StringIO()),
+        ):
+            results = stylesheets.build(self.tmp)
+        self.assertEqual([r[0] for r in results], stylesheets.APPS)
+        for app, size, critical_size, compiled in results:
+            self.assertFalse(compiled)
+            self.assertLess(critical_size, size)
+            self.assertTrue((self.tmp / stylesheets.critical_path(app)).is_file())
+
+
+class StylesheetTagTests(SimpleTestCase):
+    def render(self):
+        return Template('{% load bundles %}{% stylesheet "qiita" %}').render(Context())
+
+    def setUp(self):
+        stylesheets.critical.cache_clear()
+        self.addCleanup(stylesheets.critical.cache_clear)
+
+    @override_settings(SPLIT_STYLESHEETS=False)
+    def test_site_stylesheet_without_splitting(self):
+        self.assertIn(stylesheets.SITE_STYLESHEET, self.render())
+
+    @override_settings(SPLIT_STYLESHEETS=True)
+    def test_inlines_critical_css_and_loads_the_rest_later(self):
+        critical = ".x{content:'</style><script>'}"
+        with mock.patch.object(stylesheets, "critical", return_value=critical):
+            html = self.render()
+        self.assertIn("<style>.x{content:'<\\/style><script>'}</style>", html)
+        self.assertIn('rel="preload"', html)
+        self.assertIn("css/qiita.css", html)
+
+    @override_settings(SPLIT_STYLESHEETS=True)
+    def test_plain_link_without_critical_css(self):
+        with mock.patch.object(stylesheets, "critical", return_value=None):
+            html = self.render()
+        self.assertNotIn("<style>", html)
+        self.assertIn('<link rel="stylesheet" href="/static/css/qiita.css">', html)
@@ -0,0 +1,61 @@
+from unittest import mock
+
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from main import suggestions
+
+
+@override_settings(
+    CACHES={
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+        "suggestions": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "test-suggestions",
+        },
+    }
+)
+class SharedClientCountTests(SimpleTestCase):
+    def setUp(self):
+        # 同じ共有キャッシュを使う2つのワーカープロセスのインデックス
+        self.workers = [suggestions.SuggestIndex(100, min_clients=3) for _ in range(2)]
+        self.addCleanup(suggestions.caches["suggestions"].clear)
+
+    async def search(self, worker, query, address):
+        request = RequestFactory().get("/", REMOTE_ADDR=address)
+        with mock.patch.object(
+            suggestions, "index_for", return_value=self.workers[worker]
+        ):
+            await suggestions.record("qiita", query, request)
+
+    async def test_clients_are_counted_across_workers(self):
+        await self.search(0, "猫", "192.0.2.1")
+        await self.search(1, "猫", "192.0.2.2")
+        await self.search(0, "猫", "192.0.2.3")
+        self.assertEqual(self.workers[0].suggest("猫"), ["猫"])
+        # ワーカー1 は2人目までしか見ていないが、次の検索で共有の人数を知る
+        self.assertEqual(self.workers[1].suggest("猫"), [])
+        await self.search(1, "猫", "192.0.2.2")
+        self.assertEqual(self.workers[1].suggest("猫"), ["猫"])
+
+    async def test_one_client_on_every_worker_is_counted_once(self):
+        for worker in (0, 1, 0, 1):
+            await self.search(worker, "犬", "192.0.2.1")
+        self.assertEqual(self.workers[0].suggest("犬"), [])
+        self.assertEqual(self.workers[1].suggest("犬"), [])
+
+
+class EvictionTests(SimpleTestCase):
+    def test_evicts_lowest_ranked_keywords_in_a_batch(self):
+        index = suggestions.SuggestIndex(20)
+        for i in range(20):
+            # 番号が大きいほど多くの利用者が検索したキーワード
+            for client in range(i + 1):
+                index.record(f"kw{i:02}", bytes([client]))
+        index.record("new", b"\0")
+
+        # 上限の 1 割（2件）をまとめて捨てる
+        self.assertEqual(len(index._entries), 19)
+        self.assertNotIn("kw00", index._entries)
+        self.assertNotIn("kw01", index._entries)
+        self.assertEqual(index._keys, sorted(index._entries))
+        self.assertEqual(index.suggest("kw", 1), ["kw19"])
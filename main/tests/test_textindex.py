@@ -0,0 +1,65 @@
+import shutil
+import tempfile
+from pathlib import Path
+
+import numpy as np
+from django.test import SimpleTestCase
+
+from main import textindex
+
+TEXTS = ["地震への備え", "感染症への備え", "設備の耐震化", "猫の写真"]
+
+# 文書ごとの L2 正規化したベクトル（4次元の単位ベクトル）
+VECTORS = np.eye(4, dtype=np.float32)
+
+
+class TextIndexTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.tmp)
+
+    def build(self, **kwargs):
+        docs = [{"id": i} for i in range(len(TEXTS))]
+        textindex.build_index(
+            self.tmp / "index", TEXTS, docs, VECTORS, "stub", **kwargs
+        )
+        return textindex.TextIndex(self.tmp / "index")
+
+    def test_tokenize_uses_character_bigrams(self):
+        self.assertEqual(textindex.tokenize("耐震化 A"), ["耐震", "震化", "a"])
+
+    def test_bm25_ranks_documents_sharing_more_bigrams_first(self):
+        index = self.build()
+        ranked = [doc for doc, _, _ in index.search("地震への備え", k=4)]
+        self.assertEqual(ranked[:2], [0, 1])
+        # 一致する bigram のない文書は返さない
+        self.assertNotIn(3, ranked)
+
+    def test_scores_blend_keywords_and_cosine(self):
+        index = self.build()
+        vector = np.array([0, 0.6, 0.8, 0], dtype=np.float32)
+        results = index.search("設備", k=4, vector=vector, keyword_weight=0.5)
+        doc, score, cosine = results[0]
+        self.assertEqual(doc, 2)
+        self.assertAlmostEqual(cosine, 0.8, 5)
+        # BM25 は最大値で正規化するため、最も一致した文書は 1
+        self.assertAlmostEqual(score, 0.5 * 0.8 + 0.5 * 1.0, 5)
+        self.assertEqual([r[0] for r in results], [2, 1])
+
+    def test_falls_back_to_cosine_without_keyword_matches(self):
+        index = self.build()
+        vector = np.array([0, 0, 0, 1], dtype=np.float32)
+        self.assertEqual(index.search("犬", k=2, vector=vector), [(3, 1.0, 1.0)])
+
+    def test_top_k_of_vector_only_index(self):
+        index = self.build(bm25=False, dtype=np.float16)
+        vector = np.array([0.1, 0.2, 0.3, 0.4], dtype=np.float32)
+        results = index.search("", k=2, vector=vector)
+        self.assertEqual([doc for doc, _, _ in results], [3, 2])
+        self.assertEqual(index.search("", k=2), [])
+
+    def test_rebuild_replaces_the_index(self):
+        self.build()
+        index = self.build(bm25=False)
+        self.assertIsNone(index.vocab)
+        self.assertEqual(sorted(p.name for p in self.tmp.iterdir()), ["index"])
@@ -0,0 +1,229 @@
+"""
+プロセス内で検索するための軽量なテキストインデックス
+
+- BM25: 文字 bigram の転置インデックスによるキーワード検索
+  （日本語は単語区切りがないため、文字 n-gram を単位にする）
+- ベクトル: 上流APIの埋め込みモデル（main.embeddings）で作った
+  L2 正規化ベクトルのコサイン類似度
+
+インデックスは管理コマンドでディレクトリに書き出し、NumPy の
+メモリマップで読み込む。gunicorn の各ワーカーは同じファイルを
+マップするため、ページキャッシュ上のデータを共有できる。
+"""
+
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import unicodedata
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+
+# BM25 のパラメータ
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# float16 のベクトルを float32 に変換しながら内積を取るときの1回の行数
+# （メモリマップ全体をコピーせず、一時的な配列をこの行数に抑える）
+CHUNK_ROWS = 4096
+
+_WORD_PATTERN = re.compile(r"\w+")
+
+
+def _segments(text):
+    return _WORD_PATTERN.findall(unicodedata.normalize("NFKC", text).lower())
+
+
+def tokenize(text):
+    """BM25 用に、文字 bigram（1文字だけの語はその文字）に分割する"""
+    tokens = []
+    for segment in _segments(text):
+        if len(segment) == 1:
+            tokens.append(segment)
+        else:
+            tokens.extend(segment[i : i + 2] for i in range(len(segment) - 1))
+    return tokens
+
+
+def build_index(directory, texts, docs, vectors, model, dtype=np.float32, bm25=True):
+    """
+    インデックスを作成してディレクトリに書き出す
+
+    一時ディレクトリに書き出してから置き換えるため、
+    稼働中のワーカーが書きかけのファイルを読むことはない。
+
+    :param texts: 検索対象のテキスト（docs と同じ順序）
+    :param docs: 検索結果として返す各文書のメタデータ
+    :param vectors: 各文書の L2 正規化したベクトル（main.embeddings.embed_documents）
+    :param model: ベクトルを作った埋め込みモデルの名前
+    :param dtype: ベクトルの保存形式（np.float16 にすると半分のサイズになる）
+    :param bm25: キーワード検索用の転置インデックスも作るかどうか
+    """
+    directory = Path(directory)
+    directory.parent.mkdir(parents=True, exist_ok=True)
+    tmp = Path(tempfile.mkdtemp(dir=directory.parent, prefix=f".{directory.name}-"))
+
+    vectors = np.asarray(vectors).astype(dtype)
+    np.save(tmp / "vectors.npy", vectors)
+    meta = {"count": len(docs), "dim": vectors.shape[1], "model": model, "bm25": bm25}
+
+    if bm25:
+        doc_tokens = [Counter(tokenize(text)) for text in texts]
+        vocab = {}
+        postings = []
+        for doc_id, counts in enumerate(doc_tokens):
+            for term, tf in counts.items():
+                term_id = vocab.setdefault(term, len(vocab))
+                if term_id == len(postings):
+                    postings.append([])
+                postings[term_id].append((doc_id, tf))
+
+        indptr = np.zeros(len(postings) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum([len(p) for p in postings])
+        flat = [entry for p in postings for entry in p]
+        doc_len = np.array([sum(c.values()) for c in doc_tokens], dtype=np.float32)
+        df = np.diff(indptr).astype(np.float32)
+        n = len(docs)
+        np.save(tmp / "postings_indptr.npy", indptr)
+        np.save(tmp / "postings_docs.npy", np.array([d for d, _ in flat], np.int32))
+        np.save(tmp / "postings_tf.npy", np.array([t for _, t in flat], np.float32))
+        np.save(tmp / "doc_len.npy", doc_len)
+        np.save(tmp / "idf.npy", np.log(1.0 + (n - df + 0.5) / (df + 0.5)))
+        meta["avgdl"] = float(doc_len.mean()) if n else 0.0
+        meta["vocab"] = vocab
+
+    with open(tmp / "docs.json", "w", encoding="utf-8") as f:
+        json.dump(docs, f, ensure_ascii=False)
+    with open(tmp / "meta.json", "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False)
+
+    if directory.exists():
+        old = directory.with_name(f".{directory.name}-old")
+        shutil.rmtree(old, ignore_errors=True)
+        os.rename(directory, old)
+        os.rename(tmp, directory)
+        shutil.rmtree(old, ignore_errors=True)
+    else:
+        os.rename(tmp, directory)
+
+
+class TextIndex:
+    """build_index で書き出したインデックスを読み込んで検索する"""
+
+    def __init__(self, directory):
+        directory = Path(directory)
+        with open(directory / "meta.json", encoding="utf-8") as f:
+            meta = json.load(f)
+        with open(directory / "docs.json", encoding="utf-8") as f:
+            self.docs = json.load(f)
+        self.vectors = np.load(directory / "vectors.npy", mmap_mode="r")
+        # ベクトルを作った埋め込みモデル（検索キーワードも同じモデルでベクトルにする）
+        self.model = meta.get("model")
+        self.vocab = meta.get("vocab")
+        if meta["bm25"]:
+            self.avgdl = meta["avgdl"]
+            self.indptr = np.load(directory / "postings_indptr.npy", mmap_mode="r")
+            self.postings_docs = np.load(directory / "postings_docs.npy", mmap_mode="r")
+            self.postings_tf = np.load(directory / "postings_tf.npy", mmap_mode="r")
+            self.doc_len = np.load(directory / "doc_len.npy", mmap_mode="r")
+            self.idf = np.load(directory / "idf.npy", mmap_mode="r")
+
+    @classmethod
+    def load(cls, directory):
+        """ディレクトリにインデックスがあれば読み込む。なければ None"""
+        if not (Path(directory) / "meta.json").exists():
+            return None
+        return cls(directory)
+
+    def bm25_scores(self, query):
+        """全文書の BM25 スコアを返す"""
+        scores = np.zeros(len(self.docs), dtype=np.float32)
+        for term in set(tokenize(query)):
+            term_id = self.vocab.get(term)
+            if term_id is None:
+                continue
+            start, end = self.indptr[term_id], self.indptr[term_id + 1]
+            docs = self.postings_docs[start:end]
+            tf = self.postings_tf[start:end]
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_len[docs] / self.avgdl)
+            scores[docs] += self.idf[term_id] * tf * (BM25_K1 + 1) / (tf + norm)
+        return scores
+
+    def cosine_scores(self, vector):
+        """
+        全文書とのコサイン類似度を返す（ベクトルは正規化済みなので内積）
+
+        float32 のベクトルはメモリマップのまま内積を取る。float16 の場合は
+        CHUNK_ROWS 行ずつ変換し、ワーカーごとに全体のコピーを作らない。
+        """
+        if self.vectors.dtype == np.float32:
+            return self.vectors @ np.asarray(vector, dtype=np.float32)
+        vector = np.asarray(vector, dtype=np.float32)
+        scores = np.empty(len(self.vectors), dtype=np.float32)
+        for start in range(0, len(self.vectors), CHUNK_ROWS):
+            chunk = self.vectors[start : start + CHUNK_ROWS]
+            scores[start : start + len(chunk)] = chunk.astype(np.float32) @ vector
+        return scores
+
+    def search(self, query, k, vector=None, keyword_weight=0.5):
+        """
+        上位 k 件の (文書番号, スコア, コサイン類似度) を返す
+
+        vector（検索キーワードのベクトル）があればコサイン類似度を、
+        BM25 があれば最大値で 0〜1 に正規化した BM25 スコアを使い、両方あれば
+        keyword_weight の比率で混ぜる。キーワードが1つも一致しなければ
+        コサイン類似度だけで並べる。コサイン類似度は vector がなければ None。
+        全体を並べ替えず、argpartition で上位 k 件を取り出してからその中だけを
+        並べる。スコアが 0 以下の文書は返さない。
+        """
+        cosine = None if vector is None else self.cosine_scores(vector)
+        bm25 = None
+        if self.vocab is not None:
+            bm25 = self.bm25_scores(query)
+            top = float(bm25.max()) if len(bm25) else 0.0
+            bm25 = bm25 / top if top > 0 else None
+        if cosine is None and bm25 is None:
+            return []
+        if cosine is None:
+            scores = bm25
+        elif bm25 is None:
+            scores = cosine
+        else:
+            scores = (1 - keyword_weight) * cosine + keyword_weight * bm25
+
+        k = min(k, len(scores))
+        if k < len(scores):
+            candidates = np.argpartition(-scores, k)[:k]
+        else:
+            candidates = np.arange(len(scores))
+        ordered = candidates[np.argsort(-scores[candidates])]
+        return [
+            (int(i), float(scores[i]), None if cosine is None else float(cosine[i]))
+            for i in ordered
+            if scores[i] > 0
+        ]
+
+
+class SharedIndex:
+    """設定で指定したディレクトリのインデックスを、プロセスごとに1回だけ読み込む"""
+
+    def __init__(self, setting_name):
+        self.setting_name = setting_name
+        self._index = None
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def get(self):
+        """読み込んだ TextIndex を返す。インデックスがなければ None"""
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    directory = getattr(settings, self.setting_name)
+                    self._index = TextIndex.load(directory)
+                    self._loaded = True
+        return self._index
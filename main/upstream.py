@@ -0,0 +1,399 @@
+"""
+上流API（API_HOST や api.openai.com）への HTTP クライアント
+
+リクエストごとにクライアントを作ると SSL コンテキストの生成と
+TCP/TLS ハンドシェイクが毎回発生するため、コネクションプールを持つ
+クライアントをプロセス内で共有する。
+"""
+
+import asyncio
+import contextlib
+import json
+import math
+import time
+import weakref
+
+import httpx
+from django.conf import settings
+
+from main import admission, circuit, deadline, hedging, metrics, server_timing
+
+_clients = weakref.WeakKeyDictionary()
+
+# コネクションプールの利用状況（プロセス単位）
+_pool_stats = {"hits": 0, "misses": 0}
+
+
+def build_client():
+    """設定値に従ってコネクションプール付きの AsyncClient を生成する"""
+    return httpx.AsyncClient(
+        http2=settings.UPSTREAM_HTTP2,
+        limits=httpx.Limits(
+            max_connections=settings.UPSTREAM_POOL_SIZE,
+            max_keepalive_connections=settings.UPSTREAM_POOL_SIZE,
+            keepalive_expiry=settings.UPSTREAM_KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(
+            connect=settings.UPSTREAM_CONNECT_TIMEOUT,
+            read=settings.UPSTREAM_READ_TIMEOUT,
+            write=settings.UPSTREAM_READ_TIMEOUT,
+            pool=settings.UPSTREAM_CONNECT_TIMEOUT,
+        ),
+    )
+
+
+def get_client():
+    """
+    実行中のイベントループで使う共有 AsyncClient を返す
+
+    httpx.AsyncClient はイベントループをまたいで使えないため、ループごとに1つ作る。
+    """
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = _clients[loop] = build_client()
+    return client
+
+
+class _PoolTrace:
+    """
+    新しいTCP接続が張られたかどうかを httpcore のトレースで検出し、
+    プールのヒット/ミスとして記録する
+
+    接続（TCP と TLS）にかかった時間も測り、上流APIの応答時間と分けて
+    Server-Timing に記録する。
+    """
+
+    def __init__(self):
+        self.connected = False
+        self.connect_started = None
+        self.connect_seconds = 0.0
+
+    async def __call__(self, event_name, info):
+        if event_name == "connection.connect_tcp.started":
+            self.connected = True
+            self.connect_started = time.monotonic()
+        elif event_name in (
+            "connection.connect_tcp.complete",
+            "connection.start_tls.complete",
+        ):
+            self.connect_seconds = time.monotonic() - self.connect_started
+
+    def record(self, started, failed=False):
+        """
+        プールのヒット/ミスと、接続・応答の時間を記録する
+
+        :param started: リクエストを送り始めた時刻（time.monotonic()）
+        """
+        if self.connected:
+            _pool_stats["misses"] += 1
+        elif not failed:
+            _pool_stats["hits"] += 1
+        server_timing.add("connect", self.connect_seconds)
+        server_timing.add("upstream", time.monotonic() - started - self.connect_seconds)
+
+
+class _Call:
+    """admit で確保した1回の呼び出し。結果をサーキットブレーカーに記録する"""
+
+    def __init__(self, endpoint_breaker):
+        self.breaker = endpoint_breaker
+        self.started = time.monotonic()
+        self.finished = False
+
+    def finish(self, failed):
+        """レスポンスのヘッダーを受け取った（または接続に失敗した）時点で呼ぶ"""
+        if self.breaker is not None and not self.finished:
+            duration = time.monotonic() - self.started
+            self.breaker.record(failed, duration)
+            metrics.UPSTREAM_DURATION.labels(
+                self.breaker.name, "error" if failed else "ok"
+            ).observe(duration)
+        self.finished = True
+
+
+@contextlib.asynccontextmanager
+async def admit(endpoint):
+    """
+    上流APIを呼び出してよいか確認し、同時実行枠を確保する（async with で使う）
+
+    回路が開いていればすぐに Unavailable を送出する。ブロックの中で
+    call.finish() を呼んで結果を記録する。記録せずに抜けた場合
+    （キャンセルなど）は結果なしとして扱う。endpoint が None なら何もしない。
+
+    :param endpoint: UPSTREAM_LIMITS のキー（"query" など）
+    :raises Unavailable: サーキットブレーカーが開いている場合
+    :raises Overloaded: 同時実行数の上限に達していて受け付けられなかった場合
+    """
+    if endpoint is None:
+        yield _Call(None)
+        return
+
+    endpoint_breaker = circuit.breaker(endpoint)
+    try:
+        endpoint_breaker.before_call()
+    except circuit.CircuitOpen as e:
+        metrics.UPSTREAM_REJECTED.labels(endpoint, "circuit_open").inc()
+        raise Unavailable(e.retry_after) from e
+
+    endpoint_limiter = admission.limiter(endpoint)
+    try:
+        with server_timing.phase("queue"):
+            await endpoint_limiter.acquire()
+    except BaseException as e:
+        endpoint_breaker.abandon()
+        if isinstance(e, admission.Rejected):
+            metrics.UPSTREAM_REJECTED.labels(endpoint, "overloaded").inc()
+            raise Overloaded(e.retry_after) from e
+        raise
+
+    in_flight = metrics.UPSTREAM_IN_FLIGHT.labels(endpoint)
+    in_flight.inc()
+    call = _Call(endpoint_breaker)
+    try:
+        yield call
+    finally:
+        in_flight.dec()
+        endpoint_limiter.release()
+        # 期限切れで打ち切った呼び出しは失敗として数え、それ以外の
+        # キャンセル（ヘッジで負けた側など）は結果なしとして扱う
+        if not call.finished and deadline.expired():
+            call.finish(failed=True)
+        elif not call.finished:
+            endpoint_breaker.abandon()
+
+
+@contextlib.asynccontextmanager
+async def within_deadline():
+    """
+    リクエストの期限（main.deadline）までにブロックを終わらせる（async with で使う）
+
+    :raises DeadlineExceeded: 期限を過ぎた場合
+    """
+    left = deadline.remaining()
+    if left is None:
+        yield
+        return
+    if left <= 0:
+        raise DeadlineExceeded()
+    try:
+        async with asyncio.timeout(left):
+            yield
+    except TimeoutError as e:
+        raise DeadlineExceeded() from e
+
+
+async def post(url, endpoint=None, **kwargs):
+    """
+    共有クライアントで POST リクエストを送信する
+
+    リクエストの期限が設定されていれば、その残り時間までしか待たない。
+    上流APIが UPSTREAM_HEDGE_ENDPOINTS に含まれていればヘッジする。
+
+    :param endpoint: 同時実行数の制限とサーキットブレーカーを適用する
+        上流APIの名前（UPSTREAM_LIMITS のキー）
+    :raises DeadlineExceeded: リクエストの期限を過ぎた場合
+    """
+    endpoint_policy = hedging.policy(endpoint)
+    async with within_deadline():
+        if endpoint_policy is None:
+            return await _attempt(url, endpoint, None, kwargs)
+        return await _hedged(url, endpoint, endpoint_policy, kwargs)
+
+
+async def _attempt(url, endpoint, endpoint_policy, kwargs):
+    """POST リクエストを1回送信する"""
+    trace = _PoolTrace()
+    async with admit(endpoint) as call:
+        try:
+            response = await get_client().post(
+                url, extensions={"trace": trace}, **kwargs
+            )
+        except httpx.HTTPError:
+            call.finish(failed=True)
+            trace.record(call.started, failed=True)
+            raise
+        call.finish(failed=response.status_code >= 500)
+        if endpoint_policy is not None and response.status_code < 500:
+            endpoint_policy.record(time.monotonic() - call.started)
+    trace.record(call.started)
+    return response
+
+
+async def _hedged(url, endpoint, endpoint_policy, kwargs):
+    """
+    POST リクエストを送信し、応答時間の p95 を過ぎても返らなければ
+    同じリクエストをもう1つ送って、先に成功した方を返す
+
+    同時実行枠が埋まっているとき、回路が閉じていないとき、
+    リトライ予算が残っていないときはヘッジしない。
+    """
+    delay = endpoint_policy.begin()
+    loop = asyncio.get_running_loop()
+    attempts = [loop.create_task(_attempt(url, endpoint, endpoint_policy, kwargs))]
+    try:
+        if delay is not None:
+            done, _ = await asyncio.wait(attempts, timeout=delay)
+            if (
+                not done
+                and not admission.limiter(endpoint).busy()
+                and circuit.breaker(endpoint).state == circuit.CLOSED
+                and endpoint_policy.try_hedge()
+            ):
+                attempts.append(
+                    loop.create_task(_attempt(url, endpoint, endpoint_policy, kwargs))
+                )
+
+        pending = set(attempts)
+        while True:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                if task.exception() is None:
+                    if task is not attempts[0]:
+                        endpoint_policy.count("hedge_wins")
+                    return task.result()
+            # 両方失敗したら、最初の呼び出しの例外を送出する
+            if not pending:
+                if attempts[0].exception() is not None:
+                    raise attempts[0].exception()
+                return attempts[0].result()
+    finally:
+        for task in attempts:
+            task.cancel()
+
+
+def pool_stats():
+    """コネクションプールのヒット/ミス回数を返す"""
+    total = _pool_stats["hits"] + _pool_stats["misses"]
+    return {
+        **_pool_stats,
+        "hit_ratio": _pool_stats["hits"] / total if total else None,
+        "pool_size": settings.UPSTREAM_POOL_SIZE,
+        "http2": settings.UPSTREAM_HTTP2,
+    }
+
+
+class UpstreamError(Exception):
+    """
+    上流APIの呼び出しに失敗したことを表す例外。メッセージはそのまま利用者に返す
+
+    headers は利用者へのレスポンスに付けるヘッダー（Retry-After など）。
+    """
+
+    # 結果キャッシュにエラーとして短期間保存してよいかどうか
+    cacheable = True
+
+    def __init__(self, message, status=500, headers=None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+
+class Overloaded(UpstreamError):
+    """上流APIの同時実行数の上限に達していて、リクエストを受け付けなかったことを表す例外"""
+
+    # 断っただけで上流APIの結果ではないため、キャッシュしない
+    cacheable = False
+
+    def __init__(self, retry_after):
+        super().__init__(
+            "アクセスが集中しています。しばらくしてから再度お試しください。",
+            status=503,
+            headers={"Retry-After": str(retry_after)},
+        )
+
+
+class DeadlineExceeded(UpstreamError):
+    """リクエストの期限までに上流APIの応答が返らなかったことを表す例外"""
+
+    # 待ちきれなかっただけで上流APIの結果ではないため、キャッシュしない
+    cacheable = False
+
+    def __init__(self):
+        super().__init__(
+            "APIの応答が時間内に返りませんでした。しばらくしてから再度お試しください。",
+            status=504,
+        )
+
+
+class Unavailable(UpstreamError):
+    """サーキットブレーカーが開いていて、上流APIを呼ばなかったことを表す例外"""
+
+    cacheable = False
+
+    def __init__(self, retry_after):
+        super().__init__(
+            "APIが一時的に利用できません。しばらくしてから再度お試しください。",
+            status=503,
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+        )
+
+
+async def post_json(url, payload, headers=None, endpoint=None):
+    """
+    JSON を POST し、レスポンスの JSON を返す
+
+    失敗した場合は利用者向けのメッセージを持つ UpstreamError を送出する。
+
+    :param endpoint: 同時実行数の制限とサーキットブレーカーを適用する
+        上流APIの名前（UPSTREAM_LIMITS のキー）
+    """
+    try:
+        response = await post(url, endpoint, json=payload, headers=headers)
+    except httpx.HTTPError as e:
+        raise UpstreamError(f"API接続エラー: {str(e)}") from e
+
+    # レスポンスのステータスコードを確認
+    if response.status_code != 200:
+        raise UpstreamError(f"APIエラー: ステータスコード {response.status_code}")
+
+    # JSONレスポンスをパース
+    try:
+        with server_timing.phase("decode"):
+            return response.json()
+    except json.JSONDecodeError as e:
+        raise UpstreamError("APIからの応答を解析できませんでした。") from e
+
+
+@contextlib.asynccontextmanager
+async def stream_json(url, payload, headers=None, endpoint=None):
+    """
+    JSON を POST し、本文を読み込む前のレスポンスを返す（async with で使う）
+
+    本文は response.aiter_lines() などで届いた分から読み出せる。
+    ブロックを抜けると、読み終わっていなくても上流APIとの接続を閉じる。
+    同時実行枠はブロックを抜けるまで確保したままにする。
+    失敗した場合は利用者向けのメッセージを持つ UpstreamError を送出する。
+
+    :param endpoint: 同時実行数の制限とサーキットブレーカーを適用する
+        上流APIの名前（UPSTREAM_LIMITS のキー）
+    """
+    async with admit(endpoint) as call:
+        trace = _PoolTrace()
+        request = get_client().build_request(
+            "POST", url, json=payload, headers=headers, extensions={"trace": trace}
+        )
+        try:
+            # 期限は応答が返り始めるまでに適用し、本文の受信には適用しない
+            async with within_deadline():
+                response = await get_client().send(request, stream=True)
+        except httpx.HTTPError as e:
+            call.finish(failed=True)
+            trace.record(call.started, failed=True)
+            raise UpstreamError(f"API接続エラー: {str(e)}") from e
+        call.finish(failed=response.status_code >= 500)
+        trace.record(call.started)
+
+        try:
+            if response.status_code != 200:
+                raise UpstreamError(
+                    f"APIエラー: ステータスコード {response.status_code}"
+                )
+            try:
+                yield response
+            except httpx.HTTPError as e:
+                raise UpstreamError(f"API接続エラー: {str(e)}") from e
+        finally:
+            await response.aclose()
@@ -1,6 +1,8 @@
 from django.contrib import admin
 from django.urls import path, include
 
+from . import views
+
 urlpatterns = [
     path("read_images/", include("read_images.urls")),
     path("emoji_finder/", include("emoji_finder.urls")),
@@ -13,4 +15,8 @@ urlpatterns = [
     path("keizokuryoku/", include("keizokuryoku.urls")),
     path("facemesh/", include("facemesh.urls")),
     path("admin/", admin.site.urls),
+    path("status/", views.status, name="status"),
+    path("status/cache/clear/", views.clear_cache, name="clear_cache"),
+    path("metrics", views.metrics_view, name="metrics"),
+    path("readyz/", views.readyz, name="readyz"),
 ]
@@ -0,0 +1,87 @@
+import hmac
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import HttpResponse, JsonResponse
+from django.views.decorators.http import require_POST
+
+from accounts import backends
+from main import (
+    admission,
+    circuit,
+    db_pool,
+    hedging,
+    metrics,
+    prerender,
+    query_cache,
+    realtime_sessions,
+    upstream,
+    warmup,
+)
+from read_images import prefetch
+
+
+@staff_member_required
+def status(request):
+    """
+    上流APIクライアントと同時実行数の制限・サーキットブレーカー・ヘッジ・
+    検索キャッシュ・回答の先読み・セッショントークンのプール・
+    認証のキャッシュ・データベースのコネクションプール・描画済みのページの
+    稼働状況と起動時のウォームアップの所要時間をJSONで返す。
+    管理者のみアクセス可能。
+    値はリクエストを処理したワーカープロセス単位の集計。
+    """
+    return JsonResponse(
+        {
+            "upstream_pool": upstream.pool_stats(),
+            "upstream_limits": admission.stats(),
+            "circuits": circuit.stats(),
+            "hedging": hedging.stats(),
+            "query_cache": query_cache.cache.stats(),
+            "answer_prefetch": prefetch.answers.stats(),
+            "realtime_tokens": realtime_sessions.stats(),
+            "auth_cache": backends.users.stats(),
+            "db_pool": db_pool.stats(),
+            "prerendered_pages": prerender.stats(),
+            "warmup": warmup.stats(),
+        }
+    )
+
+
+async def readyz(request):
+    """
+    ワーカーの準備（main.warmup）が整っていれば 200、整っていなければ 503 を返す。
+    ロードバランサーのヘルスチェック用で、ログインは不要。
+    """
+    if await warmup.ensure_ready():
+        return JsonResponse({"ready": True})
+    return JsonResponse({"ready": False}, status=503)
+
+
+@staff_member_required
+@require_POST
+def clear_cache(request):
+    """
+    検索結果キャッシュを全ワーカーで破棄する。管理者のみアクセス可能。
+    """
+    return JsonResponse({"cleared": query_cache.cache.clear()})
+
+
+def metrics_view(request):
+    """
+    Prometheus 形式のメトリクスを返す（全ワーカーの合計）
+
+    METRICS_TOKEN を Bearer トークンとして送るか、管理者としてログインしている
+    必要がある。
+    """
+    token = settings.METRICS_TOKEN
+    authorization = request.headers.get("Authorization", "")
+    authorized = bool(token) and hmac.compare_digest(
+        authorization.encode(), f"Bearer {token}".encode()
+    )
+    if not authorized and not (request.user.is_active and request.user.is_staff):
+        return HttpResponse(
+            status=401, headers={"WWW-Authenticate": 'Bearer realm="metrics"'}
+        )
+    body, content_type = metrics.render()
+    return HttpResponse(body, content_type=content_type)
@@ -0,0 +1,208 @@
+"""
+ワーカーの起動時のウォームアップ
+
+再起動直後の最初のリクエストは、URL 設定やテンプレート・検索インデックスの
+読み込み、データベースと上流APIへの接続をすべてその場で行うため遅くなる。
+ワーカーがリクエストを受け付ける前にこれらを済ませておく。
+
+- prepare(): URL 設定・テンプレート・検索インデックス・クリティカル CSS・
+  描画済みのページ・データベース接続
+  （gunicorn の post_worker_init から呼ぶ）
+- connect_upstream(): 上流APIへの接続。クライアントはイベントループごとに
+  作られるため、ASGI の lifespan の開始時にイベントループ上で呼ぶ
+
+準備が整うまで /readyz/ は 503 を返す。手順ごとの所要時間と、
+プロセスの起動から準備が整うまでの時間は /status/ の "warmup" で確認できる。
+"""
+
+import asyncio
+import logging
+import threading
+import time
+import weakref
+from urllib.parse import urlsplit
+
+import httpx
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.template.loader import get_template
+from django.urls import get_resolver
+
+from emoji_finder import search_index as emoji_index
+from keizokuryoku import search_index as keizokuryoku_index
+from main import prerender, stylesheets, upstream
+
+logger = logging.getLogger(__name__)
+
+# プロセスの起動（このモジュールの読み込み）から準備が整うまでの時間を測る
+_started = time.monotonic()
+
+_lock = threading.Lock()
+_prepared = False
+_error = None
+_steps = {}
+_ready_seconds = None
+
+# ASGI で動いているか（lifespan() で包まれたか）。WSGI ではリクエストごとに
+# イベントループが変わるため、上流APIへの接続は準備しない
+_asgi = False
+# 上流APIへの接続を済ませたイベントループ
+_connected_loops = weakref.WeakSet()
+
+
+def _database():
+    for alias in connections:
+        connection = connections[alias]
+        connection.ensure_connection()
+        pool = getattr(connection, "pool", None)
+        if pool is not None:
+            # プールの下限（DB_POOL_MIN_SIZE）まで接続を張り終えるのを待つ
+            pool.wait(timeout=pool.timeout)
+        # プールを使う場合は接続をプールに返す
+        connection.close()
+
+
+STEPS = [
+    ("urls", lambda: get_resolver().url_patterns),
+    ("templates", lambda: [get_template(name) for name in settings.WARMUP_TEMPLATES]),
+    ("search_indexes", lambda: [emoji_index.load(), keizokuryoku_index.load()]),
+    ("stylesheets", lambda: [stylesheets.critical(app) for app in stylesheets.APPS]),
+    ("pages", prerender.prepare),
+    ("database", _database),
+]
+
+
+def prepare():
+    """
+    URL 設定・テンプレート・検索インデックス・クリティカル CSS・
+    描画済みのページ・データベース接続を準備する
+
+    失敗した場合は次に呼ばれたときにやり直し、成功したあとは何もしない。
+
+    :return: 準備が整ったかどうか
+    """
+    global _prepared, _error
+    with _lock:
+        if _prepared:
+            return True
+        for name, step in STEPS:
+            started = time.monotonic()
+            try:
+                step()
+            except Exception as e:
+                logger.exception("Warm-up step %s failed", name)
+                _error = f"{name}: {e}"
+                return False
+            finally:
+                _steps[name] = time.monotonic() - started
+        _prepared = True
+        _error = None
+    _mark_ready()
+    return True
+
+
+def _origins():
+    """接続しておく上流APIのオリジン（API_HOST と OpenAI）"""
+    origins = []
+    for url in (settings.API_HOST, settings.OPENAI_REALTIME_SESSIONS_URL):
+        parts = urlsplit(url)
+        if parts.scheme and parts.netloc:
+            origin = f"{parts.scheme}://{parts.netloc}"
+            if origin not in origins:
+                origins.append(origin)
+    return origins
+
+
+async def _connect(client, origin):
+    try:
+        # 応答は使わない。接続（TCP と TLS）をプールに残すために送る
+        await client.head(origin, timeout=settings.WARMUP_UPSTREAM_TIMEOUT)
+    except httpx.HTTPError as e:
+        logger.warning("Warm-up connection to %s failed: %s", origin, e)
+
+
+async def connect_upstream():
+    """
+    実行中のイベントループの共有 AsyncClient で、上流APIへの接続を張っておく
+
+    上流APIにつながらなくても失敗にはしない（上流APIを使わないページは表示できる）。
+    """
+    loop = asyncio.get_running_loop()
+    if loop in _connected_loops:
+        return
+    started = time.monotonic()
+    client = upstream.get_client()
+    await asyncio.gather(
+        *(
+            _connect(client, origin)
+            for origin in _origins()
+            for _ in range(settings.WARMUP_UPSTREAM_CONNECTIONS)
+        )
+    )
+    _steps["upstream"] = time.monotonic() - started
+    _connected_loops.add(loop)
+    _mark_ready()
+
+
+def is_ready():
+    """このワーカーの準備が整っているかどうか"""
+    if not _prepared:
+        return False
+    if not _asgi:
+        return True
+    try:
+        return asyncio.get_running_loop() in _connected_loops
+    except RuntimeError:
+        return bool(_connected_loops)
+
+
+def _mark_ready():
+    global _ready_seconds
+    if _ready_seconds is None and is_ready():
+        _ready_seconds = time.monotonic() - _started
+        logger.info("Worker ready in %.2fs", _ready_seconds)
+
+
+async def ensure_ready():
+    """準備がまだなら行い、準備が整ったかどうかを返す"""
+    if not _prepared:
+        await sync_to_async(prepare, thread_sensitive=False)()
+    if _asgi:
+        await connect_upstream()
+    return is_ready()
+
+
+def lifespan(application):
+    """
+    ASGI アプリケーションを包み、lifespan の開始時にウォームアップを行う
+
+    Django の ASGIHandler は lifespan に対応していないため、ここで応答する。
+    uvicorn は lifespan の開始が終わるまでリクエストを受け付けない。
+    """
+    global _asgi
+    _asgi = True
+
+    async def app(scope, receive, send):
+        if scope["type"] != "lifespan":
+            return await application(scope, receive, send)
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await ensure_ready()
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    return app
+
+
+def stats():
+    """準備が整ったか、手順ごとの所要時間、起動から準備が整うまでの時間を返す"""
+    return {
+        "ready": is_ready(),
+        "ready_seconds": _ready_seconds,
+        "steps": dict(_steps),
+        "error": _error,
+    }
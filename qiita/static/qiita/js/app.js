@@ -5,6 +5,7 @@ document.addEventListener('DOMContentLoaded', function() {
   // DOM要素
   const searchInput = document.getElementById('search-query');
   const searchButton = document.getElementById('search-button');
+  const searchSuggestions = document.getElementById('search-suggestions');
   const errorMessage = document.getElementById('error-message');
   const errorText = document.getElementById('error-text');
   const loadingIndicator = document.getElementById('loading-indicator');
@@ -13,14 +14,26 @@ document.addEventListener('DOMContentLoaded', function() {
   const resultsCount = document.getElementById('results-count');
   const articleResults = document.getElementById('article-results');
   const noResults = document.getElementById('no-results');
+  const loadMoreContainer = document.getElementById('load-more-container');
+  const loadMoreButton = document.getElementById('load-more-button');
 
   // 検索結果を保存する変数
   let currentSearchResults = [];
   let currentQuery = '';
 
+  // 次ページのカーソルと、先読み中の次ページ
+  let nextCursor = null;
+  let prefetchedPage = null;
+
+  // 取得中の入力候補のリクエスト（次の入力で取り消す）
+  let suggestController = null;
+
   // 検索ボタンのイベントリスナー
   searchButton.addEventListener('click', performSearch);
 
+  // 続きを読み込むボタンのイベントリスナー
+  loadMoreButton.addEventListener('click', loadMore);
+
   // Enter キーでも検索できるようにする
   searchInput.addEventListener('keypress', function(e) {
     if (e.key === 'Enter') {
@@ -28,6 +41,45 @@ document.addEventListener('DOMContentLoaded', function() {
     }
   });
 
+  // 入力のたびに過去の検索キーワードから候補を表示する
+  searchInput.addEventListener('input', updateSuggestions);
+
+  /**
+   * 入力中の文字列で始まる過去の検索キーワードを候補に表示する
+   */
+  function updateSuggestions() {
+    const prefix = searchInput.value.trim();
+
+    // 前の候補の取得が終わっていなければ取り消す
+    if (suggestController) {
+      suggestController.abort();
+    }
+    if (!prefix) {
+      searchSuggestions.innerHTML = '';
+      return;
+    }
+
+    suggestController = new AbortController();
+    fetch(`/qiita/suggest/?prefix=${encodeURIComponent(prefix)}`, {
+      headers: {
+        'X-Requested-With': 'XMLHttpRequest'
+      },
+      signal: suggestController.signal
+    })
+    .then(response => response.ok ? response.json() : { suggestions: [] })
+    .then(data => {
+      searchSuggestions.innerHTML = '';
+      data.suggestions.forEach(suggestion => {
+        const option = document.createElement('option');
+        option.value = suggestion;
+        searchSuggestions.appendChild(option);
+      });
+    })
+    .catch(() => {
+      // 候補が出せなくても検索はできるため、エラーは表示しない
+    });
+  }
+
   /**
    * 検索を実行する
    */
@@ -44,11 +96,42 @@ document.addEventListener('DOMContentLoaded', function() {
     resetUI();
     setSearchingState(true);
     
+    // 検索リクエスト（先頭ページ）
+    fetchPage(query, null)
+    .then(data => {
+      // 検索結果をグローバル変数に保存
+      currentSearchResults = data.articles || [];
+      currentQuery = data.query || query;
+      
+      // 検索結果を表示
+      displayResults(data);
+      updateLoadMore(data);
+    })
+    .catch(error => {
+      showError(`検索中にエラーが発生しました: ${error.message}`);
+    })
+    .finally(() => {
+      // 検索中状態を解除
+      setSearchingState(false);
+    });
+  }
+
+  /**
+   * 検索結果の1ページを取得する
+   * @param {string} query - 検索クエリ
+   * @param {string|null} cursor - ページのカーソル（先頭ページは null）
+   * @returns {Promise<Object>} - APIからのレスポンスデータ
+   */
+  function fetchPage(query, cursor) {
     // CSRF トークンを取得
     const csrfToken = getCookie('csrftoken');
-    
-    // 検索リクエスト
-    fetch(`/qiita/query/?query=${encodeURIComponent(query)}`, {
+
+    const params = new URLSearchParams({ query: query });
+    if (cursor) {
+      params.append('cursor', cursor);
+    }
+
+    return fetch(`/qiita/query/?${params.toString()}`, {
       method: 'GET',
       headers: {
         'X-Requested-With': 'XMLHttpRequest',
@@ -62,21 +145,59 @@ document.addEventListener('DOMContentLoaded', function() {
         });
       }
       return response.json();
-    })
+    });
+  }
+
+  /**
+   * 次ページの有無に応じてボタンを切り替え、次ページを先読みする
+   * @param {Object} data - APIからのレスポンスデータ
+   */
+  function updateLoadMore(data) {
+    nextCursor = data.next_cursor || null;
+    if (!nextCursor) {
+      prefetchedPage = null;
+      loadMoreContainer.classList.add('hidden');
+      return;
+    }
+
+    // 現在のページを読んでいる間に次のページを取得しておく
+    const cursor = nextCursor;
+    prefetchedPage = {
+      cursor: cursor,
+      promise: fetchPage(currentQuery, cursor)
+    };
+    // 先読みの失敗はボタンを押したときに再取得するので、ここでは無視する
+    prefetchedPage.promise.catch(() => {});
+    loadMoreContainer.classList.remove('hidden');
+  }
+
+  /**
+   * 次のページを読み込んで結果の末尾に追加する
+   */
+  function loadMore() {
+    if (!nextCursor) return;
+
+    loadMoreButton.disabled = true;
+    const cursor = nextCursor;
+    const pending = prefetchedPage && prefetchedPage.cursor === cursor
+      ? prefetchedPage.promise.catch(() => fetchPage(currentQuery, cursor))
+      : fetchPage(currentQuery, cursor);
+
+    pending
     .then(data => {
-      // 検索結果をグローバル変数に保存
-      currentSearchResults = data.articles || [];
-      currentQuery = data.query || query;
-      
-      // 検索結果を表示
-      displayResults(data);
+      // 読み込み中に別の検索が始まっていれば破棄する
+      if (data.query !== currentQuery) return;
+
+      const articles = data.articles || [];
+      currentSearchResults = currentSearchResults.concat(articles);
+      appendArticles(articles);
+      updateLoadMore(data);
     })
     .catch(error => {
       showError(`検索中にエラーが発生しました: ${error.message}`);
     })
     .finally(() => {
-      // 検索中状態を解除
-      setSearchingState(false);
+      loadMoreButton.disabled = false;
     });
   }
 
@@ -130,13 +251,21 @@ document.addEventListener('DOMContentLoaded', function() {
     }
     
     // 結果の件数を表示
-    resultsCount.innerHTML = `<p>${data.articles.length}件の記事が見つかりました</p>`;
+    resultsCount.innerHTML = `<p>${data.total || data.articles.length}件の記事が見つかりました</p>`;
     
     // 記事結果をクリア
     articleResults.innerHTML = '';
     
+    appendArticles(data.articles);
+  }
+
+  /**
+   * 記事のカードを結果の末尾に追加する
+   * @param {Array} articles - 記事の配列
+   */
+  function appendArticles(articles) {
     // 各記事のカードを作成
-    data.articles.forEach((article, index) => {
+    articles.forEach((article, index) => {
       const metadata = article.metadata;
       
       // 記事カードを作成
@@ -215,6 +344,9 @@ document.addEventListener('DOMContentLoaded', function() {
     errorMessage.classList.add('hidden');
     resultsContainer.classList.add('hidden');
     noResults.classList.add('hidden');
+    loadMoreContainer.classList.add('hidden');
+    nextCursor = null;
+    prefetchedPage = null;
   }
 
   /**
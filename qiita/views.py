@@ -1,14 +1,34 @@
 from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
-import requests
-import dotenv
-import os
 import json
-from django.http import JsonResponse, HttpResponseServerError
+from django.http import HttpResponseServerError
+from django.conf import settings
+from main import (
+    batch_search,
+    pagination,
+    query_cache,
+    server_timing,
+    suggestions,
+    upstream,
+)
+from main.prerender import prerendered
+from main.server_timing import JsonResponse
 
-dotenv.load_dotenv()
+# 記事カードの表示に使うフィールドのみ返す
+ARTICLE_FIELDS = {
+    "similarity": True,
+    "metadata": {
+        "url": True,
+        "title": True,
+        "created_at": True,
+        "tags": {"name": True},
+        "likes_count": True,
+        "page_views_count": True,
+    },
+}
 
 
+@prerendered("qiita/index.html")
 def index(request):
     """
     メインページを表示する
@@ -16,11 +36,43 @@ def index(request):
     return render(request, "qiita/index.html")
 
 
-def query(request):
+async def search(search_query):
+    """
+    Qiita記事を検索し、表示に必要なフィールドだけに絞った全件を返す
+
+    結果はキャッシュし、同じ検索ではAPIに問い合わせない。
+
+    :param search_query: 検索キーワード
+    :return: 記事の配列
+    """
+    api_url = settings.UPSTREAM_URLS["qiita"]
+    headers = {
+        "Content-Type": "application/json",
+        "api-key": settings.API_KEY,
+    }
+    payload = {
+        "query": search_query,
+    }
+
+    async def fetch():
+        # APIリクエストの実行（共有コネクションプールを使い非同期で送信）
+        data = await upstream.post_json(api_url, payload, headers, endpoint="qiita")
+        with server_timing.phase("decode"):
+            return pagination.project(data, ARTICLE_FIELDS)
+
+    return await query_cache.cache.get_or_fetch("qiita", search_query, fetch)
+
+
+async def query(request):
     """
     Qiita記事検索APIにクエリを送信し、結果をJSONで返す
     GETメソッドに対応
 
+    パラメータ:
+        query: 検索キーワード
+        limit: 1ページの件数（デフォルト: 20、最大: 100）
+        cursor: 前のレスポンスの next_cursor。省略すると先頭ページ
+
     :param request: HTTPリクエスト
     :return: JSON形式のレスポンス
     """
@@ -36,45 +88,72 @@ def query(request):
     if not search_query:
         return JsonResponse({"error": "検索キーワードを入力してください。"}, status=400)
 
+    # ページネーションのパラメータを取得
+    try:
+        offset = pagination.decode_cursor(request.GET.get("cursor", ""))
+        limit = pagination.parse_limit(request.GET.get("limit", ""))
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
     response_data = {
         "query": search_query,
         "articles": [],
+        "next_cursor": None,
+        "total": 0,
         "error": None,
     }
 
     try:
-        api_url = f"{os.getenv('API_HOST')}{os.getenv('QIITA_ENDPOINT')}"
-        headers = {
-            "Content-Type": "application/json",
-            "api-key": os.getenv("API_KEY"),
-        }
-        payload = {
-            "query": search_query,
-        }
-
-        # APIリクエストの実行
-        response = requests.post(api_url, json=payload, headers=headers)
-
-        # レスポンスのステータスコードを確認
-        if response.status_code != 200:
-            response_data["error"] = (
-                f"APIエラー: ステータスコード {response.status_code}"
-            )
-            return JsonResponse(response_data, status=500)
-
-        # JSONレスポンスをパース
-        try:
-            data = response.json()
-            response_data["articles"] = data
-        except json.JSONDecodeError:
-            response_data["error"] = "APIからの応答を解析できませんでした。"
-            return JsonResponse(response_data, status=500)
-
-    except requests.RequestException as e:
-        response_data["error"] = f"API接続エラー: {str(e)}"
-        return JsonResponse(response_data, status=500)
+        results = await search(search_query)
+        response_data["articles"], response_data["next_cursor"] = pagination.paginate(
+            results, offset, limit
+        )
+        response_data["total"] = len(results)
+        # 先頭ページで結果が得られた検索キーワードを入力候補に記録する
+        if results and offset == 0:
+            await suggestions.record("qiita", search_query, request)
+    except upstream.UpstreamError as e:
+        response_data["error"] = str(e)
+        return JsonResponse(response_data, status=e.status, headers=e.headers)
     except Exception as e:
         response_data["error"] = f"予期しないエラーが発生しました: {str(e)}"
         return JsonResponse(response_data, status=500)
 
     return JsonResponse(response_data)
+
+
+@login_required
+async def batch(request):
+    """
+    複数の検索キーワードをまとめて検索し、検索キーワードごとの結果をJSONで返す
+    POSTメソッド（JSON）に対応
+
+    リクエスト:
+        queries: 検索キーワードの配列
+        limit: 1件あたりの件数（省略時: 20、最大: 100）。続きは query の cursor で取得する
+
+    各結果は query と同じ形式で、失敗した場合は error と status を持つ。
+
+    ログインしたユーザーのみ利用でき、CSRF トークンが必要。
+
+    :param request: HTTPリクエスト
+    :return: JSON形式のレスポンス
+    """
+    return await batch_search.respond(request, search, "articles")
+
+
+async def suggest(request):
+    """
+    過去に結果が得られた検索キーワードから入力候補を返す
+    GETメソッドに対応
+
+    パラメータ:
+        prefix: 入力中の文字列（ひらがな・カタカナ、全角・半角を区別しない）
+
+    :param request: HTTPリクエスト
+    :return: JSON形式のレスポンス
+    """
+    prefix = request.GET.get("prefix", "")
+    return JsonResponse(
+        {"prefix": prefix, "suggestions": suggestions.suggest("qiita", prefix)}
+    )
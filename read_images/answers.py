@@ -0,0 +1,80 @@
+"""
+AI回答APIのレスポンスから回答のテキストを取り出す
+"""
+
+import json
+
+from main import sse
+from main.upstream import UpstreamError
+
+
+def answer_text(answer):
+    """
+    回答APIの JSON から回答のテキストを取り出す
+
+    Claude API 形式（content 配列）と従来の形式（response / answer）に対応し、
+    どちらでもなければ JSON を文字列化して返す。
+    """
+    if isinstance(answer, str):
+        return answer
+    if not isinstance(answer, dict):
+        return json.dumps(answer, ensure_ascii=False, indent=2)
+    if isinstance(answer.get("content"), list):
+        return "\n\n".join(
+            item["text"] for item in answer["content"] if item.get("type") == "text"
+        )
+    if answer.get("response"):
+        return answer["response"]
+    if answer.get("answer"):
+        return answer["answer"]
+    return json.dumps(answer, ensure_ascii=False, indent=2)
+
+
+def delta_text(event):
+    """
+    ストリーミングのイベントから回答の断片を取り出す。テキストを含まなければ None
+
+    Claude API（content_block_delta）と OpenAI（choices[].delta.content）の形式、
+    および {"text": ...} に対応する。
+    """
+    if not isinstance(event, dict):
+        return None
+    delta = event.get("delta")
+    if isinstance(delta, dict) and isinstance(delta.get("text"), str):
+        return delta["text"]
+    choices = event.get("choices")
+    if isinstance(choices, list) and choices:
+        content = (choices[0].get("delta") or {}).get("content")
+        if isinstance(content, str):
+            return content
+    text = event.get("text")
+    return text if isinstance(text, str) else None
+
+
+async def iter_answer_text(response):
+    """
+    回答APIのレスポンスから、届いた順に回答の断片を返す
+
+    - text/event-stream: 各イベントの断片
+    - application/json: ストリーミングに対応していない API の回答全体
+    - それ以外: 届いたテキストをそのまま
+    """
+    content_type = response.headers.get("content-type", "")
+    if content_type.startswith("text/event-stream"):
+        async for data in sse.iter_data(response):
+            try:
+                text = delta_text(json.loads(data))
+            except json.JSONDecodeError:
+                text = data
+            if text:
+                yield text
+    elif content_type.startswith("application/json"):
+        try:
+            answer = json.loads(await response.aread())
+        except json.JSONDecodeError as e:
+            raise UpstreamError("APIからの応答を解析できませんでした。") from e
+        yield answer_text(answer)
+    else:
+        async for chunk in response.aiter_text():
+            if chunk:
+                yield chunk
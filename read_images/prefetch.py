@@ -0,0 +1,234 @@
+"""
+AIの回答の先読み（投機的実行）
+
+画像検索のあとには、ほぼ必ず同じ検索キーワードと上位の画像URLで
+回答の取得が続く。検索結果を返した時点で回答の生成を裏で始めておき、
+短い期間だけ保持する。回答のリクエストが届いたら、生成済みの結果を返すか、
+生成中のタスクに合流する。
+
+回答のリクエストは検索とは別のワーカーに届くことが多いため、生成中の印と
+生成した回答はワーカー間で共有するキャッシュ（CACHES["prefetch"]）に置く。
+同じワーカーに届いた場合は生成中のタスクを直接待ち、別のワーカーに
+届いた場合は共有キャッシュに回答が置かれるまで待つ。
+
+使われずに期限切れになった先読みは上流APIの呼び出しの無駄になるため、
+一定時間内の無駄な呼び出しの回数に上限（予算）を設け、
+上限に達している間は先読みをしない。無駄になった回数は共有ディレクトリに
+記録し、全ワーカーの合計を予算と比べる。
+"""
+
+import asyncio
+import contextvars
+import hashlib
+import json
+import os
+import time
+import uuid
+from collections import Counter, namedtuple
+from pathlib import Path
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+
+from main import metrics, upstream
+from main.query_cache import MISS, normalize_query
+
+Speculation = namedtuple("Speculation", ["key", "expires", "task"])
+
+# 別のワーカーが生成中の回答を待つときに、共有キャッシュを確かめる間隔（秒）
+POLL_INTERVAL = 0.1
+
+
+class WasteBudget:
+    """
+    無駄になった先読みの回数を全ワーカーで数える
+
+    無駄になるたびに共有ディレクトリに空のファイルを作り、
+    更新時刻が window 秒以内のファイルの数を回数とする。
+    """
+
+    def __init__(self, directory, window):
+        self.directory = Path(directory)
+        self.window = window
+
+    def record(self):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        (self.directory / f"{time.time_ns()}-{uuid.uuid4().hex}").touch()
+
+    def count(self):
+        """window 秒以内に無駄になった回数を返す（古い記録は削除する）"""
+        cutoff = time.time() - self.window
+        count = 0
+        try:
+            entries = list(os.scandir(self.directory))
+        except FileNotFoundError:
+            return 0
+        for entry in entries:
+            try:
+                if entry.stat().st_mtime > cutoff:
+                    count += 1
+                else:
+                    os.unlink(entry.path)
+            except FileNotFoundError:
+                # 他のワーカーが同時に削除した
+                pass
+        return count
+
+
+class AnswerPrefetcher:
+    def __init__(self, ttl, waste_budget, budget_window, cache_alias="prefetch"):
+        self.ttl = ttl
+        self.waste_budget = waste_budget
+        self.cache_alias = cache_alias
+        self.budget = WasteBudget(
+            Path(settings.SHARED_STATE_DIR) / "prefetch_wasted", budget_window
+        )
+        # このワーカーで始めた先読み
+        self._entries = {}
+        self._stats = Counter()
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    @staticmethod
+    def _key(query, urls):
+        digest = hashlib.sha256(
+            json.dumps([normalize_query(query), list(urls)]).encode()
+        ).hexdigest()
+        return f"answer_prefetch:{digest}"
+
+    def _count(self, name):
+        self._stats[name] += 1
+        metrics.ANSWER_PREFETCH.labels(name).inc()
+
+    async def _expire(self):
+        """
+        このワーカーで始めた先読みのうち期限切れのものを破棄する
+
+        回答が共有キャッシュに残っていれば（どのワーカーにも使われなければ）
+        無駄になった回数として記録する。
+        """
+        now = time.monotonic()
+        for key, entry in list(self._entries.items()):
+            if entry.expires > now:
+                continue
+            del self._entries[key]
+            entry.task.cancel()
+            unused = not entry.task.done() or await self.cache.ahas_key(key)
+            await self.cache.adelete_many([key, f"{key}:pending"])
+            if unused:
+                await sync_to_async(self.budget.record, thread_sensitive=False)()
+                self._count("wasted")
+
+    async def start(self, query, urls, fetch):
+        """
+        回答の生成をバックグラウンドで開始する
+
+        いずれかのワーカーに同じ検索キーワード・画像URLの先読みがすでにある場合と、
+        全ワーカーで無駄になった先読みが予算に達している場合は何もしない。
+
+        :param fetch: 回答を取得するコルーチン関数
+        """
+        await self._expire()
+        key = self._key(query, urls)
+        if key in self._entries:
+            return
+        wasted = await sync_to_async(self.budget.count, thread_sensitive=False)()
+        if wasted >= self.waste_budget:
+            self._count("skipped_budget")
+            return
+        # 生成中の印を置けたワーカーだけが先読みする
+        if not await self.cache.aadd(f"{key}:pending", os.getpid(), self.ttl):
+            return
+        # 検索リクエストの期限や計測は引き継がず、回答のリクエストが来るまで生成を続ける
+        task = asyncio.get_running_loop().create_task(
+            self._run(key, fetch), context=contextvars.Context()
+        )
+        task.add_done_callback(self._retrieve_exception)
+        self._entries[key] = Speculation(key, time.monotonic() + self.ttl, task)
+        self._count("started")
+
+    async def _run(self, key, fetch):
+        """回答を生成し、他のワーカーが使えるよう共有キャッシュに置く"""
+        try:
+            answer = await fetch()
+        except Exception:
+            # 待っているワーカーには改めて取得させる
+            await self.cache.adelete(f"{key}:pending")
+            raise
+        await self.cache.aset(key, answer, self.ttl)
+        return answer
+
+    @staticmethod
+    def _retrieve_exception(task):
+        # 誰にも待たれずに失敗した場合に未取得の例外として警告されないよう取得しておく
+        if not task.cancelled():
+            task.exception()
+
+    async def take(self, query, urls):
+        """
+        先読みした回答を返す。なければ MISS
+
+        生成中であれば完了を待つ（別のワーカーで生成中の場合は、リクエストの
+        期限まで共有キャッシュを確かめ続ける）。先読みが失敗していた場合も
+        MISS を返し、呼び出し元で改めて取得させる。先読みした回答は1回だけ使う。
+        """
+        await self._expire()
+        key = self._key(query, urls)
+        entry = self._entries.pop(key, None)
+        # 別のイベントループで実行中のタスクは待てないため、共有キャッシュを使う
+        if entry is not None and entry.task.get_loop() is asyncio.get_running_loop():
+            return await self._join(entry)
+
+        waited = False
+        async with upstream.within_deadline():
+            while True:
+                answer = await self.cache.aget(key, MISS)
+                if answer is not MISS:
+                    await self.cache.adelete_many([key, f"{key}:pending"])
+                    self._count("joined" if waited else "hits")
+                    return answer
+                if not await self.cache.ahas_key(f"{key}:pending"):
+                    if waited:
+                        self._count("failed")
+                    return MISS
+                waited = True
+                await asyncio.sleep(POLL_INTERVAL)
+
+    async def _join(self, entry):
+        """このワーカーで生成中（または生成済み）の先読みの回答を返す"""
+        self._count("joined" if not entry.task.done() else "hits")
+        try:
+            answer = await asyncio.shield(entry.task)
+        except asyncio.CancelledError:
+            if entry.task.cancelled():
+                self._count("failed")
+                return MISS
+            raise
+        except Exception:
+            self._count("failed")
+            return MISS
+        await self.cache.adelete_many([entry.key, f"{entry.key}:pending"])
+        return answer
+
+    def stats(self):
+        """
+        先読みの開始・利用・無駄になった回数（このワーカー）と、
+        予算の消費状況（全ワーカー）を返す
+        """
+        names = ("started", "hits", "joined", "failed", "wasted", "skipped_budget")
+        return {
+            **{name: self._stats[name] for name in names},
+            "pending": len(self._entries),
+            "wasted_in_window": self.budget.count(),
+            "waste_budget": self.waste_budget,
+        }
+
+
+answers = AnswerPrefetcher(
+    settings.READ_IMAGES_PREFETCH_TTL,
+    settings.READ_IMAGES_PREFETCH_WASTE_BUDGET,
+    settings.READ_IMAGES_PREFETCH_BUDGET_WINDOW,
+)
@@ -5,6 +5,7 @@ document.addEventListener('DOMContentLoaded', function() {
   // DOM要素
   const searchInput = document.getElementById('search-query');
   const searchButton = document.getElementById('search-button');
+  const searchSuggestions = document.getElementById('search-suggestions');
   const errorMessage = document.getElementById('error-message');
   const errorText = document.getElementById('error-text');
   const loadingIndicator = document.getElementById('loading-indicator');
@@ -30,6 +31,11 @@ document.addEventListener('DOMContentLoaded', function() {
   // 検索結果を保存する変数
   let currentSearchResults = [];
   let currentQuery = '';
+  // AIの回答に使う上位の画像URL
+  let currentAnswerUrls = [];
+
+  // 取得中の入力候補のリクエスト（次の入力で取り消す）
+  let suggestController = null;
 
   // 検索ボタンのイベントリスナー
   searchButton.addEventListener('click', performSearch);
@@ -44,6 +50,9 @@ document.addEventListener('DOMContentLoaded', function() {
     }
   });
 
+  // 入力のたびに過去の検索キーワードから候補を表示する
+  searchInput.addEventListener('input', updateSuggestions);
+
   // モーダルを閉じるボタンのイベントリスナー
   closeButton.addEventListener('click', closeModal);
 
@@ -61,6 +70,42 @@ document.addEventListener('DOMContentLoaded', function() {
     }
   });
 
+  /**
+   * 入力中の文字列で始まる過去の検索キーワードを候補に表示する
+   */
+  function updateSuggestions() {
+    const prefix = searchInput.value.trim();
+
+    // 前の候補の取得が終わっていなければ取り消す
+    if (suggestController) {
+      suggestController.abort();
+    }
+    if (!prefix) {
+      searchSuggestions.innerHTML = '';
+      return;
+    }
+
+    suggestController = new AbortController();
+    fetch(`/read_images/suggest/?prefix=${encodeURIComponent(prefix)}`, {
+      headers: {
+        'X-Requested-With': 'XMLHttpRequest'
+      },
+      signal: suggestController.signal
+    })
+    .then(response => response.ok ? response.json() : { suggestions: [] })
+    .then(data => {
+      searchSuggestions.innerHTML = '';
+      data.suggestions.forEach(suggestion => {
+        const option = document.createElement('option');
+        option.value = suggestion;
+        searchSuggestions.appendChild(option);
+      });
+    })
+    .catch(() => {
+      // 候補が出せなくても検索はできるため、エラーは表示しない
+    });
+  }
+
   /**
    * 検索を実行する
    */
@@ -100,6 +145,7 @@ document.addEventListener('DOMContentLoaded', function() {
       // 検索結果をグローバル変数に保存
       currentSearchResults = data.images || [];
       currentQuery = data.query || query;
+      currentAnswerUrls = data.answer_urls || [];
       
       // 検索結果を表示
       displayResults(data);
@@ -131,8 +177,8 @@ document.addEventListener('DOMContentLoaded', function() {
     // ボタンを非アクティブにし、ローディング表示
     setAnswerLoadingState(true);
     
-    // 画像URLの配列を作成
-    const imageUrls = currentSearchResults.map(img => img.metadata.url);
+    // 検索結果のうち、回答に使う画像URL
+    const imageUrls = currentAnswerUrls;
     
     // CSRF トークンを取得
     const csrfToken = getCookie('csrftoken');
@@ -146,8 +192,8 @@ document.addEventListener('DOMContentLoaded', function() {
       formData.append('urls', url);
     });
     
-    // 回答取得リクエスト
-    fetch('/read_images/answer/', {
+    // 回答取得リクエスト（届いた分から表示する）
+    fetch('/read_images/answer/stream/', {
       method: 'POST',
       headers: {
         'X-Requested-With': 'XMLHttpRequest',
@@ -161,11 +207,7 @@ document.addEventListener('DOMContentLoaded', function() {
           throw new Error(data.error || `ステータスコード ${response.status}`);
         });
       }
-      return response.json();
-    })
-    .then(data => {
-      // 回答を表示
-      displayAnswer(data);
+      return readAnswerStream(response);
     })
     .catch(error => {
       showError(`回答取得中にエラーが発生しました: ${error.message}`);
@@ -178,6 +220,61 @@ document.addEventListener('DOMContentLoaded', function() {
     });
   }
 
+  /**
+   * Server-Sent Events で届く回答を読み取り、断片が届くたびに表示する
+   * @param {Response} response - /read_images/answer/stream/ のレスポンス
+   * @returns {Promise} 回答をすべて読み終えたら解決する
+   */
+  async function readAnswerStream(response) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let received = false;
+
+    while (true) {
+      const { done, value } = await reader.read();
+      if (done) {
+        break;
+      }
+      buffer += decoder.decode(value, { stream: true });
+
+      // 空行で区切られたイベントを順に処理する
+      let boundary;
+      while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+        const message = buffer.slice(0, boundary);
+        buffer = buffer.slice(boundary + 2);
+
+        let eventName = 'message';
+        let data = '';
+        message.split('\n').forEach(line => {
+          if (line.startsWith('event:')) {
+            eventName = line.slice(6).trim();
+          } else if (line.startsWith('data:')) {
+            data += line.slice(5).trim();
+          }
+        });
+        const payload = data ? JSON.parse(data) : {};
+
+        if (eventName === 'token') {
+          if (!received) {
+            // 最初の断片が届いたらローディング表示をやめて回答を表示する
+            received = true;
+            answerContent.textContent = '';
+            answerContainer.classList.remove('hidden');
+            answerLoadingIndicator.classList.add('hidden');
+          }
+          answerContent.textContent += payload.text;
+        } else if (eventName === 'error') {
+          throw new Error(payload.error);
+        }
+      }
+    }
+
+    if (!received) {
+      throw new Error('AIからの回答を取得できませんでした。');
+    }
+  }
+
   /**
    * 回答取得中の状態を設定する
    * @param {boolean} isLoading - 取得中かどうか
@@ -205,59 +302,6 @@ document.addEventListener('DOMContentLoaded', function() {
     }
   }
 
-  /**
-   * AIの回答を表示する
-   * @param {Object} data - APIからのレスポンスデータ
-   */
-  function displayAnswer(data) {
-    // エラーチェック
-    if (data.error) {
-      showError(data.error);
-      return;
-    }
-    
-    // 回答データがない場合
-    if (!data.answer) {
-      showError('AIからの回答を取得できませんでした。');
-      return;
-    }
-    
-    // 回答コンテナを表示
-    answerContainer.classList.remove('hidden');
-    
-    // 回答内容を設定
-    let answerText = '';
-    
-    // APIの応答形式に応じて適切に処理
-    if (typeof data.answer === 'string') {
-      answerText = data.answer;
-    } else if (typeof data.answer === 'object') {
-      // Claude API形式のレスポンス処理
-      if (data.answer.content && Array.isArray(data.answer.content)) {
-        // content配列からtextタイプのコンテンツを抽出
-        const textContents = data.answer.content
-          .filter(item => item.type === 'text')
-          .map(item => item.text);
-        
-        if (textContents.length > 0) {
-          answerText = textContents.join('\n\n');
-        }
-      } 
-      // 従来の応答形式も処理
-      else if (data.answer.response) {
-        answerText = data.answer.response;
-      } else if (data.answer.answer) {
-        answerText = data.answer.answer;
-      } else {
-        // 上記のプロパティがない場合はJSONを文字列化
-        answerText = JSON.stringify(data.answer, null, 2);
-      }
-    }
-    
-    // HTMLエスケープして表示
-    answerContent.textContent = answerText;
-  }
-
   /**
    * 検索中の状態を設定する
    * @param {boolean} isSearching - 検索中かどうか
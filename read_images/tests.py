@@ -1,3 +1,255 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import time
+from unittest import mock
 
-# Create your tests here.
+import httpx
+from django.conf import settings
+from django.contrib.auth.models import Permission, User
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from benchmarks import stub_api
+from main import circuit, sse
+from main.query_cache import MISS
+from main.tests.clock import FakeClock
+
+from . import prefetch, views
+
+
+def image(url):
+    return {"similarity": 0.9, "metadata": {"url": url, "filename": "a.png"}}
+
+
+class AnswerImageUrlsTests(TestCase):
+    images = [image(f"https://example.com/{i}.png") for i in range(5)]
+
+    @override_settings(READ_IMAGES_PREFETCH=False, READ_IMAGES_ANSWER_TOP_N=2)
+    def test_uses_every_result_without_prefetch(self):
+        self.assertEqual(len(views.answer_image_urls(self.images)), 5)
+
+    @override_settings(READ_IMAGES_PREFETCH=True, READ_IMAGES_ANSWER_TOP_N=2)
+    def test_uses_top_results_with_prefetch(self):
+        self.assertEqual(
+            views.answer_image_urls(self.images),
+            ["https://example.com/0.png", "https://example.com/1.png"],
+        )
+
+    def test_skips_results_without_url(self):
+        images = [image("https://example.com/0.png"), {"metadata": {}}, {}, "x"]
+        self.assertEqual(views.answer_image_urls(images), ["https://example.com/0.png"])
+
+
+@override_settings(READ_IMAGES_PREFETCH=False)
+class QueryViewTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user("reader")
+        user.user_permissions.add(Permission.objects.get(codename="view_readimages"))
+        self.client.force_login(user)
+
+    def test_result_without_url_is_not_an_error(self):
+        results = [image("https://example.com/0.png"), {"metadata": {}}]
+        with mock.patch.object(views.upstream, "post_json", return_value=results):
+            response = self.client.get(
+                "/read_images/query/", {"query": "url のない結果"}
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["answer_urls"], ["https://example.com/0.png"])
+
+
+class Clock(FakeClock):
+    """monotonic() だけをテストから進め、記録の時刻には実際の時刻を使う"""
+
+    def time(self):
+        return time.time()
+
+    def time_ns(self):
+        return time.time_ns()
+
+
+class WasteBudgetTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+
+    def test_counts_only_records_within_window(self):
+        budget = prefetch.WasteBudget(os.path.join(self.tmp, "wasted"), window=60)
+        self.assertEqual(budget.count(), 0)
+        budget.record()
+        budget.record()
+        old = next(os.scandir(budget.directory)).path
+        os.utime(old, (time.time() - 120, time.time() - 120))
+        self.assertEqual(budget.count(), 1)
+        # 期間外の記録は削除する
+        self.assertFalse(os.path.exists(old))
+
+
+@override_settings(
+    CACHES={
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+        "prefetch": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "test-prefetch",
+        },
+    }
+)
+class AnswerPrefetcherTests(SimpleTestCase):
+    urls = ["https://example.com/0.png"]
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.clock = Clock()
+        patcher = mock.patch("read_images.prefetch.time", self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(prefetch.caches["prefetch"].clear)
+        self.calls = 0
+
+    def prefetcher(self, waste_budget=2):
+        with override_settings(SHARED_STATE_DIR=self.tmp):
+            return prefetch.AnswerPrefetcher(60, waste_budget, 3600)
+
+    def fetcher(self, result="回答", release=None):
+        async def fetch():
+            self.calls += 1
+            if release is not None:
+                await release.wait()
+            if isinstance(result, Exception):
+                raise result
+            return result
+
+        return fetch
+
+    async def finish(self, answers):
+        """このワーカーで始めた先読みの完了を待つ"""
+        tasks = [entry.task for entry in answers._entries.values()]
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def test_takes_prefetched_answer_once(self):
+        answers = self.prefetcher()
+        await answers.start("猫", self.urls, self.fetcher())
+        await self.finish(answers)
+        self.assertEqual(await answers.take("猫", self.urls), "回答")
+        self.assertIs(await answers.take("猫", self.urls), MISS)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(answers.stats()["hits"], 1)
+
+    async def test_joins_answer_in_progress(self):
+        answers = self.prefetcher()
+        release = asyncio.Event()
+        await answers.start("猫", self.urls, self.fetcher(release=release))
+        asyncio.get_running_loop().call_soon(release.set)
+        self.assertEqual(await answers.take("猫", self.urls), "回答")
+        self.assertEqual(answers.stats()["joined"], 1)
+
+    async def test_other_worker_takes_answer_from_shared_cache(self):
+        searched, answered = self.prefetcher(), self.prefetcher()
+        await searched.start("猫", self.urls, self.fetcher())
+        # 生成中の印があるため、他のワーカーは同じ先読みを始めない
+        await answered.start("猫", self.urls, self.fetcher())
+        self.assertEqual(await answered.take("猫", self.urls), "回答")
+        self.assertEqual(self.calls, 1)
+
+    async def test_failed_prefetch_is_a_miss(self):
+        answers = self.prefetcher()
+        await answers.start("猫", self.urls, self.fetcher(RuntimeError("失敗")))
+        self.assertIs(await answers.take("猫", self.urls), MISS)
+        self.assertEqual(answers.stats()["failed"], 1)
+
+    async def test_expired_prefetch_is_wasted(self):
+        answers = self.prefetcher()
+        await answers.start("猫", self.urls, self.fetcher())
+        await self.finish(answers)
+        self.clock.advance(61)
+        self.assertIs(await answers.take("猫", self.urls), MISS)
+        stats = answers.stats()
+        self.assertEqual((stats["wasted"], stats["wasted_in_window"]), (1, 1))
+
+    async def test_stops_prefetching_when_waste_budget_is_spent(self):
+        answers = self.prefetcher(waste_budget=1)
+        await answers.start("猫", self.urls, self.fetcher())
+        await self.finish(answers)
+        self.clock.advance(61)
+        await answers.start("犬", self.urls, self.fetcher())
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(answers.stats()["skipped_budget"], 1)
+        self.assertIs(await answers.take("犬", self.urls), MISS)
+
+
+class SseTests(SimpleTestCase):
+    async def test_reads_events_until_done(self):
+        body = (
+            b'event: message\ndata: {"text": "a"}\n\n'
+            b": comment\n\ndata: line1\ndata: line2\n\n"
+            b"data: [DONE]\n\ndata: after\n\n"
+        )
+        response = httpx.Response(200, content=body)
+        self.assertEqual(
+            [data async for data in sse.iter_data(response)],
+            ['{"text": "a"}', "line1\nline2"],
+        )
+
+    def test_formats_event(self):
+        self.assertEqual(
+            sse.format_event("token", {"text": "猫"}),
+            'event: token\ndata: {"text": "猫"}\n\n',
+        )
+
+
+@override_settings(READ_IMAGES_PREFETCH=False)
+class AnswerStreamTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server, api_host = stub_api.start(latency=0.01)
+        cls.addClassCleanup(cls.server.stop)
+        cls.enterClassContext(
+            override_settings(
+                API_KEY="test",
+                UPSTREAM_URLS={
+                    **settings.UPSTREAM_URLS,
+                    "answer": f"{api_host}/answer",
+                },
+            )
+        )
+        cls.addClassCleanup(circuit._breakers.pop, "answer", None)
+
+    def setUp(self):
+        self.user = User.objects.create_user("reader")
+        self.user.user_permissions.add(
+            Permission.objects.get(codename="view_readimages")
+        )
+
+    async def events(self, data):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.post("/read_images/answer/stream/", data)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        self.assertEqual(response["Cache-Control"], "no-cache")
+        body = b"".join([chunk async for chunk in response.streaming_content])
+        events = []
+        for message in body.decode().split("\n\n"):
+            if message:
+                name, data = message.split("\n")
+                events.append((name.removeprefix("event: "), json.loads(data[6:])))
+        return events
+
+    async def test_streams_answer_tokens(self):
+        events = await self.events(
+            {"query": "猫", "urls": ["https://example.com/0.png"]}
+        )
+        self.assertEqual(events[-1], ("done", {}))
+        tokens = [data["text"] for name, data in events if name == "token"]
+        self.assertGreater(len(tokens), 1)
+        self.assertEqual("".join(tokens), "「猫」についての回答です。")
+
+    async def test_upstream_failure_is_an_error_event(self):
+        with mock.patch.object(
+            views.upstream, "stream_json", side_effect=views.upstream.Overloaded(1)
+        ):
+            events = await self.events(
+                {"query": "猫", "urls": ["https://example.com/0.png"]}
+            )
+        self.assertEqual([name for name, _ in events], ["error"])
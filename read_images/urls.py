@@ -7,5 +7,7 @@ app_name = "read_images"
 urlpatterns = [
     path("", views.index, name="index"),
     path("query/", views.query, name="query"),
+    path("suggest/", views.suggest, name="suggest"),
     path("answer/", views.answer, name="answer"),
+    path("answer/stream/", views.answer_stream, name="answer_stream"),
 ]
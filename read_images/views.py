@@ -1,12 +1,60 @@
 from django.shortcuts import render
 from django.contrib.auth.decorators import permission_required
-import requests
-import dotenv
-import os
 import json
-from django.http import JsonResponse, HttpResponseServerError
+from django.conf import settings
+from django.http import HttpResponseServerError, StreamingHttpResponse
+from main import (
+    admission,
+    circuit,
+    query_cache,
+    server_timing,
+    sse,
+    suggestions,
+    upstream,
+)
+from main.server_timing import JsonResponse
+from .answers import answer_text, iter_answer_text
+from . import prefetch
 
-dotenv.load_dotenv()
+
+async def fetch_answer(search_query, image_urls):
+    """
+    回答APIに検索クエリと画像URLを送信し、回答の JSON を返す
+
+    :param search_query: 検索クエリ
+    :param image_urls: 回答の根拠にする画像URLの配列
+    """
+    api_url = settings.UPSTREAM_URLS["answer"]
+    headers = {
+        "Content-Type": "application/json",
+        "api-key": settings.API_KEY,
+    }
+    payload = {
+        "query": search_query,
+        "urls": image_urls,
+    }
+    # APIリクエストの実行（共有コネクションプールを使い非同期で送信）
+    return await upstream.post_json(api_url, payload, headers, endpoint="answer")
+
+
+def answer_image_urls(images):
+    """
+    検索結果から、AIの回答に使う画像URLを返す
+
+    URL のない結果は除く。先読みする場合は、先読みと実際の回答のリクエストで
+    同じ URL を使うよう、上位 READ_IMAGES_ANSWER_TOP_N 件に絞る。
+
+    :param images: 画像検索APIの結果
+    """
+    urls = []
+    for image in images:
+        metadata = image.get("metadata") if isinstance(image, dict) else None
+        url = metadata.get("url") if isinstance(metadata, dict) else None
+        if url:
+            urls.append(url)
+    if settings.READ_IMAGES_PREFETCH:
+        return urls[: settings.READ_IMAGES_ANSWER_TOP_N]
+    return urls
 
 
 @permission_required("read_images.view_readimages")
@@ -18,7 +66,7 @@ def index(request):
 
 
 @permission_required("read_images.view_readimages")
-def query(request):
+async def query(request):
     """
     画像検索APIにクエリを送信し、結果をJSONで返す
     GET/POSTどちらのメソッドも対応
@@ -49,36 +97,46 @@ def query(request):
     }
 
     try:
-        api_url = f"{os.getenv('API_HOST')}{os.getenv('QUERY_ENDPOINT')}"
+        api_url = settings.UPSTREAM_URLS["query"]
         headers = {
             "Content-Type": "application/json",
-            "api-key": os.getenv("API_KEY"),
+            "api-key": settings.API_KEY,
         }
         payload = {
             "query": search_query,
         }
 
-        # APIリクエストの実行
-        response = requests.post(api_url, json=payload, headers=headers)
+        # キャッシュになければAPIリクエストを実行（共有コネクションプールを使い非同期で送信）
+        response_data["images"] = await query_cache.cache.get_or_fetch(
+            "read_images",
+            search_query,
+            lambda: upstream.post_json(api_url, payload, headers, endpoint="query"),
+        )
+        # 結果が得られた検索キーワードを入力候補に記録する
+        if response_data["images"]:
+            await suggestions.record("read_images", search_query, request)
 
-        # レスポンスのステータスコードを確認
-        if response.status_code != 200:
-            response_data["error"] = (
-                f"APIエラー: ステータスコード {response.status_code}"
+        # AIの回答に使う画像URL（回答のリクエストではこれを送る）
+        response_data["answer_urls"] = answer_urls = answer_image_urls(
+            response_data["images"]
+        )
+        # 続けて届く回答のリクエストに備えて、回答の生成を先に始めておく
+        # （回答APIの同時実行枠が埋まっているときは、実際のリクエストを優先する。
+        # 回路が閉じていないときは、half-open の試行を先読みに使わない）
+        if (
+            settings.READ_IMAGES_PREFETCH
+            and answer_urls
+            and not admission.limiter("answer").busy()
+            and circuit.breaker("answer").state == circuit.CLOSED
+        ):
+            await prefetch.answers.start(
+                search_query,
+                answer_urls,
+                lambda: fetch_answer(search_query, answer_urls),
             )
-            return JsonResponse(response_data, status=500)
-
-        # JSONレスポンスをパース
-        try:
-            data = response.json()
-            response_data["images"] = data
-        except json.JSONDecodeError:
-            response_data["error"] = "APIからの応答を解析できませんでした。"
-            return JsonResponse(response_data, status=500)
-
-    except requests.RequestException as e:
-        response_data["error"] = f"API接続エラー: {str(e)}"
-        return JsonResponse(response_data, status=500)
+    except upstream.UpstreamError as e:
+        response_data["error"] = str(e)
+        return JsonResponse(response_data, status=e.status, headers=e.headers)
     except Exception as e:
         response_data["error"] = f"予期しないエラーが発生しました: {str(e)}"
         return JsonResponse(response_data, status=500)
@@ -87,7 +145,25 @@ def query(request):
 
 
 @permission_required("read_images.view_readimages")
-def answer(request):
+async def suggest(request):
+    """
+    過去に結果が得られた検索キーワードから入力候補を返す
+    GETメソッドに対応
+
+    パラメータ:
+        prefix: 入力中の文字列（ひらがな・カタカナ、全角・半角を区別しない）
+
+    :param request: HTTPリクエスト
+    :return: JSON形式のレスポンス
+    """
+    prefix = request.GET.get("prefix", "")
+    return JsonResponse(
+        {"prefix": prefix, "suggestions": suggestions.suggest("read_images", prefix)}
+    )
+
+
+@permission_required("read_images.view_readimages")
+async def answer(request):
     """
     検索クエリと画像URLをもとにAIからの回答を取得する
 
@@ -114,39 +190,89 @@ def answer(request):
     }
 
     try:
-        api_url = f"{os.getenv('API_HOST')}{os.getenv('ANSWER_ENDPOINT')}"
-        headers = {
-            "Content-Type": "application/json",
-            "api-key": os.getenv("API_KEY"),
-        }
-        payload = {
-            "query": search_query,
-            "urls": image_urls,
-        }
-
-        # APIリクエストの実行
-        response = requests.post(api_url, json=payload, headers=headers)
-
-        # レスポンスのステータスコードを確認
-        if response.status_code != 200:
-            response_data["error"] = (
-                f"APIエラー: ステータスコード {response.status_code}"
-            )
-            return JsonResponse(response_data, status=500)
-
-        # JSONレスポンスをパース
-        try:
-            data = response.json()
-            response_data["answer"] = data
-        except json.JSONDecodeError:
-            response_data["error"] = "APIからの応答を解析できませんでした。"
-            return JsonResponse(response_data, status=500)
-
-    except requests.RequestException as e:
-        response_data["error"] = f"API接続エラー: {str(e)}"
-        return JsonResponse(response_data, status=500)
+        # 先読みした回答（生成中であればその完了）を待ち、なければAPIに問い合わせる
+        with server_timing.phase("cache"):
+            answer = await prefetch.answers.take(search_query, image_urls)
+        if answer is query_cache.MISS:
+            answer = await fetch_answer(search_query, image_urls)
+        response_data["answer"] = answer
+    except upstream.UpstreamError as e:
+        response_data["error"] = str(e)
+        return JsonResponse(response_data, status=e.status, headers=e.headers)
     except Exception as e:
         response_data["error"] = f"予期しないエラーが発生しました: {str(e)}"
         return JsonResponse(response_data, status=500)
 
     return JsonResponse(response_data)
+
+
+@permission_required("read_images.view_readimages")
+async def answer_stream(request):
+    """
+    answer と同じ入力でAIの回答を取得し、Server-Sent Events で届いた分から返す
+
+    イベント:
+        token: {"text": 回答の断片}
+        error: {"error": エラーメッセージ}
+        done: {}
+
+    上流APIから1つ読むごとにブラウザへの送信を待つため、ブラウザ側が
+    遅ければ上流APIからの読み込みも待たされる。ブラウザが切断すると
+    レスポンスの送信が取り消され、上流APIとの接続も閉じる。
+
+    :param request: HTTPリクエスト
+    :return: text/event-stream のレスポンス
+    """
+    if request.method != "POST":
+        return JsonResponse({"error": "POSTリクエストのみ対応しています。"}, status=400)
+
+    # リクエストからデータを取得
+    search_query = request.POST.get("query", "").strip()
+    image_urls = request.POST.getlist("urls", [])
+
+    if not search_query:
+        return JsonResponse({"error": "検索キーワードを入力してください。"}, status=400)
+
+    if not image_urls:
+        return JsonResponse({"error": "画像URLが提供されていません。"}, status=400)
+
+    api_url = settings.UPSTREAM_URLS["answer"]
+    headers = {
+        "Content-Type": "application/json",
+        "Accept": "text/event-stream",
+        "api-key": settings.API_KEY,
+    }
+    payload = {
+        "query": search_query,
+        "urls": image_urls,
+        "stream": True,
+    }
+
+    async def events():
+        try:
+            # 先読みした回答があれば、それを1つの断片として返す
+            answer = await prefetch.answers.take(search_query, image_urls)
+            if answer is not query_cache.MISS:
+                yield sse.format_event("token", {"text": answer_text(answer)})
+                yield sse.format_event("done", {})
+                return
+            async with upstream.stream_json(
+                api_url, payload, headers, endpoint="answer"
+            ) as response:
+                async for text in iter_answer_text(response):
+                    yield sse.format_event("token", {"text": text})
+        except upstream.UpstreamError as e:
+            yield sse.format_event("error", {"error": str(e)})
+            return
+        except Exception as e:
+            yield sse.format_event(
+                "error", {"error": f"予期しないエラーが発生しました: {str(e)}"}
+            )
+            return
+        yield sse.format_event("done", {})
+
+    response = StreamingHttpResponse(events(), content_type="text/event-stream")
+    # プロキシやブラウザにバッファリング・キャッシュさせない
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
@@ -1,15 +1,11 @@
 from django.shortcuts import render
-from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib.auth.decorators import permission_required
-import requests
-import os
+from django.conf import settings
 import json
-import dotenv
 import logging
-
-# 環境変数を読み込む
-dotenv.load_dotenv()
+from main import realtime_sessions, upstream
+from main.server_timing import JsonResponse
 
 
 @permission_required("subtitle.view_app")
@@ -31,14 +27,14 @@ def viewer(request):
 # 権限チェックを復活
 @permission_required("subtitle.view_app", raise_exception=True)
 @csrf_exempt  # POSTリクエストの場合はCSRF検証が必要なため、例外的に免除
-def session(request):
+async def session(request):
     """
     OpenAI Realtime API のセッショントークンを取得する。
     POSTリクエスト:
         model: 使用するモデル (デフォルト: gpt-4o-realtime-preview-2024-12-17)
         instructions: AIへの指示文 (デフォルト: "Please respond in Japanese.")
     """
-    API_KEY = os.environ.get("OPENAI_API_KEY")
+    API_KEY = settings.OPENAI_API_KEY
 
     # POSTかGETかで処理を分ける
     if request.method == "POST":
@@ -59,44 +55,22 @@ def session(request):
         return JsonResponse({"error": "API key not found"}, status=500)
 
     try:
-        response = requests.post(
-            "https://api.openai.com/v1/realtime/sessions",
-            headers={
-                "Authorization": f"Bearer {API_KEY}",
-                "Content-Type": "application/json",
-            },
-            json={
+        # プールに発行済みのトークンがあればすぐに返す（なければその場で発行する）
+        value = await realtime_sessions.acquire(
+            {
                 "model": model,
                 "voice": "verse",  # 音声出力しないため固定値を使用
                 "instructions": instructions,
                 "modalities": ["text"],
-            },
+            }
         )
-
-        if response.status_code != 200:
-            logging.error(
-                f"Failed to create session: {response.status_code} - {response.text}"
-            )
-            return JsonResponse(
-                {"error": "Failed to create session"}, status=response.status_code
-            )
-
-        data = response.json()
-        client_secret = data.get("client_secret")
-
-        if not client_secret:
-            logging.error("No client_secret in response", extra={"response": data})
-            return JsonResponse({"error": "Failed to create session"}, status=500)
-
-        value = client_secret.get("value")
-        if not value:
-            logging.error(
-                "No value in client_secret", extra={"client_secret": client_secret}
-            )
-            return JsonResponse({"error": "Failed to create session"}, status=500)
-
         return JsonResponse({"client_secret": {"value": value}})
 
+    except upstream.UpstreamError as e:
+        logging.error(str(e))
+        return JsonResponse(
+            {"error": "Failed to create session"}, status=e.status, headers=e.headers
+        )
     except Exception as e:
         logging.exception("Error creating session")
         return JsonResponse({"error": str(e)}, status=500)
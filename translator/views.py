@@ -1,12 +1,9 @@
 from django.shortcuts import render
-from django.http import JsonResponse
 from django.contrib.auth.decorators import permission_required
-import requests
-import os
-import dotenv
+from django.conf import settings
 import logging
-
-dotenv.load_dotenv()
+from main import realtime_sessions, upstream
+from main.server_timing import JsonResponse
 
 
 @permission_required("translator.view_app")
@@ -18,13 +15,13 @@ def index(request):
 
 
 @permission_required("translator.view_app")
-def session(request):
+async def session(request):
     """
     OpenAI Realtime API のセッショントークンを取得する。
     リクエストパラメータ:
         voice: 音声モデル名（デフォルト: verse）
     """
-    API_KEY = os.environ.get("OPENAI_API_KEY")
+    API_KEY = settings.OPENAI_API_KEY
     voice = request.GET.get("voice", "verse")
     model = request.GET.get("model", "gpt-4o-realtime-preview-2024-12-17")
 
@@ -33,13 +30,9 @@ def session(request):
         return JsonResponse({"error": "API key not found"}, status=500)
 
     try:
-        response = requests.post(
-            "https://api.openai.com/v1/realtime/sessions",
-            headers={
-                "Authorization": f"Bearer {API_KEY}",
-                "Content-Type": "application/json",
-            },
-            json={
+        # プールに発行済みのトークンがあればすぐに返す（なければその場で発行する）
+        value = await realtime_sessions.acquire(
+            {
                 "model": model,
                 "voice": voice,  # alloy, ash, ballad, coral, echo, fable, onyx, nova, sage, shimmer, verse
                 # "instructions": "Please respond in Japanese.",
@@ -62,33 +55,15 @@ def session(request):
                 #     }
                 # ],
                 "modalities": ["text"],  # ["audio", "text"] or ["text"]
-            },
+            }
         )
-
-        if response.status_code != 200:
-            logging.error(
-                f"Failed to create session: {response.status_code} - {response.text}"
-            )
-            return JsonResponse(
-                {"error": "Failed to create session"}, status=response.status_code
-            )
-
-        data = response.json()
-        client_secret = data.get("client_secret")
-
-        if not client_secret:
-            logging.error("No client_secret in response", extra={"response": data})
-            return JsonResponse({"error": "Failed to create session"}, status=500)
-
-        value = client_secret.get("value")
-        if not value:
-            logging.error(
-                "No value in client_secret", extra={"client_secret": client_secret}
-            )
-            return JsonResponse({"error": "Failed to create session"}, status=500)
-
         return JsonResponse({"client_secret": {"value": value}})
 
+    except upstream.UpstreamError as e:
+        logging.error(str(e))
+        return JsonResponse(
+            {"error": "Failed to create session"}, status=e.status, headers=e.headers
+        )
     except Exception as e:
         logging.exception("Error creating session")
         return JsonResponse({"error": str(e)}, status=500)